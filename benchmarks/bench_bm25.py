@@ -0,0 +1,75 @@
+"""
+Lexical search latency: the in-process BM25Index vs a BM25 `match` query to
+the stand-in Elasticsearch (which pays --latency-ms per request), plus the
+hybrid msearch with the ES vs the local lexical backend.
+
+    python -m benchmarks.bench_bm25 --docs 5000 --queries 200 --latency-ms 3
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_hybrid import percentile
+from benchmarks.bench_indexing import make_docs
+from benchmarks.stand_ins import FakeElasticsearch, HashingEncoder
+from rag.bm25 import BM25Index
+from rag.embeddings import EmbeddingService
+from rag.indexing import Indexer
+from rag.retrieval import Retriever
+
+
+def timed(fn, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+    }
+
+
+def run(num_docs, num_queries, top_k, latency_ms):
+    embedder = EmbeddingService(model=HashingEncoder())
+    queries = [f"term{i * 13} term{i * 7 + 1} term{i}" for i in range(num_queries)]
+    report = {}
+    with FakeElasticsearch() as es, tempfile.TemporaryDirectory() as tmp:
+        bm25 = BM25Index(f"{tmp}/bm25")
+        indexer = Indexer(index_name="bench_docs", es_url=es.url, embedder=embedder)
+        indexer.create_index()
+        docs = make_docs(num_docs, words_per_chunk=120)
+        indexer.index_documents(docs, bulk=True)
+
+        start = time.perf_counter()
+        bm25.upsert(docs)
+        bm25.flush()
+        report["local_build_s"] = round(time.perf_counter() - start, 3)
+        start = time.perf_counter()
+        BM25Index(bm25.path).search(queries[0], top_k)
+        report["local_cold_load_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+        remote = Retriever(index_name="bench_docs", es_url=es.url, embedder=embedder)
+        local = Retriever(index_name="bench_docs", es_url=es.url, embedder=embedder, lexical_backend="local",
+                          bm25_index=bm25)
+        remote.search_bm25(queries[0], top_k)  # build the stand-in's postings outside the timings
+        es.latency_ms = latency_ms
+        report["bm25_es"] = timed(lambda q: remote.search_bm25(q, top_k), queries)
+        report["bm25_local"] = timed(lambda q: local.search_bm25(q, top_k), queries)
+        report["hybrid_es_lexical"] = timed(lambda q: remote.search_hybrid(q, top_k), queries)
+        report["hybrid_local_lexical"] = timed(lambda q: local.search_hybrid(q, top_k), queries)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.docs, args.queries, args.top_k, args.latency_ms), indent=2))
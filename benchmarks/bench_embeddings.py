@@ -0,0 +1,49 @@
+"""
+Query-encoding throughput under concurrency: one encode() per request vs the
+micro-batching EmbeddingService.encode_query.
+
+    python -m benchmarks.bench_embeddings --concurrency 16 --queries 512
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stand_ins import HashingEncoder
+from rag.embeddings import DEFAULT_MODEL, EmbeddingService
+
+
+def load_model(name):
+    if name == "hashing":
+        return HashingEncoder()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(DEFAULT_MODEL)
+
+
+def measure(fn, queries, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fn, queries))
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 3), "queries_per_sec": round(len(queries) / elapsed, 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--model", choices=["hashing", "minilm"], default="minilm")
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    queries = [f"what does section {i} say about container networking?" for i in range(args.queries)]
+    service = EmbeddingService(model=model, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    model.encode(queries[:8])  # warm up
+
+    report = {
+        "per_request": measure(lambda q: model.encode([q]), queries, args.concurrency),
+        "micro_batched": measure(service.encode_query, queries, args.concurrency),
+    }
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,63 @@
+"""
+Hybrid retrieval latency per strategy ("sequential" vs "msearch" vs "rrf").
+
+Each request to the stand-in Elasticsearch pays --latency-ms, which is what
+dominates on a real deployment, so the gap tracks the number of round trips.
+
+    python -m benchmarks.bench_hybrid --latency-ms 3 --queries 50
+"""
+import argparse
+import json
+import statistics
+import time
+
+from benchmarks.bench_indexing import make_docs
+from benchmarks.stand_ins import FakeElasticsearch, HashingEncoder
+from rag.embeddings import EmbeddingService
+from rag.indexing import Indexer
+from rag.retrieval import Retriever
+
+STRATEGIES = ("sequential", "msearch", "rrf")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def run(num_docs, num_queries, top_k, latency_ms):
+    embedder = EmbeddingService(model=HashingEncoder())
+    report = {}
+    with FakeElasticsearch() as es:
+        indexer = Indexer(index_name="bench_docs", es_url=es.url, embedder=embedder)
+        indexer.create_index()
+        indexer.index_documents(make_docs(num_docs, words_per_chunk=60), bulk=True)
+        retriever = Retriever(index_name="bench_docs", es_url=es.url, embedder=embedder)
+        queries = [f"term{i * 13} term{i * 7 + 1} term{i}" for i in range(num_queries)]
+        es.latency_ms = latency_ms
+
+        for strategy in STRATEGIES:
+            timings = []
+            before = sum(es.request_counts.values())
+            for query in queries:
+                start = time.perf_counter()
+                retriever.search_hybrid(query, top_k=top_k, strategy=strategy)
+                timings.append((time.perf_counter() - start) * 1000)
+            report[strategy] = {
+                "mean_ms": round(statistics.mean(timings), 2),
+                "p50_ms": round(percentile(timings, 50), 2),
+                "p95_ms": round(percentile(timings, 95), 2),
+                "round_trips_per_query": round((sum(es.request_counts.values()) - before) / num_queries, 2),
+            }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.docs, args.queries, args.top_k, args.latency_ms), indent=2))
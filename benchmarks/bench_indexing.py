@@ -0,0 +1,74 @@
+"""
+Indexing throughput: per-chunk Indexer.index_documents vs the bulk path.
+
+Runs against the local stand-in Elasticsearch, so the numbers isolate the
+client-side cost (encoding + round trips). Use --latency-ms to model the
+network distance to a real cluster and --model minilm to use the real encoder.
+
+    python -m benchmarks.bench_indexing --docs 2000 --latency-ms 2
+"""
+import argparse
+import json
+import time
+
+from benchmarks.stand_ins import FakeElasticsearch, HashingEncoder
+from rag.embeddings import EmbeddingService, get_embedding_service
+from rag.indexing import Indexer
+
+
+def make_docs(n, words_per_chunk=200):
+    vocab = [f"term{i}" for i in range(5000)]
+    docs = []
+    for i in range(n):
+        text = " ".join(vocab[(i * 37 + j * 11) % len(vocab)] for j in range(words_per_chunk))
+        docs.append({
+            "id": f"doc-{i}",
+            "filename": f"file{i // 50}.pdf",
+            "drive_url": "https://drive.example/folder",
+            "chunk_id": i % 50,
+            "text": text,
+        })
+    return docs
+
+
+def build_indexer(es_url, model):
+    embedder = get_embedding_service() if model == "minilm" else EmbeddingService(model=HashingEncoder())
+    return Indexer(index_name="bench_docs", es_url=es_url, embedder=embedder)
+
+
+def run(docs, latency_ms, model, batch_size, chunk_size, thread_count):
+    results = {}
+    for mode in ("serial", "bulk"):
+        with FakeElasticsearch(latency_ms=latency_ms) as es:
+            indexer = build_indexer(es.url, model)
+            indexer.create_index()
+            start = time.perf_counter()
+            if mode == "serial":
+                indexer.index_documents(docs)
+            else:
+                indexer.index_documents(
+                    docs, bulk=True, batch_size=batch_size, chunk_size=chunk_size, thread_count=thread_count
+                )
+            elapsed = time.perf_counter() - start
+            results[mode] = {
+                "docs": len(docs),
+                "seconds": round(elapsed, 3),
+                "docs_per_sec": round(len(docs) / elapsed, 1),
+                "http_requests": sum(es.request_counts.values()),
+            }
+    results["speedup"] = round(results["bulk"]["docs_per_sec"] / results["serial"]["docs_per_sec"], 1)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=1.0)
+    parser.add_argument("--model", choices=["hashing", "minilm"], default="hashing")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--thread-count", type=int, default=4)
+    args = parser.parse_args()
+
+    report = run(make_docs(args.docs), args.latency_ms, args.model, args.batch_size, args.chunk_size, args.thread_count)
+    print(json.dumps(report, indent=2))
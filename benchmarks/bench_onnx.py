@@ -0,0 +1,90 @@
+"""
+Embedding backends on CPU: torch SentenceTransformer vs ONNX Runtime (fp32 and
+dynamic int8). Reports cold start (fresh interpreter: imports + model load +
+first encode), single-query and batch encode latency per intra-op thread
+count, and cosine parity against torch.
+
+    python -m rag.onnx_backend && python -m rag.onnx_backend --quantize   # export once
+    python -m benchmarks.bench_onnx --threads 1,2,4 --repeat 50
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_hybrid import percentile
+from rag.embeddings import DEFAULT_MODEL, EmbeddingService
+from rag.onnx_backend import PARITY_TEXTS, parity_check
+
+BACKENDS = {
+    "torch": {"backend": "torch"},
+    "onnx": {"backend": "onnx", "quantize": False},
+    "onnx_int8": {"backend": "onnx", "quantize": True},
+}
+
+STARTUP = """
+import time
+start = time.perf_counter()
+from rag.embeddings import EmbeddingService
+service = EmbeddingService(backend={backend!r}, quantize={quantize!r})
+service.encode(["warm up"])
+print(time.perf_counter() - start)
+"""
+
+
+def cold_start_s(options, runs=3):
+    # A fresh interpreter each time: what a worker restart pays
+    timings = []
+    for _ in range(runs):
+        code = STARTUP.format(backend=options["backend"], quantize=options.get("quantize", False))
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        timings.append(float(out.stdout.strip().splitlines()[-1]))
+    return round(min(timings), 3)
+
+
+def latency(encode, inputs, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode(inputs)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(percentile(timings, 50), 2), "p95_ms": round(percentile(timings, 95), 2)}
+
+
+def run(backends, threads, repeat, batch_size):
+    query = ["How do I configure a Kubernetes ingress controller for TLS termination?"]
+    batch = [f"{text} ({i})" for i, text in enumerate(PARITY_TEXTS * (batch_size // len(PARITY_TEXTS) + 1))]
+    batch = batch[:batch_size]
+    report = {}
+    for name in backends:
+        options = BACKENDS[name]
+        entry = {"cold_start_s": cold_start_s(options)}
+        for n in threads:
+            if options["backend"] == "torch":
+                import torch
+                torch.set_num_threads(n)
+            service = EmbeddingService(threads=n, **options)
+            model = service.model
+            model.encode(batch)  # warm up
+            entry[f"threads_{n}"] = {
+                "query": latency(lambda texts: model.encode(texts, batch_size=1), query, repeat),
+                f"batch_{batch_size}": latency(lambda texts: model.encode(texts, batch_size=batch_size), batch,
+                                               max(3, repeat // 10)),
+            }
+        if options["backend"] == "onnx":
+            entry["parity"] = parity_check(DEFAULT_MODEL, service.model, PARITY_TEXTS)
+        report[name] = entry
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backends", default="torch,onnx,onnx_int8")
+    parser.add_argument("--threads", default="1,2,4")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    report = run(args.backends.split(","), [int(n) for n in args.threads.split(",")], args.repeat, args.batch_size)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,114 @@
+"""
+Recall vs latency per dense_vector index profile (rag.profiles), against
+exact brute-force top-k computed with NumPy.
+
+For each profile the corpus is indexed with that profile's index_options,
+then every query runs at the profile's own num_candidates and at a sweep
+of top_k multiples, reporting recall@k, p50/p95 latency and index size.
+
+    python -m benchmarks.bench_recall --es-url http://localhost:9200 \
+        --profiles exact,hnsw,int8,int4,bbq --docs 20000 --dim 384
+    python -m benchmarks.bench_recall --stand-in   # exercise the harness offline
+"""
+import argparse
+import json
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+from benchmarks.bench_hybrid import percentile
+from benchmarks.bench_vector_store import clustered_vectors
+from benchmarks.stand_ins import FakeElasticsearch, HashingEncoder
+from rag.embeddings import EmbeddingService
+from rag.indexing import Indexer
+from rag.profiles import MAX_NUM_CANDIDATES, get_profile, num_candidates
+from rag.retrieval import Retriever
+
+
+def load(indexer, vectors):
+    docs = ({"id": str(i), "filename": "synthetic.pdf", "drive_url": "", "chunk_id": i, "text": ""}
+            for i in range(len(vectors)))
+    actions = (
+        {"_op_type": "index", "_index": indexer.index_name, "_id": doc["id"],
+         "_source": indexer._build_body(doc, vector.tolist())}
+        for doc, vector in zip(docs, vectors)
+    )
+    return indexer.bulk_index_actions(actions, chunk_size=500)
+
+
+def index_size(es, index_name):
+    try:
+        stats = es.indices.stats(index=index_name, metric="store")
+        return stats["indices"][index_name]["total"]["store"]["size_in_bytes"]
+    except Exception:
+        return None  # not reported (e.g. the stand-in)
+
+
+def measure(retriever, queries, exact, top_k, candidates):
+    timings, recalls = [], []
+    for query, truth in zip(queries, exact):
+        knn = dict(retriever._dense_knn(query.tolist(), top_k), num_candidates=candidates)
+        start = time.perf_counter()
+        res = retriever.es.search(index=retriever.index_name, knn=knn, size=top_k, source=False)
+        timings.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(truth.intersection(int(hit["_id"]) for hit in res["hits"]["hits"])) / top_k)
+    return {
+        "num_candidates": candidates,
+        f"recall@{top_k}": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+    }
+
+
+def run(es_url, profiles, num_docs, dim, num_queries, top_k, factors):
+    vectors = clustered_vectors(num_docs, dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(num_docs, num_queries, replace=False)] \
+        + 0.3 * rng.normal(size=(num_queries, dim)).astype(np.float32)
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = [set(np.argsort(-(unit @ q))[:top_k].tolist()) for q in queries]
+    embedder = EmbeddingService(model=HashingEncoder(dim))
+
+    report = {}
+    for name in profiles:
+        index_name = f"bench_recall_{name}"
+        indexer = Indexer(index_name=index_name, es_url=es_url, embedder=embedder, index_profile=name)
+        indexer.create_index()
+        start = time.perf_counter()
+        load(indexer, vectors)
+        build_s = time.perf_counter() - start
+        indexer.es.indices.refresh(index=index_name)
+
+        retriever = Retriever(index_name=index_name, es_url=es_url, embedder=embedder, index_profile=name)
+        profile = get_profile(name)
+        sweep = sorted({num_candidates(profile, top_k)}
+                       | {min(max(top_k, top_k * f), MAX_NUM_CANDIDATES) for f in factors})
+        report[name] = {
+            "index_options": profile["index_options"],
+            "build_s": round(build_s, 2),
+            "store_bytes": index_size(indexer.es, index_name),
+            "profile_default": measure(retriever, queries, exact, top_k, num_candidates(profile, top_k)),
+            "sweep": [measure(retriever, queries, exact, top_k, c) for c in sweep],
+        }
+        indexer.es.indices.delete(index=index_name)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--es-url", default="http://localhost:9200")
+    parser.add_argument("--stand-in", action="store_true", help="use the in-process stand-in Elasticsearch")
+    parser.add_argument("--profiles", default="exact,hnsw,int8,int4,bbq")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--factors", default="1,2,5,10,20,50")
+    args = parser.parse_args()
+
+    with FakeElasticsearch() if args.stand_in else nullcontext() as stand_in:
+        es_url = stand_in.url if stand_in else args.es_url
+        report = run(es_url, args.profiles.split(","), args.docs, args.dim, args.queries, args.top_k,
+                     [int(f) for f in args.factors.split(",")])
+    print(json.dumps(report, indent=2))
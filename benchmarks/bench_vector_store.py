@@ -0,0 +1,71 @@
+"""
+Local dense search latency and recall: LocalVectorIndex flat scan (float32 and
+float16) and IVF with a few nprobe settings, against exact top-k.
+
+    python -m benchmarks.bench_vector_store --docs 50000 --dim 384 --queries 200
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_hybrid import percentile
+from rag.vector_store import LocalVectorIndex
+
+
+def clustered_vectors(n, dim, clusters=64, seed=0):
+    # Embeddings are clustered by topic, which is what IVF relies on
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    return centers[rng.integers(clusters, size=n)] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def measure(store, queries, exact, top_k, **options):
+    timings, recalls = [], []
+    for query, truth in zip(queries, exact):
+        start = time.perf_counter()
+        hits = store.search(query, top_k, **options)
+        timings.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(truth.intersection(int(d["id"]) for d, _ in hits)) / top_k)
+    return {
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        f"recall@{top_k}": round(float(np.mean(recalls)), 3),
+    }
+
+
+def run(num_docs, dim, num_queries, top_k, nlist):
+    vectors = clustered_vectors(num_docs, dim)
+    queries = vectors[:num_queries] + 0.1
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = [set(np.argsort(-(unit @ q))[:top_k].tolist()) for q in queries]
+    docs = [{"id": str(i), "text": f"chunk {i}"} for i in range(num_docs)]
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in ("float32", "float16"):
+            store = LocalVectorIndex(f"{tmp}/{dtype}", dtype=dtype)
+            store.upsert(docs, vectors)
+            report[f"flat_{dtype}"] = measure(store, queries, exact, top_k)
+
+        store = LocalVectorIndex(f"{tmp}/ivf")
+        store.upsert(docs, vectors)
+        start = time.perf_counter()
+        store.build_ivf(nlist=nlist)
+        report["ivf_build_s"] = round(time.perf_counter() - start, 2)
+        for nprobe in (1, 4, 16):
+            report[f"ivf{nlist}_nprobe{nprobe}"] = measure(store, queries, exact, top_k, nprobe=nprobe)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=256)
+    args = parser.parse_args()
+    print(json.dumps(run(args.docs, args.dim, args.queries, args.top_k, args.nlist), indent=2))
@@ -0,0 +1,115 @@
+"""
+Load test: how many concurrent /query requests one API worker sustains.
+
+Drives the real FastAPI app in-process (one event loop = one uvicorn worker)
+against the stand-in Elasticsearch and Ollama, each running in its own
+process, and compares it with the old
+synchronous handler model: the sync Retriever + AnswerGenerator running on a
+40-thread pool, which is Starlette's default threadpool size.
+
+    python -m benchmarks.load_test --levels 1 16 64 128 --prefill-ms 1000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from benchmarks.bench_hybrid import percentile
+from benchmarks.bench_indexing import make_docs
+from benchmarks.stand_ins import FakeElasticsearch, FakeOllama, HashingEncoder, serve_in_subprocess
+from rag.embeddings import EmbeddingService
+from rag.generation import AnswerGenerator
+from rag.guardrails import Guardrails
+from rag.indexing import Indexer
+from rag.retrieval import Retriever
+
+STARLETTE_THREADPOOL = 40
+
+
+def summarize(latencies, elapsed):
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "mean_ms": round(statistics.mean(latencies), 1),
+    }
+
+
+async def run_async(app, concurrency, questions):
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=300) as client:
+        async def one(question):
+            start = time.perf_counter()
+            res = await client.post("/query", json={"question": question, "top_k": 3})
+            res.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        for i in range(0, len(questions), concurrency):
+            await asyncio.gather(*(one(q) for q in questions[i:i + concurrency]))
+        return summarize(latencies, time.perf_counter() - start)
+
+
+def run_sync(retriever, generator, concurrency, questions):
+    latencies = []
+
+    def one(question, submitted):
+        # Latency includes time spent queued for a free worker thread
+        retrieved = retriever.search_hybrid(question, top_k=3)
+        generator.generate_answer(question, retrieved)
+        latencies.append((time.perf_counter() - submitted) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(concurrency, STARLETTE_THREADPOOL)) as pool:
+        for i in range(0, len(questions), concurrency):
+            submitted = time.perf_counter()
+            list(pool.map(one, questions[i:i + concurrency], [submitted] * concurrency))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def main(levels, rounds, es_latency_ms, prefill_ms, token_ms):
+    from rag import api
+
+    embedder = EmbeddingService(model=HashingEncoder())
+    report = {}
+    with serve_in_subprocess(FakeElasticsearch, latency_ms=es_latency_ms) as es_url, \
+            serve_in_subprocess(FakeOllama, prefill_ms=prefill_ms, token_ms=token_ms) as ollama_url:
+        indexer = Indexer(es_url=es_url, embedder=embedder)
+        indexer.create_index()
+        indexer.index_documents(make_docs(300, words_per_chunk=60), bulk=True)
+
+        retriever = Retriever(es_url=es_url, embedder=embedder, connections_per_node=max(levels))
+        generator = AnswerGenerator(ollama_url=ollama_url, max_connections=max(levels))
+        generator.guardrails = Guardrails(embedder=embedder)
+        api.retriever, api.generator = retriever, generator
+
+        for level in levels:
+            questions = [f"term{i} term{i * 3} term{i * 7}" for i in range(level * rounds)]
+            # The questions repeat across levels: without this the async path
+            # would answer earlier levels' questions from the answer cache
+            api.answer_cache.invalidate()
+            report[level] = {
+                "async": asyncio.run(run_async(api.app, level, questions)),
+                "sync_threadpool": run_sync(retriever, generator, level, questions),
+            }
+            asyncio.run(retriever.aclose())
+            asyncio.run(generator.aclose())
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 16, 64, 128])
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--es-latency-ms", type=float, default=5.0)
+    parser.add_argument("--prefill-ms", type=float, default=1000.0)
+    parser.add_argument("--token-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(json.dumps(main(args.levels, args.rounds, args.es_latency_ms, args.prefill_ms, args.token_ms), indent=2))
@@ -0,0 +1,680 @@
+"""
+Local stand-ins for the services the RAG pipeline talks to.
+
+These let the benchmarks (and the offline tests) exercise the real client code
+paths -- the official Elasticsearch client, bulk helpers, HTTP round trips --
+without a running cluster or a model download.
+"""
+import fnmatch
+import hashlib
+import json
+import math
+import multiprocessing
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str):
+    return TOKEN_RE.findall(text.lower())
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # load tests open hundreds of connections at once
+
+
+class HashingEncoder:
+    """
+    Deterministic stand-in for SentenceTransformer.
+
+    Hashes tokens into a fixed-size vector and L2-normalises it, so texts that
+    share words end up close in cosine space. Exposes the subset of the
+    SentenceTransformer API the pipeline uses.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _encode_one(self, text: str):
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            h = int.from_bytes(hashlib.md5(token.encode()).digest()[:4], "little")
+            vec[h % self.dim] += 1.0 if h & (1 << 31) else -1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs):
+        if isinstance(sentences, str):
+            return self._encode_one(sentences)
+        if not sentences:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self._encode_one(s) for s in sentences])
+
+
+class _Index:
+    def __init__(self, body):
+        self.mappings = (body or {}).get("mappings", {})
+        self.settings = {"index": {"number_of_shards": "1", "number_of_replicas": "1"}}
+        for key, value in ((body or {}).get("settings") or {}).items():
+            self.settings["index"][key.replace("index.", "")] = value
+        self.docs = {}
+        self.version = 0
+        self._derived = {}
+
+    def put(self, doc_id, doc):
+        self.docs[doc_id] = doc
+        self.version += 1
+
+    def remove(self, doc_id):
+        found = self.docs.pop(doc_id, None) is not None
+        self.version += 1
+        return found
+
+    def derived(self, key, build):
+        """
+        Per-index structures (postings, vector matrix) rebuilt only after writes.
+        """
+        entry = self._derived.get(key)
+        if entry is None or entry[0] != self.version:
+            entry = (self.version, build(self.docs))
+            self._derived[key] = entry
+        return entry[1]
+
+    def vector_dims(self):
+        prop = self.mappings.get("properties", {}).get("dense_vector", {})
+        return prop.get("dims")
+
+    def source(self, doc_id, spec=None):
+        """
+        Stored _source of doc_id (fields excluded by the mapping dropped; they
+        stay searchable), filtered by a request's _source spec: True / False,
+        a list of includes, or {"includes": [...], "excludes": [...]}.
+        """
+        doc = self.docs[doc_id]
+        excludes = list(self.mappings.get("_source", {}).get("excludes", []))
+        includes = None
+        if spec is False:
+            return None
+        if isinstance(spec, (list, str)):
+            includes = [spec] if isinstance(spec, str) else spec
+        elif isinstance(spec, dict):
+            includes = spec.get("includes")
+            excludes += spec.get("excludes", [])
+        return {
+            key: value for key, value in doc.items()
+            if not any(fnmatch.fnmatchcase(key, pattern) for pattern in excludes)
+            and (not includes or any(fnmatch.fnmatchcase(key, pattern) for pattern in includes))
+        }
+
+
+class FakeElasticsearch:
+    """
+    In-memory, HTTP-speaking stand-in for a single Elasticsearch node.
+
+    Implements the handful of REST endpoints the pipeline uses (index admin,
+    document CRUD, _bulk and _search with match / knn queries). `latency_ms`
+    is added to every request to model a network round trip.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.indices = {}
+        self.lock = threading.RLock()
+        self.request_counts = Counter()
+        self._server = _Server((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --------- REQUEST DISPATCH ---------
+
+    def _make_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                parsed = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                parts = [p for p in parsed.path.split("/") if p]
+                if stand_in.latency_ms:
+                    time.sleep(stand_in.latency_ms / 1000.0)
+                try:
+                    status, body = stand_in.dispatch(self.command, parts, params, raw)
+                except Exception as e:  # surface bugs as ES-style errors
+                    status, body = 500, {"error": {"type": "stand_in_exception", "reason": repr(e)}, "status": 500}
+                payload = b"" if body is None else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("X-Elastic-Product", "Elasticsearch")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _handle
+
+        return Handler
+
+    def dispatch(self, method, parts, params, raw):
+        endpoint = next((p for p in parts if p.startswith("_")), None)
+        self.request_counts[endpoint or method] += 1
+        index = parts[0] if parts and not parts[0].startswith("_") else None
+
+        if not parts:
+            return 200, {"name": "stand-in", "version": {"number": "9.1.2"}, "tagline": "You Know, for Search"}
+        if endpoint == "_bulk":
+            return self.bulk(index, raw, params)
+        if endpoint == "_msearch":
+            return self.msearch(index, raw)
+        if index is None:
+            return 404, _error("unknown_endpoint", "/".join(parts), 404)
+        if endpoint is None:
+            if method == "HEAD":
+                return (200 if index in self.indices else 404), None
+            if method == "PUT":
+                return self.create_index(index, _json(raw))
+            if method == "DELETE":
+                with self.lock:
+                    self.indices.pop(index, None)
+                return 200, {"acknowledged": True}
+            if method == "GET":
+                return self._get_index(index)
+        if endpoint == "_settings":
+            if method == "PUT":
+                return self.put_settings(index, _json(raw))
+            return self._get_settings(index)
+        if endpoint == "_refresh":
+            return 200, {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+        if endpoint == "_count":
+            idx = self._index(index)
+            return (200, {"count": len(idx.docs)}) if idx else (404, _missing(index))
+        if endpoint == "_doc":
+            doc_id = parts[2] if len(parts) > 2 else None
+            if method in ("PUT", "POST"):
+                return self.index_doc(index, doc_id, _json(raw))
+            if method == "GET":
+                return self.get_doc(index, doc_id, params)
+            if method == "DELETE":
+                return self.delete_doc(index, doc_id)
+        if endpoint == "_search":
+            body = _json(raw) or {}
+            return self.search(index, body, params)
+        if endpoint == "_mget":
+            return self.mget(index, _json(raw) or {}, params)
+        return 400, _error("unsupported", f"{method} /{'/'.join(parts)}", 400)
+
+    # --------- INDEX ADMIN ---------
+
+    def _index(self, name):
+        with self.lock:
+            return self.indices.get(name)
+
+    def create_index(self, name, body):
+        with self.lock:
+            if name in self.indices:
+                return 400, _error("resource_already_exists_exception", f"index [{name}] already exists", 400)
+            self.indices[name] = _Index(body)
+        return 200, {"acknowledged": True, "shards_acknowledged": True, "index": name}
+
+    def _get_index(self, name):
+        idx = self._index(name)
+        if idx is None:
+            return 404, _missing(name)
+        return 200, {name: {"mappings": idx.mappings, "settings": idx.settings}}
+
+    def _get_settings(self, name):
+        idx = self._index(name)
+        if idx is None:
+            return 404, _missing(name)
+        return 200, {name: {"settings": idx.settings}}
+
+    def put_settings(self, name, body):
+        idx = self._index(name)
+        if idx is None:
+            return 404, _missing(name)
+        flat = body.get("index", body)
+        with self.lock:
+            for key, value in flat.items():
+                key = key.replace("index.", "")
+                if value is None:
+                    idx.settings["index"].pop(key, None)
+                else:
+                    idx.settings["index"][key] = str(value)
+        return 200, {"acknowledged": True}
+
+    # --------- DOCUMENTS ---------
+
+    def _validate(self, idx, doc):
+        dims = idx.vector_dims()
+        vec = doc.get("dense_vector")
+        if dims is not None and vec is not None and len(vec) != dims:
+            return _error(
+                "document_parsing_exception",
+                f"The [dense_vector] field [dense_vector] in doc has a different number of dimensions "
+                f"[{len(vec)}] than defined in the mapping [{dims}]",
+                400,
+            )["error"]
+        return None
+
+    def index_doc(self, name, doc_id, doc):
+        with self.lock:
+            idx = self.indices.setdefault(name, _Index(None))
+            error = self._validate(idx, doc)
+            if error:
+                return 400, {"error": error, "status": 400}
+            created = doc_id not in idx.docs
+            idx.put(doc_id, doc)
+        return (201 if created else 200), {
+            "_index": name, "_id": doc_id, "result": "created" if created else "updated"
+        }
+
+    def get_doc(self, name, doc_id, params=None):
+        idx = self._index(name)
+        if idx is None or doc_id not in idx.docs:
+            return 404, {"_index": name, "_id": doc_id, "found": False}
+        return 200, {"_index": name, "_id": doc_id, "found": True,
+                     "_source": idx.source(doc_id, _source_param(params or {}))}
+
+    def mget(self, name, body, params=None):
+        ids = body.get("ids") or [doc["_id"] for doc in body.get("docs", [])]
+        return 200, {"docs": [self.get_doc(name, doc_id, params)[1] for doc_id in ids]}
+
+    def delete_doc(self, name, doc_id):
+        idx = self._index(name)
+        with self.lock:
+            found = idx is not None and idx.remove(doc_id)
+        return (200 if found else 404), {"_index": name, "_id": doc_id, "result": "deleted" if found else "not_found"}
+
+    def bulk(self, default_index, raw, params):
+        lines = [line for line in raw.split(b"\n") if line.strip()]
+        items = []
+        errors = False
+        i = 0
+        while i < len(lines):
+            action = json.loads(lines[i])
+            op_type, meta = next(iter(action.items()))
+            name = meta.get("_index", default_index)
+            doc_id = meta.get("_id")
+            i += 1
+            if op_type == "delete":
+                status, body = self.delete_doc(name, doc_id)
+            else:
+                source = json.loads(lines[i])
+                i += 1
+                if op_type == "update":
+                    source = source.get("doc", source)
+                status, body = self.index_doc(name, doc_id, source)
+            result = {"_index": name, "_id": doc_id, "status": status}
+            if status >= 400 and op_type != "delete":
+                errors = True
+                result["error"] = body["error"]
+            else:
+                result["result"] = body.get("result")
+            items.append({op_type: result})
+        return 200, {"took": 1, "errors": errors, "items": items}
+
+    # --------- SEARCH ---------
+
+    def search(self, name, body, params):
+        idx = self._index(name)
+        if idx is None:
+            return 404, _missing(name)
+        size = int(body.get("size", params.get("size", 10)))
+
+        scored = {}
+        with self.lock:
+            docs = idx.docs
+            if "retriever" in body:
+                for doc_id, score in self._retrieve(idx, body["retriever"]):
+                    scored[doc_id] = score
+            if "knn" in body:
+                knn = body["knn"]
+                for doc_id, score in self._knn(idx, knn):
+                    scored[doc_id] = scored.get(doc_id, 0.0) + score
+                size = body.get("size", knn.get("k", size))
+            if "query" in body:
+                for doc_id, score in self._query(idx, body["query"]):
+                    scored[doc_id] = scored.get(doc_id, 0.0) + score
+
+        ranked = sorted(scored.items(), key=lambda kv: (-kv[1], kv[0]))[:size]
+        spec = body.get("_source", _source_param(params))
+        hits = [
+            {"_index": name, "_id": doc_id, "_score": score, "_source": idx.source(doc_id, spec)}
+            for doc_id, score in ranked
+        ]
+        return 200, {
+            "took": 1,
+            "timed_out": False,
+            "hits": {
+                "total": {"value": len(scored), "relation": "eq"},
+                "max_score": hits[0]["_score"] if hits else None,
+                "hits": hits,
+            },
+        }
+
+    def msearch(self, default_index, raw):
+        lines = [json.loads(line) for line in raw.split(b"\n") if line.strip()]
+        responses = []
+        for header, body in zip(lines[0::2], lines[1::2]):
+            status, result = self.search(header.get("index", default_index), body, {})
+            result["status"] = status
+            responses.append(result)
+        return 200, {"took": 1, "responses": responses}
+
+    def _retrieve(self, idx, retriever):
+        kind, spec = next(iter(retriever.items()))
+        if kind == "standard":
+            return sorted(self._query(idx, spec["query"]), key=lambda kv: -kv[1])
+        if kind == "knn":
+            return self._knn(idx, spec)
+        if kind == "rrf":
+            window = spec.get("rank_window_size", 10)
+            constant = spec.get("rank_constant", 60)
+            fused = Counter()
+            for child in spec["retrievers"]:
+                ranked = self._retrieve(idx, child.get("retriever", child))[:window]
+                for rank, (doc_id, _) in enumerate(ranked):
+                    fused[doc_id] += 1.0 / (constant + rank + 1)
+            return fused.most_common()
+        raise ValueError(f"unsupported retriever: {kind}")
+
+    def _knn(self, idx, knn):
+        field = knn["field"]
+
+        def build(docs):
+            ids = [doc_id for doc_id, doc in docs.items() if doc.get(field) is not None]
+            if not ids:
+                return ids, None
+            matrix = np.asarray([docs[doc_id][field] for doc_id in ids], dtype=np.float32)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            return ids, matrix
+
+        ids, matrix = idx.derived(("knn", field), build)
+        if matrix is None:
+            return []
+        q = np.asarray(knn["query_vector"], dtype=np.float32)
+        cos = matrix @ (q / (np.linalg.norm(q) or 1.0))
+        k = min(knn.get("k", 10), len(ids))
+        top = np.argsort(-cos, kind="stable")[:k]
+        return [(ids[i], float((1.0 + cos[i]) / 2.0)) for i in top]
+
+    def _query(self, idx, query):
+        if "match_all" in query:
+            return [(doc_id, 1.0) for doc_id in idx.docs]
+        if "match" in query:
+            field, value = next(iter(query["match"].items()))
+            if isinstance(value, dict):
+                value = value.get("query", "")
+            return self._bm25(idx, field, value)
+        if "ids" in query:
+            wanted = set(query["ids"].get("values", []))
+            return [(doc_id, 1.0) for doc_id in idx.docs if doc_id in wanted]
+        raise ValueError(f"unsupported query: {list(query)}")
+
+    def _bm25(self, idx, field, text, k1=1.2, b=0.75):
+        def build(docs):
+            postings = {}
+            lengths = {}
+            for doc_id, doc in docs.items():
+                tokens = tokenize(str(doc.get(field, "")))
+                lengths[doc_id] = len(tokens)
+                for term, freq in Counter(tokens).items():
+                    postings.setdefault(term, {})[doc_id] = freq
+            avgdl = (sum(lengths.values()) / len(lengths)) if lengths else 1.0
+            return postings, lengths, avgdl or 1.0
+
+        postings, lengths, avgdl = idx.derived(("bm25", field), build)
+        n = len(lengths)
+        scores = Counter()
+        for term in set(tokenize(text)):
+            docs_with_term = postings.get(term)
+            if not docs_with_term:
+                continue
+            df = len(docs_with_term)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for doc_id, freq in docs_with_term.items():
+                norm = k1 * (1 - b + b * lengths[doc_id] / avgdl)
+                scores[doc_id] += idf * freq * (k1 + 1) / (freq + norm)
+        return list(scores.items())
+
+def _json(raw):
+    return json.loads(raw) if raw else None
+
+
+def _source_param(params):
+    # _source / _source_includes / _source_excludes query parameters as a spec
+    if params.get("_source") in ("false", "true"):
+        return params["_source"] == "true"
+    spec = {}
+    for key in ("includes", "excludes"):
+        value = params.get(f"_source_{key}") or (params.get("_source") if key == "includes" else None)
+        if value:
+            spec[key] = value.split(",")
+    return spec or None
+
+
+def _error(kind, reason, status):
+    return {"error": {"type": kind, "reason": reason}, "status": status}
+
+
+def _missing(name):
+    return _error("index_not_found_exception", f"no such index [{name}]", 404)
+
+
+class FakeOllama:
+    """
+    HTTP stand-in for the Ollama REST API.
+
+    /api/generate streams `reply` back as NDJSON chunks, one word per line,
+    after `prefill_ms` (time to first token) and `token_ms` between tokens.
+    /api/tags lists the configured model.
+    """
+
+    def __init__(self, reply="Docker packages applications into containers. [docker.pdf]",
+                 prefill_ms=0.0, token_ms=0.0, model="mistral", host="127.0.0.1", port=0):
+        self.reply = reply
+        self.prefill_ms = prefill_ms
+        self.token_ms = token_ms
+        self.model = model
+        self.prompts = []
+        self._server = _Server((host, port), self._make_handler())
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def tokens(self):
+        words = self.reply.split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def _make_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _chunk(self, data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path.startswith("/api/tags"):
+                    self._send_json(200, {"models": [{"name": f"{stand_in.model}:latest"}]})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.startswith("/api/generate"):
+                    return self._send_json(404, {"error": "not found"})
+                if body.get("model") != stand_in.model:
+                    return self._send_json(404, {"error": f"model '{body.get('model')}' not found"})
+                stand_in.prompts.append(body.get("prompt", ""))
+                if body.get("stream") is False:
+                    time.sleep(stand_in.prefill_ms / 1000.0)
+                    reply = stand_in.reply if body.get("prompt") else ""
+                    return self._send_json(200, {"model": stand_in.model, "response": reply, "done": True})
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(stand_in.prefill_ms / 1000.0)
+                if body.get("prompt"):
+                    for token in stand_in.tokens():
+                        line = {"model": stand_in.model, "response": token, "done": False}
+                        self._chunk(json.dumps(line).encode() + b"\n")
+                        time.sleep(stand_in.token_ms / 1000.0)
+                self._chunk(json.dumps({"model": stand_in.model, "response": "", "done": True}).encode() + b"\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+def _serve_forever(cls, kwargs, conn):
+    server = cls(**kwargs).start()
+    conn.send(server.url)
+    threading.Event().wait()
+
+
+@contextmanager
+def serve_in_subprocess(cls, **kwargs):
+    """
+    Runs a stand-in in its own process so it does not compete for the GIL with
+    the code under test (matters for load tests). Yields the stand-in's URL.
+    """
+    parent_conn, child_conn = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=_serve_forever, args=(cls, kwargs, child_conn), daemon=True)
+    proc.start()
+    try:
+        yield parent_conn.recv()
+    finally:
+        proc.terminate()
+        proc.join()
+
+
+def write_pdf(path, pages):
+    """
+    Writes a minimal PDF with one text page per entry in pages (each a list of
+    lines), using the built-in Helvetica font. Enough for PyPDF2 to extract
+    the text back, so ingestion can be exercised without sample documents.
+    """
+    def escape(line):
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        ops = ["BT", "/F1 10 Tf", "12 TL", "40 800 Td"]
+        ops += [f"({escape(line)}) Tj T*" for line in lines]
+        stream = "\n".join(ops + ["ET"])
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_wordpiece_tokenizer(words=("docker", "container", "kubernetes", "image", "the", "and"), max_length=256):
+    """
+    Small BERT-style fast tokenizer (lowercasing, WordPiece, offsets) built
+    in memory: whole words for `words`, single characters for everything
+    else, so unknown words split into several word-pieces like MiniLM's do.
+    """
+    import string
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    vocab = {}
+    for token in ["[PAD]", "[UNK]", "[CLS]", "[SEP]", *words, *(string.ascii_lowercase + string.digits + string.punctuation)]:
+        vocab.setdefault(token, len(vocab))
+    for char in string.ascii_lowercase + string.digits:
+        vocab.setdefault("##" + char, len(vocab))
+
+    tokenizer = Tokenizer(models.WordPiece(vocab, unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, unk_token="[UNK]", cls_token="[CLS]", sep_token="[SEP]", pad_token="[PAD]",
+        model_max_length=max_length,
+    )
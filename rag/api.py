@@ -1,119 +1,465 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-from rag.ingestion import download_pdfs_from_gdrive, process_pdfs
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Literal, Optional
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, model_validator
+from rag.cache import AnswerCache
+from rag.embeddings import get_embedding_cache
+from rag.health import HealthMonitor
+from rag.ingestion import download_pdfs_from_gdrive
 from rag.indexing import Indexer
 from rag.retrieval import Retriever
 from rag.generation import AnswerGenerator
+from rag.rerank import FALLBACK_OUTCOMES, Reranker
+from rag.tracing import metrics, server_timing, tracer
+
+# Components are built on first use (or by warmup), so importing this module
+# stays cheap and uvicorn binds right away. Tests swap them by assignment.
+retriever = None
+generator = None
+reranker = None
+health_monitor = None
+answer_cache = AnswerCache(
+    maxsize=int(os.getenv("RAG_ANSWER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("RAG_ANSWER_CACHE_TTL", "3600")),
+    threshold=float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.9")),
+)
+
+# /query/batch: queries per call, and how many of them are generated at once
+BATCH_MAX_QUERIES = int(os.getenv("RAG_BATCH_MAX_QUERIES", "500"))
+BATCH_CONCURRENCY = int(os.getenv("RAG_BATCH_CONCURRENCY", "4"))
+
+# /ingest extraction processes: half the cores by default, so queries keep
+# being served during an ingest
+INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // 2)
+# One /ingest at a time per process: overlapping runs race on the manifest
+ingest_lock = threading.Lock()
+
+# Cross-encoder rerank for requests that don't choose (QueryRequest.rerank)
+RERANK = os.getenv("RAG_RERANK", "0").lower() in ("1", "true", "yes")
+
+# RAG_WARMUP=0 skips loading models at startup (they then load on the first query)
+WARMUP = os.getenv("RAG_WARMUP", "1").lower() not in ("0", "false", "no")
+warmup_state = {"status": "pending" if WARMUP else "skipped"}
+
+
+def get_retriever():
+    global retriever
+    if retriever is None:
+        retriever = Retriever()
+    return retriever
+
+
+def get_generator():
+    global generator
+    if generator is None:
+        # Ollama; grounding reads the chunks' stored vectors through the retriever
+        generator = AnswerGenerator(model_name="mistral", vector_lookup=get_retriever().stored_vectors)
+    return generator
+
+
+def get_reranker():
+    global reranker
+    if reranker is None:
+        reranker = Reranker()
+    return reranker
+
+
+def get_health_monitor():
+    """
+    Dependency probes for /healthz and /readyz: concurrent, each bounded by
+    RAG_HEALTH_TIMEOUT seconds, refreshed every RAG_HEALTH_INTERVAL seconds.
+    """
+    global health_monitor
+    if health_monitor is None:
+        health_monitor = HealthMonitor(
+            {
+                "elasticsearch": get_retriever().es_url,
+                "kibana": os.getenv("KIBANA_URL", "http://localhost:5601"),
+                "ollama": f"{get_generator().ollama_url}/api/tags",
+            },
+            timeout=float(os.getenv("RAG_HEALTH_TIMEOUT", "2")),
+            interval=float(os.getenv("RAG_HEALTH_INTERVAL", "15")),
+        )
+    return health_monitor
+
+
+async def warmup(retry_delay=1.0, max_delay=30.0):
+    """
+    Pays the one-off costs before the first query instead of during it:
+    loads the embedding model and runs a forward pass, opens the local
+    indexes, and has Ollama load the LLM. A failing step (e.g. Ollama not
+    up yet) is retried with exponential backoff, up to max_delay seconds
+    apart, until it succeeds; /readyz reports the last error meanwhile.
+    """
+    warmup_state["status"] = "running"
+
+    async def embedding_model():
+        embedder = get_retriever().model
+        await embedder.run(embedder.encode, ["warmup"])
+
+    async def local_indexes():
+        retriever = get_retriever()
+        for index in (retriever.vector_store, retriever.bm25_index):
+            if index is not None:
+                len(index)
+
+    async def rerank_model():
+        await get_retriever().model.run(lambda: get_reranker().model)
+
+    async def llm():
+        await get_generator().aload_model()
+
+    steps = [embedding_model, local_indexes] + ([rerank_model] if RERANK else []) + [llm]
+    for step in steps:
+        delay = retry_delay
+        while True:
+            try:
+                await step()
+                warmup_state["status"] = "running"
+                break
+            except Exception as e:
+                warmup_state["status"] = f"error ({str(e)}), retrying in {delay:g}s"
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_delay)
+    warmup_state["status"] = "ok"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background: the server accepts requests (and reports
+    # not-ready) while models load
+    warmup_task = asyncio.create_task(warmup()) if WARMUP else None
+    get_health_monitor().start()
+    yield
+    if warmup_task is not None:
+        warmup_task.cancel()
+    await get_health_monitor().stop()
+    # Release pooled async connections (Elasticsearch + Ollama)
+    if retriever is not None:
+        await retriever.aclose()
+    if generator is not None:
+        await generator.aclose()
 
 # Init FastAPI
-app = FastAPI(title="RAG System API")
+app = FastAPI(title="RAG System API", lifespan=lifespan)
+
+# Per-request stage breakdown as a Server-Timing header: always with
+# RAG_SERVER_TIMING=1, otherwise when the client sends "X-Server-Timing: 1"
+SERVER_TIMING = os.getenv("RAG_SERVER_TIMING", "0").lower() in ("1", "true", "yes")
+metrics.describe("rag_http_requests_total", "counter", "HTTP requests by route and status")
+metrics.describe("rag_http_request_duration_seconds", "histogram",
+                 "Time to response headers by route (streams: time to first byte)")
 
-# Initialize components
-retriever = Retriever()
-generator = AnswerGenerator(model_name="mistral")  # Ollama
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    if not tracer.enabled:
+        return await call_next(request)
+    start = time.perf_counter()
+    with tracer.request() as timings:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.observe("rag_http_request_duration_seconds", (("route", route),), elapsed)
+    metrics.inc("rag_http_requests_total", (("route", route), ("status", str(response.status_code))))
+    if SERVER_TIMING or request.headers.get("x-server-timing") == "1":
+        response.headers["Server-Timing"] = server_timing({**timings, "total": elapsed})
+    return response
 
 # --------- MODELS ---------
 class QueryRequest(BaseModel):
     question: str
     top_k: int = 5
-    mode: str = "hybrid"  # "elser" | "bm25" | "dense" | "hybrid"
+    # Unknown values are rejected with a 422 before any work is done
+    mode: Literal["elser", "bm25", "dense", "hybrid"] = "hybrid"
+    hybrid_strategy: Literal["msearch", "rrf", "sequential"] = "msearch"
+    fusion: Literal["rrf", "minmax", "zscore"] = "rrf"
+    # e.g. {"bm25": 1.0, "dense": 2.0, "elser": 0.5}
+    weights: Optional[Dict[Literal["bm25", "dense", "elser"], float]] = None
+    window_size: Optional[int] = None  # candidates per retriever before fusion
+    rerank: Optional[bool] = None  # cross-encoder rerank of over-fetched hits (default RAG_RERANK)
+    rerank_candidates: Optional[int] = None  # hits fetched for reranking (default Reranker.candidates(top_k))
+
+    @model_validator(mode="after")
+    def check_hybrid_options(self):
+        # Same rule as Retriever._check_hybrid_options, as a 422 instead of a 500
+        if self.hybrid_strategy == "rrf" and (self.fusion != "rrf" or self.weights):
+            raise ValueError("hybrid_strategy 'rrf' (server-side) only supports unweighted RRF fusion")
+        return self
 
 class QueryResponse(BaseModel):
     answer: str
     citations: list
 
-# --------- ENDPOINTS ---------
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest] = Field(..., min_length=1, max_length=BATCH_MAX_QUERIES)
+    concurrency: Optional[int] = Field(None, ge=1)  # parallel generations (default RAG_BATCH_CONCURRENCY)
 
-import requests
+# --------- ENDPOINTS ---------
 
 @app.get("/healthz")
-def health_check():
-    status = {"api": "ok"}
+async def health_check():
+    """Liveness plus the last dependency probe results (never waits on a hung dependency)"""
+    return {"api": "ok", **(await get_health_monitor().status())}
 
-    # 1. Elasticsearch
-    try:
-        es_res = requests.get("http://localhost:9200")
-        if es_res.status_code == 200:
-            status["elasticsearch"] = "ok"
-        else:
-            status["elasticsearch"] = f"error ({es_res.status_code})"
-    except Exception as e:
-        status["elasticsearch"] = f"down ({str(e)})"
 
-    # 2. Kibana
-    try:
-        kb_res = requests.get("http://localhost:5601")
-        if kb_res.status_code == 200:
-            status["kibana"] = "ok"
-        else:
-            status["kibana"] = f"error ({kb_res.status_code})"
-    except Exception as e:
-        status["kibana"] = f"down ({str(e)})"
+@app.get("/readyz")
+async def readiness_check(response: Response):
+    """200 once warmup has finished and Elasticsearch and Ollama answer, 503 before"""
+    health = await get_health_monitor().status()
+    checks = {
+        "warmup": warmup_state["status"],
+        "elasticsearch": health["elasticsearch"],
+        "ollama": health["ollama"],
+    }
+    ready = all(status in ("ok", "skipped") for status in checks.values())
+    response.status_code = 200 if ready else 503
+    return {"ready": ready, **checks}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage latency histograms and request counters, Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
-    # 3. Ollama
-    try:
-        ollama_res = requests.get("http://localhost:11434/api/tags")
-        if ollama_res.status_code == 200:
-            status["ollama"] = "ok"
-        else:
-            status["ollama"] = f"error ({ollama_res.status_code})"
-    except Exception as e:
-        status["ollama"] = f"down ({str(e)})"
 
-    return status
+@app.get("/cache/stats")
+def cache_stats():
+    return {"answers": answer_cache.stats(), "embeddings": get_embedding_cache().stats()}
 
 
 @app.post("/ingest")
-def ingest():
+def ingest(response: Response, incremental: bool = True):
+    """
+    Syncs the index with the Drive folder. By default only new / modified PDFs
+    are re-embedded and chunks of removed PDFs deleted (see
+    Indexer.incremental_ingest); incremental=false rebuilds the index.
+    A call made while another ingest runs gets a 409.
+    """
+    if not ingest_lock.acquire(blocking=False):
+        response.status_code = 409
+        return {"error": "An ingest is already running"}
     try:
         FOLDER_URL = "https://drive.google.com/drive/folders/1h6GptTW3DPCdhu7q5tY-83CXrpV8TmY_"
         local_dir = download_pdfs_from_gdrive(FOLDER_URL)
         if not local_dir:
             return {"error": "Failed to download PDFs from Google Drive"}
 
-        # pass both arguments now
-        docs = process_pdfs(local_dir, FOLDER_URL)
-        if not docs:
+        retriever = get_retriever()
+        indexer = Indexer(index_name="rag_docs", vector_store=retriever.vector_store,
+                          bm25_index=retriever.bm25_index)
+        report = indexer.incremental_ingest(local_dir, FOLDER_URL, rebuild=not incremental, workers=INGEST_WORKERS)
+        if report["indexed"] or report["deleted"] or not incremental:
+            answer_cache.invalidate()  # cached answers refer to the old chunks
+        if not incremental and not report["indexed"]:
             return {"error": "No documents were processed"}
 
-        indexer = Indexer(index_name="rag_docs")
-        indexer.create_index()
-        indexer.index_documents(docs)
-
-        return {"status": "ingestion complete", "docs_indexed": len(docs)}
+        return {
+            "status": "ingestion complete",
+            "mode": "incremental" if incremental else "full",
+            "files": report["files"],
+            "docs_indexed": report["indexed"],
+            "docs_failed": report["failed"],
+            "docs_deleted": report["deleted"],
+            "errors": report["errors"][:20],
+            "stages": report["stages"],  # per-stage pipeline counters (IngestionPipeline.stats)
+        }
 
     except Exception as e:
         import traceback
         return {"error": str(e), "trace": traceback.format_exc()}
+    finally:
+        ingest_lock.release()
 
 
 
-@app.post("/query", response_model=QueryResponse)
-def query(request: QueryRequest):
-    """Ask a question and get back answer + citations"""
-    
-    # Map retrieval mode
+def rerank_enabled(request: QueryRequest):
+    return RERANK if request.rerank is None else request.rerank
+
+
+def search_size(request: QueryRequest):
+    """Hits to retrieve: top_k, or the rerank candidates"""
+    if not rerank_enabled(request):
+        return request.top_k
+    return max(request.rerank_candidates or get_reranker().candidates(request.top_k), request.top_k)
+
+
+async def retrieve(request: QueryRequest):
+    """
+    Map retrieval mode to the matching (async) Retriever call, then rerank if
+    asked. Returns (hits, rerank outcome), the outcome None without rerank.
+    """
+    hits = await search(request, search_size(request))
+    if rerank_enabled(request):
+        return await get_reranker().arerank(request.question, hits, top_n=request.top_k)
+    return hits, None
+
+
+async def search(request: QueryRequest, top_k):
+    retriever = get_retriever()
     if request.mode == "hybrid":
-        retrieved = retriever.search_hybrid(request.question, top_k=request.top_k)
+        return await retriever.asearch_hybrid(
+            request.question,
+            top_k=top_k,
+            strategy=request.hybrid_strategy,
+            fusion=request.fusion,
+            weights=request.weights,
+            window_size=request.window_size,
+        )
     elif request.mode == "elser":
-        retrieved = retriever.search_elser(request.question, top_k=request.top_k)
+        return await retriever.asearch_elser(request.question, top_k=top_k)
     elif request.mode == "bm25":
-        retrieved = retriever.search_bm25(request.question, top_k=request.top_k)
+        return await retriever.asearch_bm25(request.question, top_k=top_k)
     elif request.mode == "dense":
-        retrieved = retriever.search_dense(request.question, top_k=request.top_k)
-    else:
-        retrieved = []
+        return await retriever.asearch_dense(request.question, top_k=top_k)
+    return []
+
+
+def cache_scope(request: QueryRequest):
+    """Request options that change what is retrieved; cached answers never cross them"""
+    weights = tuple(sorted(request.weights.items())) if request.weights else None
+    rerank = (rerank_enabled(request), request.rerank_candidates)
+    return (request.mode, request.top_k, request.hybrid_strategy, request.fusion, weights, request.window_size, rerank)
+
+
+@app.post("/query", response_model=QueryResponse)
+async def query(request: QueryRequest):
+    """Ask a question and get back answer + citations"""
+    retriever, generator = get_retriever(), get_generator()
+    # Guardrail pre-stage: refused queries never reach retrieval
+    refusal = generator.refusal(request.question)
+    if refusal:
+        return {"answer": refusal, "citations": []}
+
+    scope = cache_scope(request)
+    generation = answer_cache.generation
+
+    # Exact repeat: no retrieval, no LLM call
+    cached = answer_cache.lookup(scope, request.question)
+    if cached is not None:
+        return cached
 
-    answer = generator.generate_answer(request.question, retrieved)
+    query_vector = await retriever.model.aencode_query(request.question)
+    retrieved, outcome = await retrieve(request)
+    return await answer_retrieved(request, scope, generation, query_vector, retrieved, outcome)
+
+
+async def answer_retrieved(request: QueryRequest, scope, generation, query_vector, retrieved, outcome=None):
+    """
+    Answer step shared by /query and /query/batch, once retrieval is done.
+    outcome is the rerank outcome: an answer built from hits the reranker
+    left in fused order is not cached under the rerank scope.
+    """
+    generator = get_generator()
+
+    # Paraphrase: reuse the answer only if it was built from the same chunks
+    chunk_ids = [doc["id"] for doc, _ in retrieved]
+    cached = answer_cache.lookup_similar(scope, query_vector, chunk_ids)
+    if cached is not None:
+        return cached
+
+    answer = await generator.agenerate_answer(request.question, retrieved)
 
     # Return richer citations
-    citations = [
-        {
-            "filename": doc["filename"],
-            "url": doc["drive_url"],
-            "snippet": doc["text"][:200]
-        }
-        for doc, _ in retrieved
-    ]
+    response = {"answer": answer, "citations": generator.citations(retrieved)}
+    # Ollama errors aren't cached, nor answers whose rerank fell back
+    if not answer.startswith("⚠️") and outcome not in FALLBACK_OUTCOMES:
+        answer_cache.store(scope, request.question, query_vector, chunk_ids, response, generation=generation)
+    return response
+
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    """
+    Same as /query, streamed as Server-Sent Events:
+    `citations` first, then one `token` event per model fragment, then a
+    `final` event carrying the grounding-checked answer. A failure once the
+    stream has started ends it with an `error` event.
+    """
+    generator = get_generator()
+
+    async def events():
+        try:
+            refusal = generator.refusal(request.question)
+            retrieved, _ = ([], None) if refusal else await retrieve(request)
+            async for event in generator.astream_answer(request.question, retrieved):
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/query/batch")
+async def query_batch(batch: BatchQueryRequest):
+    """
+    Many /query requests in one call. Answers stream back as NDJSON, one
+    line per query in input order: {"index", "answer", "citations"}, or
+    {"index", "error"} for a query that failed.
+
+    Refusals and exact cache hits are settled first; the remaining questions
+    are encoded in one batched call and searched through _msearch, then
+    reranking (if asked) and generation run at most `concurrency` (default
+    RAG_BATCH_CONCURRENCY) queries at a time.
+    """
+    retriever, generator = get_retriever(), get_generator()
+    queries = batch.queries
+    concurrency = batch.concurrency or BATCH_CONCURRENCY
+
+    async def lines():
+        generation = answer_cache.generation
+        settled, pending = {}, []
+        for i, request in enumerate(queries):
+            refusal = generator.refusal(request.question)
+            cached = None if refusal else answer_cache.lookup(cache_scope(request), request.question)
+            if refusal:
+                settled[i] = {"answer": refusal, "citations": []}
+            elif cached is not None:
+                settled[i] = cached
+            else:
+                pending.append(i)
+
+        try:
+            vectors = await retriever.model.aencode_queries([queries[i].question for i in pending])
+            searches = [dict(queries[i].model_dump(), top_k=search_size(queries[i])) for i in pending]
+            hits = await retriever.asearch_batch(searches, vectors)
+        except Exception as e:
+            vectors, hits = [None] * len(pending), [e] * len(pending)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def answer(i, query_vector, retrieved):
+            if isinstance(retrieved, Exception):
+                return {"error": str(retrieved)}
+            request = queries[i]
+            async with semaphore:
+                try:
+                    outcome = None
+                    if rerank_enabled(request):
+                        retrieved, outcome = await get_reranker().arerank(request.question, retrieved,
+                                                                          top_n=request.top_k)
+                    return await answer_retrieved(request, cache_scope(request), generation, query_vector,
+                                                  retrieved, outcome)
+                except Exception as e:
+                    return {"error": str(e)}
+
+        tasks = {i: asyncio.create_task(answer(i, v, h)) for i, v, h in zip(pending, vectors, hits)}
+        try:
+            for i in range(len(queries)):
+                item = settled[i] if i in settled else await tasks[i]
+                yield json.dumps({"index": i, **item}) + "\n"
+        finally:
+            for task in tasks.values():  # client went away: stop generating
+                task.cancel()
 
-    return {"answer": answer, "citations": citations}
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
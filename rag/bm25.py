@@ -0,0 +1,293 @@
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+DEFAULT_PATH = "data/bm25_index"
+TOKEN_RE = re.compile(r"\w+")
+ARRAYS = ("offsets", "postings", "tfs", "idf", "norms", "lengths")
+
+
+def analyze(text: str):
+    # Close to ES's standard analyzer for plain text: word tokens, lowercased
+    return TOKEN_RE.findall(text.lower())
+
+
+# Lucene stores document lengths in one byte (SmallFloat.intToByte4), so ES
+# scores with a quantized length; _LENGTH_TABLE[byte] is the decoded length.
+_NUM_FREE_VALUES = 24
+
+
+def _int4_to_long(i):
+    bits, shift = i & 0x07, (i >> 3) - 1
+    return bits if shift == -1 else (bits | 0x08) << shift
+
+
+def _long_to_int4(i):
+    num_bits = int(i).bit_length()
+    if num_bits < 4:
+        return int(i)
+    shift = num_bits - 4
+    return ((int(i) >> shift) & 0x07) | ((shift + 1) << 3)
+
+
+_LENGTH_TABLE = np.array(
+    [i if i < _NUM_FREE_VALUES else _NUM_FREE_VALUES + _int4_to_long(i - _NUM_FREE_VALUES) for i in range(256)],
+    dtype=np.float64,
+)
+
+
+def quantize_lengths(lengths):
+    """
+    Document lengths as Lucene's BM25 sees them (lossy above 24 tokens).
+    """
+    encoded = [n if n < _NUM_FREE_VALUES else _NUM_FREE_VALUES + _long_to_int4(n - _NUM_FREE_VALUES)
+               for n in lengths]
+    return _LENGTH_TABLE[np.asarray(encoded, dtype=np.int64)] if encoded else np.zeros(0)
+
+
+class BM25Index:
+    """
+    In-process BM25 over the chunk `text`, scored like Elasticsearch's default
+    similarity (Lucene BM25: k1=1.2, b=0.75, idf = ln(1 + (N - df + 0.5) /
+    (df + 0.5)), one-byte length norms unless quantize_norms=False).
+
+    The index is a term-major CSR layout of NumPy arrays in `path`:
+      offsets.npy   -- postings of term t are [offsets[t], offsets[t + 1])
+      postings.npy  -- doc rows (int32), ascending within a term
+      tfs.npy       -- term frequencies (uint16)
+      idf.npy       -- per-term IDF
+      norms.npy     -- per-doc k1 * (1 - b + b * len / avgdl), precomputed
+      lengths.npy   -- per-doc token counts, so merges can redo the norms
+      docs.json     -- vocabulary and chunk sources (row order)
+    A query gathers the postings slices of its terms and sums
+    idf * tf / (tf + norm) with one np.bincount, so the work is proportional
+    to the postings touched, not to the corpus.
+
+    Arrays are loaded lazily (memory-mapped) on first use. upsert / delete
+    only touch the chunk sources and note which rows went stale; the next
+    flush() (or search) merges them into the arrays, which is what Indexer
+    does once per load. A merge drops the stale rows' postings and tokenizes
+    only the new or changed chunks, so an incremental load costs its own
+    size plus one vectorized pass over the existing postings. Norms and IDF
+    are recomputed over the whole corpus (avgdl and df move with every
+    change), but from the stored lengths and postings, not the text.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, k1=1.2, b=0.75, quantize_norms=True):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.quantize_norms = quantize_norms
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._dirty = False
+        self._docs = {}
+        self._ids = []
+        self._vocab = {}
+        self._arrays = None
+        self._pending = {}  # ids to (re)tokenize on the next build, in arrival order
+        self._stale = set()  # ids whose current row is replaced or deleted
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self._file("docs.json")):
+            return
+        with open(self._file("docs.json")) as f:
+            meta = json.load(f)
+        self._ids = meta["ids"]
+        self._docs = dict(zip(self._ids, meta["docs"]))
+        self._vocab = {term: i for i, term in enumerate(meta["vocab"])}
+        # lengths.npy is missing from indexes written before merges existed;
+        # the first build then falls back to a full rebuild
+        names = [name for name in ARRAYS if os.path.exists(self._file(f"{name}.npy"))]
+        self._arrays = {name: np.load(self._file(f"{name}.npy"), mmap_mode="r") for name in names}
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._docs)
+
+    # --------- SYNC ---------
+
+    def upsert(self, docs):
+        with self._lock:
+            self._ensure_loaded()
+            for doc in docs:
+                self._docs[doc["id"]] = {k: v for k, v in doc.items() if k != "dense_vector"}
+                self._pending[doc["id"]] = None
+                self._stale.add(doc["id"])
+            self._dirty = True
+
+    def delete(self, doc_ids):
+        with self._lock:
+            self._ensure_loaded()
+            removed = 0
+            for doc_id in doc_ids:
+                if self._docs.pop(doc_id, None) is not None:
+                    self._pending.pop(doc_id, None)
+                    self._stale.add(doc_id)
+                    removed += 1
+            self._dirty = self._dirty or bool(removed)
+            return removed
+
+    def reset(self):
+        with self._lock:
+            self._loaded, self._dirty = True, True
+            self._docs, self._ids, self._vocab, self._arrays = {}, [], {}, None
+            self._pending, self._stale = {}, set()
+
+    # --------- BUILD ---------
+
+    def _tokenize(self, ids, vocab, first_row=0):
+        """
+        (terms, rows, tfs, lengths) of the chunks ids, numbered from
+        first_row; new terms are added to vocab.
+        """
+        term_rows, doc_rows, tfs = [], [], []
+        lengths = np.zeros(len(ids), dtype=np.int64)
+        for i, doc_id in enumerate(ids):
+            tokens = analyze(str(self._docs[doc_id].get("text", "")))
+            lengths[i] = len(tokens)
+            if not tokens:
+                continue
+            terms, counts = np.unique([vocab.setdefault(t, len(vocab)) for t in tokens], return_counts=True)
+            term_rows.append(terms)
+            doc_rows.append(np.full(len(terms), first_row + i, dtype=np.int32))
+            tfs.append(counts)
+        terms = np.concatenate(term_rows).astype(np.int64) if term_rows else np.zeros(0, dtype=np.int64)
+        rows = np.concatenate(doc_rows) if doc_rows else np.zeros(0, dtype=np.int32)
+        tfs = np.minimum(np.concatenate(tfs) if tfs else np.zeros(0), 65535).astype(np.uint16)
+        return terms, rows, tfs, lengths
+
+    def _merge(self):
+        """
+        Postings of the live old rows (renumbered) followed by the pending
+        chunks' postings, without re-tokenizing the old rows.
+        """
+        arrays = self._arrays
+        keep = np.array([doc_id not in self._stale for doc_id in self._ids], dtype=bool)
+        renumber = (np.cumsum(keep) - 1).astype(np.int32)
+        kept = [doc_id for doc_id, live in zip(self._ids, keep) if live]
+        added = list(self._pending)
+
+        offsets = np.asarray(arrays["offsets"])
+        old_terms = np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+        old_rows = np.asarray(arrays["postings"])
+        live = keep[old_rows]
+
+        vocab = dict(self._vocab)
+        terms, rows, tfs, lengths = self._tokenize(added, vocab, first_row=len(kept))
+        return (kept + added, vocab,
+                np.concatenate([old_terms[live], terms]),
+                np.concatenate([renumber[old_rows[live]], rows]),
+                np.concatenate([np.asarray(arrays["tfs"])[live], tfs]),
+                np.concatenate([np.asarray(arrays["lengths"])[keep], lengths]))
+
+    def _build(self):
+        if self._arrays is None or "lengths" not in self._arrays:
+            ids, vocab = list(self._docs), {}
+            terms, rows, tfs, lengths = self._tokenize(ids, vocab)
+        else:
+            ids, vocab, terms, rows, tfs, lengths = self._merge()
+
+        # Terms whose last posting went away leave the vocabulary
+        df = np.bincount(terms, minlength=len(vocab))
+        used = df > 0
+        if not used.all():
+            renumber = np.cumsum(used) - 1
+            terms, df = renumber[terms], df[used]
+            vocab = {term: int(renumber[i]) for term, i in vocab.items() if used[i]}
+
+        # Old postings come first and stay row-ascending within a term, and
+        # new rows are numbered after them, so a stable sort keeps the order
+        order = np.argsort(terms, kind="stable")
+        n = len(ids)
+        avgdl = lengths.sum() / n if n and lengths.sum() else 1.0
+        dl = quantize_lengths(lengths) if self.quantize_norms else lengths.astype(np.float64)
+
+        self._ids, self._vocab = ids, vocab
+        self._arrays = {
+            "offsets": np.concatenate([[0], np.cumsum(df)]).astype(np.int64),
+            "postings": rows[order],
+            "tfs": tfs[order],
+            "idf": np.log(1 + (n - df + 0.5) / (df + 0.5)).astype(np.float32),
+            "norms": (self.k1 * (1 - self.b + self.b * dl / avgdl)).astype(np.float32),
+            "lengths": lengths,
+        }
+        self._pending, self._stale = {}, set()
+        self._dirty = False
+
+    def flush(self):
+        """
+        Merges pending chunk changes into the arrays and writes the index to
+        disk.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if not self._dirty:
+                return
+            self._build()
+            os.makedirs(self.path, exist_ok=True)
+            for name, array in self._arrays.items():
+                np.save(self._file(f"{name}.tmp.npy"), array)
+                os.replace(self._file(f"{name}.tmp.npy"), self._file(f"{name}.npy"))
+            meta = {"ids": self._ids, "docs": [self._docs[doc_id] for doc_id in self._ids],
+                    "vocab": list(self._vocab)}
+            with open(self._file("docs.json.tmp"), "w") as f:
+                json.dump(meta, f)
+            os.replace(self._file("docs.json.tmp"), self._file("docs.json"))
+
+    # --------- SEARCH ---------
+
+    def search(self, query, top_k=5):
+        """
+        [(doc, score)] for an ES-style `match` query on text, best first.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._dirty:
+                self._build()
+            if self._arrays is None:
+                return []
+            # Repeated query terms count once per occurrence, as in a match query
+            term_ids = [self._vocab[t] for t in analyze(query) if t in self._vocab]
+            if not term_ids:
+                return []
+            arrays = self._arrays
+            offsets, idf = arrays["offsets"], arrays["idf"]
+            slices = [slice(offsets[t], offsets[t + 1]) for t in term_ids]
+            rows = np.concatenate([arrays["postings"][s] for s in slices])
+            tfs = np.concatenate([arrays["tfs"][s] for s in slices]).astype(np.float32)
+            weights = np.repeat(idf[term_ids], [s.stop - s.start for s in slices])
+            impacts = weights * tfs / (tfs + arrays["norms"][rows])
+
+            matched, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=impacts).astype(np.float32)
+            k = min(top_k, len(matched))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.lexsort((matched[best], -scores[best]))]
+            return [(self._docs[self._ids[matched[i]]], float(scores[i])) for i in best]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_bm25_index(path=None, **options) -> BM25Index:
+    """
+    Process-wide BM25Index for path (default RAG_BM25_INDEX_PATH or
+    data/bm25_index), so Indexer and Retriever share one instance.
+    """
+    path = path or os.getenv("RAG_BM25_INDEX_PATH", DEFAULT_PATH)
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = BM25Index(path, **options)
+        return _indexes[path]
@@ -0,0 +1,214 @@
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with optional TTL (seconds) and hit/miss counters.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or self._expired(entry[0], now):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, stored_at=None):
+        with self._lock:
+            self._data[key] = (time.time() if stored_at is None else stored_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def entries(self):
+        """
+        Snapshot of live (key, stored_at, value) entries, oldest first.
+        """
+        now = time.time()
+        with self._lock:
+            return [(k, t, v) for k, (t, v) in self._data.items() if not self._expired(t, now)]
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def normalize_text(text: str) -> str:
+    # MiniLM's tokenizer is uncased and whitespace-insensitive, so these map to the same embedding
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache(LRUCache):
+    """
+    LRU cache of text embeddings keyed on (model name, normalized text).
+
+    With a path, the cache is loaded from disk on construction and written back
+    (atomically) on save() and at interpreter exit, so restarted workers start warm.
+    """
+
+    def __init__(self, maxsize=4096, ttl=None, path=None):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.path = path
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def get_vector(self, model_name, text):
+        return self.get((model_name, normalize_text(text)))
+
+    def put_vector(self, model_name, text, vector):
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        self.put((model_name, normalize_text(text)), vector)
+        return vector
+
+    def save(self, path=None):
+        path = path or self.path
+        entries = self.entries()
+        if not path or not entries:
+            return
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            models=np.array([k[0] for k, _, _ in entries]),
+            texts=np.array([k[1] for k, _, _ in entries]),
+            stored_at=np.array([t for _, t, _ in entries], dtype=np.float64),
+            vectors=np.stack([v for _, _, v in entries]),
+        )
+        os.replace(tmp_path, path)
+
+    def load(self, path=None):
+        path = path or self.path
+        if not path or not os.path.exists(path):
+            return 0
+        with np.load(path, allow_pickle=False) as data:
+            rows = zip(data["models"], data["texts"], data["stored_at"], data["vectors"])
+            for model_name, text, stored_at, vector in rows:
+                vector = np.array(vector, dtype=np.float32)
+                vector.setflags(write=False)
+                self.put((str(model_name), str(text)), vector, stored_at=float(stored_at))
+        # drop anything that had already expired on disk
+        live = {k for k, _, _ in self.entries()}
+        for key in [k for k in list(self._data) if k not in live]:
+            self.pop(key)
+        return len(self)
+
+
+class AnswerCache(LRUCache):
+    """
+    Cache of generated answers in front of retrieval and generation.
+
+    Entries are scoped by the request options that decide what is retrieved
+    (mode, top_k, hybrid strategy, ...), so answers never leak between them.
+    - lookup(): exact hit on the normalized question. Same question, same scope
+      and same index generation retrieve the same chunks, so the cached answer
+      is served without retrieval or an LLM call.
+    - lookup_similar(): a paraphrase whose query embedding has cosine similarity
+      >= threshold with a cached one. Only served if retrieval for the new
+      question returned exactly the cached chunk ids.
+    invalidate() starts a new generation (call it after re-ingesting); answers
+    computed against an older index are dropped, even if still in flight.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, threshold=0.9):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.threshold = threshold
+        self.generation = 0
+        self.semantic_hits = 0
+        self.stale = 0
+
+    def lookup(self, scope, question):
+        entry = self.get((scope, normalize_text(question)))
+        return None if entry is None else entry["value"]
+
+    def lookup_similar(self, scope, query_vector, chunk_ids):
+        candidates = [(k, v) for k, _, v in self.entries() if k[0] == scope]
+        if not candidates:
+            return None
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+        similarities = np.stack([v["vector"] for _, v in candidates]) @ query_vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        key, entry = candidates[best]
+        if entry["chunk_ids"] != list(chunk_ids):
+            self.stale += 1
+            return None
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self.semantic_hits += 1
+        return entry["value"]
+
+    def store(self, scope, question, query_vector, chunk_ids, value, generation=None):
+        """
+        Caches value for question. generation is the one current when the
+        request started; answers from before an invalidate() are not stored.
+        """
+        if generation is not None and generation != self.generation:
+            return
+        vector = np.asarray(query_vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        self.put((scope, normalize_text(question)),
+                 {"vector": vector, "chunk_ids": list(chunk_ids), "value": value})
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self):
+        stats = super().stats()
+        lookups = self.hits + self.misses
+        stats.update({
+            "semantic_hits": self.semantic_hits,
+            "stale": self.stale,
+            "generation": self.generation,
+            "hit_rate": round((self.hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+        })
+        return stats
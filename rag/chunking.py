@@ -0,0 +1,68 @@
+class TokenChunker:
+    """
+    Splits text into windows of at most max_tokens word-pieces of the
+    embedding model's own (fast) tokenizer, overlapping by `overlap` tokens.
+
+    A document is tokenized once, with offsets, and windows are cut on token
+    boundaries: each chunk is a (char_start, char_end) span of the original
+    text, so it fits the encoder exactly (nothing past max_seq_length is
+    silently truncated, then stored and searched anyway).
+    """
+
+    def __init__(self, tokenizer, max_tokens=254, overlap=32):
+        if not 0 <= overlap < max_tokens:
+            raise ValueError("overlap must be smaller than max_tokens")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+
+    @classmethod
+    def from_embedder(cls, embedder, max_tokens=None, overlap=32):
+        """
+        Chunker matching embedder (an EmbeddingService or a SentenceTransformer):
+        windows of max_seq_length minus the [CLS]/[SEP] tokens the model adds.
+        Returns None when the model has no fast tokenizer (no offsets).
+        """
+        model = getattr(embedder, "model", embedder)
+        tokenizer = getattr(model, "tokenizer", None)
+        if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+            return None
+        if max_tokens is None:
+            max_seq_length = getattr(model, "max_seq_length", None) or tokenizer.model_max_length
+            max_tokens = max_seq_length - tokenizer.num_special_tokens_to_add()
+        return cls(tokenizer, max_tokens=max_tokens, overlap=overlap)
+
+    @property
+    def signature(self):
+        # Stored with the ingest manifest: chunks change when any of these do
+        return f"tokens:{self.tokenizer.name_or_path}:{self.max_tokens}:{self.overlap}"
+
+    def spans(self, texts):
+        """
+        [(char_start, char_end), ...] per text, for a batch of texts.
+        """
+        encoded = self.tokenizer(
+            list(texts),
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False,
+        )
+        step = self.max_tokens - self.overlap
+        result = []
+        for offsets in encoded["offset_mapping"]:
+            spans = []
+            for i in range(0, len(offsets), step):
+                window = offsets[i:i + self.max_tokens]
+                spans.append((window[0][0], window[-1][1]))
+                if i + self.max_tokens >= len(offsets):
+                    break  # the rest is already inside this window
+            result.append(spans)
+        return result
+
+    def chunk(self, text):
+        """
+        [(chunk text, char_start, char_end), ...] for one document.
+        """
+        return [(text[start:end], start, end) for start, end in self.spans([text])[0]]
@@ -0,0 +1,128 @@
+import math
+import re
+
+TOKEN_RE = re.compile(r"\w+")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "in",
+    "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "which",
+    "who", "why", "with", "you",
+}
+
+
+def approx_tokens(text: str) -> int:
+    # ~4 characters per token for English with Llama/Mistral-style tokenizers
+    return math.ceil(len(text) / 4)
+
+
+def _word_overlap(prev_words, next_words, max_words=128):
+    # Longest suffix of prev_words that is also a prefix of next_words
+    for k in range(min(len(prev_words), len(next_words), max_words), 0, -1):
+        if prev_words[-k:] == next_words[:k]:
+            return k
+    return 0
+
+
+class ContextBuilder:
+    """
+    Builds the LLM context from retrieved chunks within a token budget.
+
+    1. Chunks of the same file with consecutive chunk_ids are merged into one
+       passage, dropping the text they share (char offsets when the chunks
+       carry them, else the overlapping words), so nothing is sent twice.
+    2. Passages are split into sentences, ranked by how many query terms they
+       contain (then by retrieval rank and position), and packed greedily
+       until max_tokens is reached.
+    3. The chosen sentences are put back in reading order under their
+       [filename] header.
+
+    count_tokens defaults to a character-based estimate; pass the LLM
+    tokenizer's counter for exact numbers.
+    """
+
+    def __init__(self, max_tokens=512, count_tokens=None):
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens or approx_tokens
+
+    def passages(self, retrieved_docs):
+        """
+        [{"filename", "rank", "text"}] with overlapping neighbour chunks merged,
+        ordered by the best retrieval rank among their chunks.
+        """
+        by_file = {}
+        for rank, (doc, _) in enumerate(retrieved_docs):
+            chunks = by_file.setdefault(doc["filename"], {})
+            chunks.setdefault(doc.get("chunk_id", rank), (rank, doc))
+
+        passages = []
+        for filename, chunks in by_file.items():
+            current = None
+            for chunk_id in sorted(chunks):
+                rank, doc = chunks[chunk_id]
+                if current is not None and chunk_id == current["last_id"] + 1:
+                    current["text"] = self._append(current, doc)
+                    current["rank"] = min(current["rank"], rank)
+                else:
+                    current = {"filename": filename, "rank": rank, "text": doc["text"]}
+                    passages.append(current)
+                current["last_id"] = chunk_id
+                current["last_doc"] = doc
+
+        for passage in passages:
+            del passage["last_id"], passage["last_doc"]
+        return sorted(passages, key=lambda p: p["rank"])
+
+    @staticmethod
+    def _append(passage, doc):
+        prev = passage["last_doc"]
+        if "char_start" in doc and "char_end" in prev:
+            shared = prev["char_end"] - doc["char_start"]
+            if shared >= 0:
+                return passage["text"] + doc["text"][shared:]
+            return passage["text"] + " " + doc["text"]
+        prev_words = passage["text"].split()
+        next_words = doc["text"].split()
+        shared = _word_overlap(prev_words, next_words)
+        return " ".join(prev_words + next_words[shared:])
+
+    def build(self, query: str, retrieved_docs):
+        """
+        Returns {"text", "tokens", "sentences", "candidates", "sources"}:
+        the packed context, its estimated token count, how many sentences
+        were kept out of how many, and the files they came from.
+        """
+        terms = {t for t in TOKEN_RE.findall(query.lower()) if t not in STOPWORDS}
+        candidates = []
+        for p_idx, passage in enumerate(self.passages(retrieved_docs)):
+            text = " ".join(passage["text"].split())
+            for s_idx, sentence in enumerate(s for s in SENTENCE_RE.split(text) if s):
+                matched = len(terms.intersection(TOKEN_RE.findall(sentence.lower())))
+                candidates.append((-matched, p_idx, s_idx, passage["filename"], sentence))
+
+        headers = set()
+        selected = []
+        used = 0
+        for candidate in sorted(candidates):
+            _, p_idx, _, filename, sentence = candidate
+            cost = self.count_tokens(sentence) + 1
+            if p_idx not in headers:
+                cost += self.count_tokens(f"[{filename}] ") + 1
+            if used + cost > self.max_tokens:
+                continue
+            used += cost
+            headers.add(p_idx)
+            selected.append(candidate)
+
+        # Reading order: passages by rank, sentences by position
+        blocks = {}
+        for _, p_idx, s_idx, filename, sentence in sorted(selected, key=lambda c: (c[1], c[2])):
+            blocks.setdefault((p_idx, filename), []).append(sentence)
+        text = "".join(f"[{filename}] {' '.join(sentences)}\n\n" for (_, filename), sentences in blocks.items())
+
+        return {
+            "text": text,
+            "tokens": self.count_tokens(text),
+            "sentences": len(selected),
+            "candidates": len(candidates),
+            "sources": list(dict.fromkeys(filename for _, filename in blocks)),
+        }
@@ -0,0 +1,229 @@
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from rag.cache import EmbeddingCache
+from rag.tracing import traced
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+BACKENDS = ("torch", "onnx")
+
+
+class EmbeddingService:
+    """
+    One SentenceTransformer per process, shared by Indexer, Retriever and Guardrails.
+
+    - encode() is a plain pass-through for callers that already have a batch
+      (indexing, grounding contexts).
+    - encode_query() is for single texts arriving from concurrent requests: calls
+      are queued and a background thread encodes them together in micro-batches
+      of at most max_batch_size, waiting at most max_wait_ms for a batch to fill.
+      With a cache, repeated texts skip the model entirely.
+    - aencode_query() / run() are the asyncio entry points: CPU-bound work runs
+      on the batcher thread or a dedicated executor, never on the event loop.
+
+    backend (default RAG_EMBEDDING_BACKEND or "torch") picks the runtime:
+    "torch" loads the SentenceTransformer, "onnx" the ONNX Runtime export
+    (rag.onnx_backend; quantize / threads default to RAG_ONNX_QUANTIZE /
+    RAG_ONNX_THREADS).
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, max_batch_size=32, max_wait_ms=2.0, model=None, cache=None,
+                 executor_workers=2, backend=None, quantize=None, threads=None):
+        self.model_name = model_name
+        self.backend = backend or os.getenv("RAG_EMBEDDING_BACKEND", "torch")
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {self.backend}")
+        if quantize is None:
+            quantize = os.getenv("RAG_ONNX_QUANTIZE", "0").lower() in ("1", "true", "yes")
+        self.quantize = quantize
+        self.threads = threads
+        self.cache = cache
+        self.executor_workers = executor_workers
+        self._executor = None
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._model = model
+        self._load_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    @property
+    def model(self):
+        # Loaded on first use so importing a module never pulls in torch by itself
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    if self.backend == "onnx":
+                        from rag.onnx_backend import OnnxEncoder
+                        self._model = OnnxEncoder.from_pretrained(
+                            self.model_name, quantize=self.quantize, threads=self.threads
+                        )
+                    else:
+                        from sentence_transformers import SentenceTransformer
+                        self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @property
+    def cache_key(self):
+        # Backends give slightly different vectors: don't share cache entries
+        if self.backend == "onnx":
+            return f"{self.model_name}@onnx" + ("-int8" if self.quantize else "")
+        return self.model_name
+
+    def get_sentence_embedding_dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    @traced("embedding.encode")
+    def encode(self, sentences, batch_size=32, **kwargs):
+        """
+        Direct batch encoding, same signature as SentenceTransformer.encode.
+        """
+        return self.model.encode(sentences, batch_size=batch_size, **kwargs)
+
+    @traced("embedding.query")
+    def encode_query(self, text: str) -> np.ndarray:
+        """
+        Encodes a single text, sharing a forward pass with concurrent callers.
+        """
+        vector = self._cached(text)
+        if vector is not None:
+            return vector
+        return self._remember(text, self._submit(text).result())
+
+    @traced("embedding.query")
+    async def aencode_query(self, text: str) -> np.ndarray:
+        """
+        encode_query for coroutines: awaits the micro-batch without blocking the loop.
+        """
+        vector = self._cached(text)
+        if vector is not None:
+            return vector
+        return self._remember(text, await asyncio.wrap_future(self._submit(text)))
+
+    def encode_queries(self, texts, batch_size=64):
+        """
+        Encodes many query texts at once (batch requests): cached texts are
+        looked up, the rest go through the model together, each distinct
+        text once. Returns one vector per text, in order.
+        """
+        vectors = [self._cached(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            encoded = self.encode(missing, batch_size=batch_size)
+            fresh = {
+                text: self._remember(text, np.asarray(vector, dtype=np.float32))
+                for text, vector in zip(missing, encoded)
+            }
+            vectors = [fresh[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return vectors
+
+    async def aencode_queries(self, texts, batch_size=64):
+        return await self.run(self.encode_queries, texts, batch_size)
+
+    async def run(self, fn, *args):
+        """
+        Runs other CPU-bound work (batch encodes, grounding) on the dedicated executor.
+        """
+        if self._executor is None:
+            with self._worker_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.executor_workers, thread_name_prefix="embedding")
+        # Copy the context so spans inside fn land in the caller's request timings
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, fn, *args)
+
+    def _cached(self, text):
+        return self.cache.get_vector(self.cache_key, text) if self.cache is not None else None
+
+    def _remember(self, text, vector):
+        return self.cache.put_vector(self.cache_key, text, vector) if self.cache is not None else vector
+
+    def _submit(self, text) -> Future:
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.model.encode(texts, batch_size=len(texts))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(np.asarray(vector, dtype=np.float32))
+
+
+_services = {}
+_services_lock = threading.Lock()
+_default_cache = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Process-wide query embedding cache, configured from the environment:
+    RAG_EMBEDDING_CACHE_SIZE (entries, 0 disables), RAG_EMBEDDING_CACHE_TTL
+    (seconds) and RAG_EMBEDDING_CACHE_PATH (on-disk persistence).
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _services_lock:
+            if _default_cache is None:
+                ttl = os.getenv("RAG_EMBEDDING_CACHE_TTL")
+                _default_cache = EmbeddingCache(
+                    maxsize=int(os.getenv("RAG_EMBEDDING_CACHE_SIZE", "4096")),
+                    ttl=float(ttl) if ttl else None,
+                    path=os.getenv("RAG_EMBEDDING_CACHE_PATH") or None,
+                )
+    return _default_cache
+
+
+def get_embedding_service(model_name=DEFAULT_MODEL, **options) -> EmbeddingService:
+    """
+    Returns the process-wide EmbeddingService for model_name, creating it on
+    first call. Options only apply to that first call.
+    """
+    service = _services.get(model_name)
+    if service is None:
+        cache = get_embedding_cache()
+        options.setdefault("cache", cache if cache.maxsize > 0 else None)
+        with _services_lock:
+            service = _services.get(model_name)
+            if service is None:
+                service = EmbeddingService(model_name, **options)
+                _services[model_name] = service
+    return service
@@ -0,0 +1,76 @@
+import numpy as np
+
+from rag.tracing import traced
+
+FUSION_METHODS = ("rrf", "minmax", "zscore")
+
+
+def _normalize(scores, method):
+    if method == "minmax":
+        lo, hi = scores.min(), scores.max()
+        return (scores - lo) / (hi - lo) if hi > lo else np.ones_like(scores)
+    if method == "zscore":
+        std = scores.std()
+        return (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+    raise ValueError(f"Unknown fusion method: {method}")
+
+
+@traced("retrieval.fusion")
+def fuse(results_by_retriever, method="rrf", weights=None, top_k=5, k=60):
+    """
+    Fuse ranked result lists into one list of (doc, fused_score).
+
+    results_by_retriever: {retriever name: [(doc, score), ...]} (or a plain list
+    of result lists, named by position). The first _source seen for each doc id
+    is kept, so no document has to be fetched again; a dense_vector carried by
+    a later hit of the same doc is added to it.
+
+    method:
+      - "rrf":    weighted Reciprocal Rank Fusion, sum of w / (k + rank)
+      - "minmax": weighted sum of min-max normalized scores
+      - "zscore": weighted sum of z-score normalized scores
+    For the score-based methods a doc missing from a list gets that list's
+    lowest normalized score.
+    weights: {retriever name: weight}, missing names default to 1.0.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method: {method}")
+    if not isinstance(results_by_retriever, dict):
+        results_by_retriever = {str(i): results for i, results in enumerate(results_by_retriever)}
+    weights = weights or {}
+
+    positions = {}
+    docs = []
+    columns = []
+    for name, results in results_by_retriever.items():
+        if not results:
+            continue
+        rows = np.empty(len(results), dtype=np.int64)
+        scores = np.empty(len(results), dtype=np.float64)
+        for i, (doc, score) in enumerate(results):
+            pos = positions.get(doc["id"])
+            if pos is None:
+                pos = positions[doc["id"]] = len(docs)
+                docs.append(doc)
+            elif "dense_vector" in doc and "dense_vector" not in docs[pos]:
+                docs[pos] = dict(docs[pos], dense_vector=doc["dense_vector"])
+            rows[i] = pos
+            scores[i] = score if score is not None else 0.0
+        columns.append((float(weights.get(name, 1.0)), rows, scores))
+
+    if not docs:
+        return []
+
+    fused = np.zeros(len(docs), dtype=np.float64)
+    for weight, rows, scores in columns:
+        if method == "rrf":
+            np.add.at(fused, rows, weight / (k + np.arange(1, len(rows) + 1)))
+        else:
+            normalized = _normalize(scores, method)
+            contribution = np.full(len(docs), normalized.min())
+            contribution[rows] = normalized
+            fused += weight * contribution
+
+    # Highest score first; ties keep first-seen order
+    order = np.lexsort((np.arange(len(docs)), -fused))[:top_k]
+    return [(docs[i], float(fused[i])) for i in order]
@@ -1,69 +1,291 @@
+import asyncio
 import requests
+import httpx
 import json
+from rag.context import ContextBuilder
 from rag.guardrails import Guardrails
+from rag.tracing import metrics, span, traced
+
+metrics.describe("rag_prompt_tokens_total", "counter", "Prompt tokens sent to the LLM")
 
 
 class AnswerGenerator:
-    def __init__(self, model_name="mistral"):
+    def __init__(self, model_name="mistral", ollama_url="http://localhost:11434",
+                 timeout=120.0, max_retries=2, max_connections=32, context_tokens=512, vector_lookup=None):
         # Ollama runs locally, no Hugging Face pipeline needed
         self.model_name = model_name
-        self.guardrails = Guardrails()
+        self.ollama_url = ollama_url
+        # vector_lookup: stored chunk vectors for grounding (Retriever.stored_vectors)
+        self.guardrails = Guardrails(vector_lookup=vector_lookup)
 
-    def generate_answer(self, query: str, retrieved_docs):
-        # 1. Guardrails
-        if not self.guardrails.is_safe_input(query):
+        # Deduped, sentence-packed context within a token budget
+        self.context_builder = ContextBuilder(max_tokens=context_tokens)
+
+        # Async path: one pooled keep-alive client, created on first use
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_connections = max_connections
+        self._aclient = None
+
+    @property
+    def aclient(self):
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(
+                base_url=self.ollama_url,
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+                transport=httpx.AsyncHTTPTransport(
+                    retries=self.max_retries,  # connection-level retries
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                        keepalive_expiry=60.0,
+                    ),
+                ),
+            )
+        return self._aclient
+
+    async def aclose(self):
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+
+    @staticmethod
+    def citations(retrieved_docs):
+        """
+        Citation payload shared by /query and /query/stream.
+        """
+        return [
+            {
+                "filename": doc["filename"],
+                "url": doc["drive_url"],
+                "snippet": doc["text"][:200]
+            }
+            for doc, _ in retrieved_docs
+        ]
+
+    def refusal(self, query: str):
+        """
+        Guardrail input check (one compiled-matcher pass). Returns the refusal
+        message, or None if the query may proceed. Cheap enough to run before
+        retrieval.
+        """
+        violation = self.guardrails.check_input(query)
+        if violation == "unsafe":
             return "❌ Unsafe query refused."
-        if self.guardrails.is_prompt_injection(query):
+        if violation == "injection":
             return "❌ Prompt injection attempt detected and refused."
+        return None
 
-        if not retrieved_docs:
-            return "I don't know."
-
-        # 2. Build context
-        context = ""
-        for doc, score in retrieved_docs:
-            snippet = doc["text"][:400].replace("\n", " ")
-            context += f"[{doc['filename']}] {snippet}\n\n"
+    @traced("generation.context")
+    def _build_prompt(self, query: str, retrieved_docs):
+        """
+        Returns (prompt, stats): the prompt text, and its token count next to
+        the ContextBuilder report for the context part.
+        """
+        context = self.context_builder.build(query, retrieved_docs)
 
-        # 3. Build chat-style prompt
         prompt = f"""User: {query}
         Context:
-        {context}
+        {context["text"]}
         Assistant: Answer the question using only the context above. 
         If the answer is not in the context, reply with "I don't know."
         Always cite the source filename(s) in your answer.
         """
+        stats = {
+            "prompt_tokens": self.context_builder.count_tokens(prompt),
+            "context_tokens": context["tokens"],
+            "sentences": context["sentences"],
+            "candidates": context["candidates"],
+        }
+        # Prompts built = the generation.context span count
+        metrics.inc("rag_prompt_tokens_total", (), stats["prompt_tokens"])
+        return prompt, stats
 
-        # 4. Call Ollama REST API
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={"model": self.model_name, "prompt": prompt}
-        )
+    def _stream_tokens(self, prompt: str):
+        """
+        Yields response fragments from Ollama's streaming /api/generate as they arrive.
+        Raises RuntimeError on a non-200 reply.
+        """
+        with requests.post(
+            f"{self.ollama_url}/api/generate",
+            json={"model": self.model_name, "prompt": prompt},
+            stream=True,
+        ) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"⚠️ Ollama error: {response.text}")
 
-        if response.status_code != 200:
-            return f"⚠️ Ollama error: {response.text}"
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    break
+
+    def _finalize(self, answer: str, retrieved_docs):
+        # Guardrails grounding, then append citations
+        if not self.guardrails.is_grounded_output(answer, retrieved_docs):
+            return "I don't know."
+        citations = [f"- {doc['filename']} ({doc['drive_url']})" for doc, _ in retrieved_docs]
+        return answer + "\n\nCitations:\n" + "\n".join(citations)
 
-        # Ollama streams responses; we only care about final
-        output = ""
-        for line in response.text.splitlines():
-            try:
-                data = json.loads(line)
-                if "response" in data:
-                    output += data["response"]
-            except json.JSONDecodeError:
-                continue
+    @traced("generation")
+    def generate_answer(self, query: str, retrieved_docs):
+        # 1. Guardrails
+        refusal = self.refusal(query)
+        if refusal:
+            return refusal
+
+        if not retrieved_docs:
+            return "I don't know."
 
-        print("🔍 RAW MODEL OUTPUT:\n", output)
+        # 2. Build context + chat-style prompt
+        prompt, _ = self._build_prompt(query, retrieved_docs)
 
-        answer = output.strip()
+        # 3. Call Ollama REST API
+        try:
+            with span("generation.llm"):
+                output = "".join(self._stream_tokens(prompt))
+        except RuntimeError as e:
+            return str(e)
 
-        # 5. Guardrails grounding
-        if not self.guardrails.is_grounded_output(answer, retrieved_docs):
+        # 4. Grounding + citations
+        return self._finalize(output.strip(), retrieved_docs)
+
+    def stream_answer(self, query: str, retrieved_docs):
+        """
+        Streaming variant of generate_answer. Yields events as dicts:
+          {"event": "citations", "data": [...]}        -- first, before any token
+          {"event": "token", "data": "<fragment>"}     -- forwarded as Ollama produces them
+          {"event": "final", "data": {"answer", "grounded", "prompt_tokens"}}
+                                                       -- grounding check on the full answer
+          {"event": "error", "data": "<message>"}
+        """
+        refusal = self.refusal(query)
+        if refusal:
+            yield {"event": "final", "data": {"answer": refusal, "grounded": False}}
+            return
+
+        yield {"event": "citations", "data": self.citations(retrieved_docs)}
+
+        if not retrieved_docs:
+            yield {"event": "final", "data": {"answer": "I don't know.", "grounded": True}}
+            return
+
+        prompt, stats = self._build_prompt(query, retrieved_docs)
+        tokens = []
+        try:
+            with span("generation.llm"):
+                for token in self._stream_tokens(prompt):
+                    tokens.append(token)
+                    yield {"event": "token", "data": token}
+        except (RuntimeError, requests.RequestException) as e:
+            yield {"event": "error", "data": str(e)}
+            return
+
+        answer = self._finalize("".join(tokens).strip(), retrieved_docs)
+        yield {"event": "final", "data": {
+            "answer": answer, "grounded": answer != "I don't know.", "prompt_tokens": stats["prompt_tokens"]
+        }}
+
+    # --------- ASYNC ---------
+
+    async def _astream_tokens(self, prompt: str):
+        """
+        Async _stream_tokens over the pooled client. 5xx replies (e.g. model
+        still loading) are retried with backoff before any token is emitted.
+        """
+        payload = {"model": self.model_name, "prompt": prompt}
+        for attempt in range(self.max_retries + 1):
+            async with self.aclient.stream("POST", "/api/generate", json=payload) as response:
+                if response.status_code >= 500 and attempt < self.max_retries:
+                    await asyncio.sleep(0.25 * 2 ** attempt)
+                    continue
+                if response.status_code != 200:
+                    body = (await response.aread()).decode(errors="replace")
+                    raise RuntimeError(f"⚠️ Ollama error: {body}")
+
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if data.get("response"):
+                        yield data["response"]
+                    if data.get("done"):
+                        break
+                return
+
+    async def aload_model(self):
+        """
+        Asks Ollama to load the model (a generate call without a prompt), so
+        the first question doesn't wait for it to come off disk.
+        """
+        response = await self.aclient.post("/api/generate", json={"model": self.model_name})
+        if response.status_code != 200:
+            raise RuntimeError(f"⚠️ Ollama error: {response.text}")
+
+    async def _afinalize(self, answer: str, retrieved_docs):
+        # Grounding encodes text: keep it off the event loop
+        return await self.guardrails.embedder.run(self._finalize, answer, retrieved_docs)
+
+    @traced("generation")
+    async def agenerate_answer(self, query: str, retrieved_docs):
+        """
+        Async generate_answer.
+        """
+        refusal = self.refusal(query)
+        if refusal:
+            return refusal
+
+        if not retrieved_docs:
             return "I don't know."
 
-        # 6. Append citations
-        citations = [f"- {doc['filename']} ({doc['drive_url']})" for doc, _ in retrieved_docs]
-        return answer + "\n\nCitations:\n" + "\n".join(citations)
+        prompt, _ = self._build_prompt(query, retrieved_docs)
+        try:
+            with span("generation.llm"):
+                tokens = [token async for token in self._astream_tokens(prompt)]
+        except RuntimeError as e:
+            return str(e)
+
+        return await self._afinalize("".join(tokens).strip(), retrieved_docs)
+
+    async def astream_answer(self, query: str, retrieved_docs):
+        """
+        Async stream_answer; yields the same events.
+        """
+        refusal = self.refusal(query)
+        if refusal:
+            yield {"event": "final", "data": {"answer": refusal, "grounded": False}}
+            return
+
+        yield {"event": "citations", "data": self.citations(retrieved_docs)}
+
+        if not retrieved_docs:
+            yield {"event": "final", "data": {"answer": "I don't know.", "grounded": True}}
+            return
+
+        prompt, stats = self._build_prompt(query, retrieved_docs)
+        tokens = []
+        try:
+            with span("generation.llm"):
+                async for token in self._astream_tokens(prompt):
+                    tokens.append(token)
+                    yield {"event": "token", "data": token}
+        except (RuntimeError, httpx.HTTPError) as e:
+            yield {"event": "error", "data": str(e)}
+            return
+
+        answer = await self._afinalize("".join(tokens).strip(), retrieved_docs)
+        yield {"event": "final", "data": {
+            "answer": answer, "grounded": answer != "I don't know.", "prompt_tokens": stats["prompt_tokens"]
+        }}
 
 
 # 🔹 Main
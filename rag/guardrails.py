@@ -1,66 +1,203 @@
+import os
 import re
-from sentence_transformers import SentenceTransformer, util
+import json
+import hashlib
+import numpy as np
+from rag.cache import LRUCache
+from rag.embeddings import DEFAULT_MODEL, get_embedding_service
+from rag.tracing import traced
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Blocklist patterns (unsafe/harmful)
+DEFAULT_BLOCK_PATTERNS = [
+    r"how to make.*bomb",
+    r"kill myself",
+    r"suicide",
+    r"terrorism",
+    r"child abuse",
+    r"nuke",
+]
+
+# Prompt injection patterns
+DEFAULT_INJECTION_PATTERNS = [
+    r"ignore (all|previous|above) instructions",
+    r"forget (all|previous) instructions",
+    r"reveal (system|hidden) prompt",
+    r"you are now",
+    r"act as",
+    r"pretend to be",
+    r"jailbreak",
+    r"dan",
+]
+
+
+def load_patterns(path=None):
+    """
+    Pattern sets from a JSON file ({"block_patterns": [...], "injection_patterns": [...]}),
+    by default the one named by RAG_GUARDRAILS_CONFIG. Missing keys (or no file)
+    keep the built-in defaults.
+    """
+    path = path or os.getenv("RAG_GUARDRAILS_CONFIG")
+    config = {}
+    if path:
+        with open(path) as f:
+            config = json.load(f)
+    return (
+        list(config.get("block_patterns", DEFAULT_BLOCK_PATTERNS)),
+        list(config.get("injection_patterns", DEFAULT_INJECTION_PATTERNS)),
+    )
+
+
+class InputMatcher:
+    """
+    Precompiled input matcher: each pattern set is compiled once into a single
+    alternation, so a check lowercases the query once and runs at most two
+    regex scans instead of one re.search (and one lower()) per pattern.
+    Matches exactly what a re.search per pattern would.
+    """
+
+    def __init__(self, block_patterns, injection_patterns):
+        self.block = self._compile(block_patterns)
+        self.injection = self._compile(injection_patterns)
+
+    @staticmethod
+    def _compile(patterns):
+        if not patterns:
+            return None
+        return re.compile("|".join(f"(?:{p})" for p in patterns))
+
+    def check(self, query: str):
+        """
+        "unsafe", "injection" or None; a blocked topic wins over an injection attempt.
+        """
+        query = query.lower()
+        if self.block is not None and self.block.search(query):
+            return "unsafe"
+        if self.injection is not None and self.injection.search(query):
+            return "injection"
+        return None
+
+    def is_injection(self, query: str) -> bool:
+        return self.injection is not None and self.injection.search(query.lower()) is not None
 
 
 class Guardrails:
-    def __init__(self, embedding_model="sentence-transformers/all-MiniLM-L6-v2"):
-        # Blocklist patterns (unsafe/harmful)
-        self.block_patterns = [
-            r"how to make.*bomb",
-            r"kill myself",
-            r"suicide",
-            r"terrorism",
-            r"child abuse",
-            r"nuke",
-        ]
-
-        # Prompt injection patterns
-        self.injection_patterns = [
-            r"ignore (all|previous|above) instructions",
-            r"forget (all|previous) instructions",
-            r"reveal (system|hidden) prompt",
-            r"you are now",
-            r"act as",
-            r"pretend to be",
-            r"jailbreak",
-            r"dan",
-        ]
-
-        # Load embedding model once
-        self.embedder = SentenceTransformer(embedding_model)
+    def __init__(self, embedding_model=DEFAULT_MODEL, embedder=None, chunk_cache_size=4096,
+                 block_patterns=None, injection_patterns=None, config_path=None, vector_lookup=None):
+        # Pattern sets: explicit lists, else the JSON config, else the defaults
+        default_block, default_injection = load_patterns(config_path)
+        self.block_patterns = default_block if block_patterns is None else list(block_patterns)
+        self.injection_patterns = default_injection if injection_patterns is None else list(injection_patterns)
+        self.matcher = InputMatcher(self.block_patterns, self.injection_patterns)
+
+        # Shared, process-wide embedding model
+        self.embedder = embedder or get_embedding_service(embedding_model)
+
+        # Vectors of chunks whose hit came without a stored dense_vector
+        self.chunk_vectors = LRUCache(maxsize=chunk_cache_size)
+
+        # Optional {doc id: stored vector} lookup for those (Retriever.stored_vectors)
+        self.vector_lookup = vector_lookup
+
+    @traced("guardrails.input")
+    def check_input(self, query: str):
+        """
+        Pre-retrieval check. Returns "unsafe", "injection" or None.
+        """
+        return self.matcher.check(query)
 
     def is_safe_input(self, query: str) -> bool:
         """
         Keyword-based check for unsafe queries.
         """
-        for pattern in self.block_patterns:
-            if re.search(pattern, query.lower()):
-                return False
-        return True
+        return self.matcher.check(query) != "unsafe"
 
     def is_prompt_injection(self, query: str) -> bool:
         """
         Detect common prompt injection / jailbreak attempts.
         """
-        for pattern in self.injection_patterns:
-            if re.search(pattern, query.lower()):
-                return True
-        return False
+        return self.matcher.is_injection(query)
+
+    def _chunk_key(self, doc):
+        # The text digest keeps a re-ingested chunk (same id, new text) from hitting
+        return (self.embedder.cache_key, doc.get("id"), hashlib.md5(doc["text"].encode()).hexdigest())
+
+    def context_vectors(self, retrieved_docs, dim):
+        """
+        Embeddings of the retrieved chunks without re-encoding them: the
+        hit's dense_vector is used when it carries one (local dense hits, or
+        any hit of a Retriever with source_fields=None), then the chunk vector
+        cache, then vector_lookup (one call for all the remaining ids); only
+        the rest is encoded.
+        """
+        vectors = [None] * len(retrieved_docs)
+        missing = []
+        for i, (doc, _) in enumerate(retrieved_docs):
+            stored = doc.get("dense_vector")
+            if stored is not None and len(stored) == dim:
+                vectors[i] = stored
+            else:
+                vectors[i] = self.chunk_vectors.get(self._chunk_key(doc))
+                if vectors[i] is None:
+                    missing.append(i)
+
+        if missing and self.vector_lookup is not None:
+            try:
+                stored = self.vector_lookup([retrieved_docs[i][0]["id"] for i in missing])
+            except Exception as e:
+                print(f"⚠️ Stored vector lookup failed, encoding the chunks: {e}")
+                stored = {}
+            still_missing = []
+            for i in missing:
+                vector = stored.get(retrieved_docs[i][0]["id"])
+                if vector is not None and len(vector) == dim:
+                    vectors[i] = np.asarray(vector, dtype=np.float32)
+                    self.chunk_vectors.put(self._chunk_key(retrieved_docs[i][0]), vectors[i])
+                else:
+                    still_missing.append(i)
+            missing = still_missing
+
+        if missing:
+            encoded = self.embedder.encode([retrieved_docs[i][0]["text"] for i in missing])
+            for i, vector in zip(missing, encoded):
+                vectors[i] = np.asarray(vector, dtype=np.float32)
+                self.chunk_vectors.put(self._chunk_key(retrieved_docs[i][0]), vectors[i])
+        return np.asarray(vectors, dtype=np.float32)
+
+    @staticmethod
+    def word_overlap(answer: str, contexts, limit=None) -> int:
+        """
+        Answer words (with repeats) that occur as words in the contexts.
+        Set lookups instead of substring scans; stops counting at limit.
+        """
+        vocabulary = set()
+        for text in contexts:
+            vocabulary.update(TOKEN_RE.findall(text.lower()))
+        overlap = 0
+        for word in TOKEN_RE.findall(answer.lower()):
+            if word in vocabulary:
+                overlap += 1
+                if limit is not None and overlap >= limit:
+                    break
+        return overlap
 
+    @traced("guardrails.grounding")
     def is_grounded_output(self, answer: str, retrieved_docs, threshold: float = 0.4) -> bool:
         if "i don't know" in answer.lower():
             return True
+        if not retrieved_docs:
+            return False
 
-        contexts = [doc["text"] for doc, _ in retrieved_docs]
-
-        # Embeddings
-        ans_emb = self.embedder.encode(answer, convert_to_tensor=True)
-        ctx_embs = self.embedder.encode(contexts, convert_to_tensor=True)
-        sims = util.cos_sim(ans_emb, ctx_embs)
-        max_sim = sims.max().item()
+        # Embeddings (cosine similarity): only the answer is encoded, and
+        # directly: answers would only evict queries from the query cache
+        ans_emb = np.asarray(self.embedder.encode([answer])[0], dtype=np.float32)
+        ctx_embs = self.context_vectors(retrieved_docs, len(ans_emb))
+        norms = np.linalg.norm(ctx_embs, axis=1) * np.linalg.norm(ans_emb)
+        sims = ctx_embs @ ans_emb / np.maximum(norms, 1e-12)
+        if float(sims.max()) >= threshold:
+            return True
 
         # Word overlap (backup)
-        context_text = " ".join(contexts).lower()
-        overlap = sum(1 for word in answer.lower().split() if word in context_text)
-
-        return max_sim >= threshold or overlap > 5
+        contexts = [doc["text"] for doc, _ in retrieved_docs]
+        return self.word_overlap(answer, contexts, limit=6) > 5
@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+import httpx
+
+
+class HealthMonitor:
+    """
+    Probes dependency URLs (name -> URL) concurrently, each bounded by
+    timeout seconds, and keeps the last results so health endpoints answer
+    from memory instead of waiting on a hung dependency.
+
+    start() refreshes every interval seconds in a background task; without
+    it, status() probes on demand once the results are older than max_age
+    (default twice the interval). Concurrent callers share one probe round.
+    """
+
+    def __init__(self, targets, timeout=2.0, interval=15.0, max_age=None):
+        self.targets = dict(targets)
+        self.timeout = timeout
+        self.interval = interval
+        self.max_age = 2 * interval if max_age is None else max_age
+        self.results = {}
+        self.checked_at = None
+        self._task = None
+        self._inflight = None
+
+    async def _probe(self, client, url):
+        try:
+            res = await client.get(url)
+        except httpx.TimeoutException:
+            return f"down (no reply within {self.timeout}s)"
+        except Exception as e:
+            return f"down ({str(e)})"
+        return "ok" if res.status_code == 200 else f"error ({res.status_code})"
+
+    async def _refresh(self):
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            statuses = await asyncio.gather(*(self._probe(client, url) for url in self.targets.values()))
+        self.results = dict(zip(self.targets, statuses))
+        self.checked_at = time.monotonic()
+        return self.results
+
+    async def refresh(self):
+        """
+        Probes every target now; joins a round already in flight.
+        """
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._refresh())
+        inflight = self._inflight
+        try:
+            return await asyncio.shield(inflight)
+        finally:
+            if self._inflight is inflight and inflight.done():
+                self._inflight = None
+
+    async def status(self):
+        """
+        Latest results, re-probing only if they are missing or stale.
+        """
+        if self.checked_at is None or time.monotonic() - self.checked_at > self.max_age:
+            return await self.refresh()
+        return self.results
+
+    async def _loop(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,6 +1,13 @@
 import os
-from elasticsearch import Elasticsearch
-from sentence_transformers import SentenceTransformer
+from contextlib import contextmanager
+from elasticsearch import Elasticsearch, helpers
+from rag.embeddings import get_embedding_service
+from rag.ingestion import (
+    MANIFEST_PATH, WORD_CHUNKER_SIGNATURE, apply_changes, load_manifest, save_manifest, scan_changes
+)
+from rag.pipeline import IngestionPipeline
+from rag.profiles import get_profile
+from rag.tracing import span, traced
 
 import dotenv
 
@@ -8,17 +15,65 @@ dotenv.load_dotenv()
 FOLDER_URL = os.getenv("GOOGLE_DRIVE_FOLDER_URL")
 
 class Indexer:
-    def __init__(self, index_name="rag_docs", es_url="http://localhost:9200"): # Adjusted for ES 9.1.2
+    def __init__(self, index_name="rag_docs", es_url="http://localhost:9200", embedder=None,
+                 vector_store=None, bm25_index=None, index_profile=None,
+                 exclude_source_vectors=None, refresh_interval=None): # Adjusted for ES 9.1.2
         self.index_name = index_name
+        self.index_profile = index_profile  # see rag.profiles; None = RAG_INDEX_PROFILE
+        # Keep dense_vector out of the stored _source (still indexed for kNN):
+        # smaller index, but vectors can no longer be reindexed from _source
+        if exclude_source_vectors is None:
+            exclude_source_vectors = os.getenv("RAG_EXCLUDE_SOURCE_VECTORS", "0").lower() in ("1", "true", "yes")
+        self.exclude_source_vectors = exclude_source_vectors
+        # Refresh interval put back after a bulk load (None: the index default)
+        self.refresh_interval = refresh_interval or os.getenv("RAG_REFRESH_INTERVAL") or None
         self.es = Elasticsearch(es_url, verify_certs=False)
-        self.model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-        self.embedding_dim = self.model.get_sentence_embedding_dimension()
+        self.model = embedder or get_embedding_service()
+        # Optional local backends (LocalVectorIndex, BM25Index) kept in sync
+        # with every index / delete
+        self.vector_store = vector_store
+        self.bm25_index = bm25_index
 
-    def create_index(self):
+    @property
+    def local_indexes(self):
+        return [store for store in (self.vector_store, self.bm25_index) if store is not None]
+
+    def _sync_upsert(self, docs, vectors):
+        if self.vector_store is not None:
+            self.vector_store.upsert(docs, vectors)
+        if self.bm25_index is not None:
+            self.bm25_index.upsert(docs)
+
+    def _sync_delete(self, doc_ids):
+        for store in self.local_indexes:
+            store.delete(doc_ids)
+
+    def _sync_flush(self):
+        for store in self.local_indexes:
+            store.flush()
+
+    @property
+    def embedding_dim(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    @traced("indexing.create_index")
+    def create_index(self, profile=None):
         """
         Creates the Elastic index with mappings for BM25, dense vectors, and ELSER placeholder.
         Compatible with Elasticsearch 9.1.2
+        profile names the dense_vector quantization / HNSW settings
+        (rag.profiles.INDEX_PROFILES; default self.index_profile).
         """
+        dense_vector = {  # Dense vector for semantic search
+            "type": "dense_vector",
+            "dims": self.embedding_dim,
+            "index": True,
+            "similarity": "cosine"
+        }
+        index_options = get_profile(profile or self.index_profile)["index_options"]
+        if index_options:
+            dense_vector["index_options"] = index_options
+
         if self.es.indices.exists(index=self.index_name):
             print(f"Index {self.index_name} already exists. Deleting...")
             self.es.indices.delete(index=self.index_name)
@@ -30,51 +85,225 @@ class Indexer:
                     "filename": {"type": "keyword"},
                     "drive_url": {"type": "keyword"},
                     "chunk_id": {"type": "integer"},
+                    "char_start": {"type": "integer"},  # offsets of the chunk in the extracted text
+                    "char_end": {"type": "integer"},
                     "text": {"type": "text"},  # BM25 search
                     "text_expansion": {"type": "rank_features"},  # ELSER placeholder
-                    "dense_vector": {  # Dense vector for semantic search
-                        "type": "dense_vector",
-                        "dims": self.embedding_dim,
-                        "index": True,
-                        "similarity": "cosine"
-                    }
+                    "dense_vector": dense_vector
                 }
             }
         }
 
+        if self.exclude_source_vectors:
+            mapping["mappings"]["_source"] = {"excludes": ["dense_vector"]}
+
         self.es.indices.create(index=self.index_name, body=mapping)
+        for store in self.local_indexes:
+            store.reset()
         print(f"✅ Created index: {self.index_name}")
 
-    def index_documents(self, docs):
+    def _build_body(self, doc, dense_vector):
+        body = {
+            "id": doc["id"],
+            "filename": doc["filename"],
+            "drive_url": doc["drive_url"],
+            "chunk_id": doc["chunk_id"],
+            "text": doc["text"],
+
+            "text_expansion": {"dummy_feature": 1.0},
+
+            "dense_vector": dense_vector
+        }
+        if "char_start" in doc:
+            body["char_start"], body["char_end"] = doc["char_start"], doc["char_end"]
+        return body
+
+    @traced("indexing.index")
+    def index_documents(self, docs, bulk=False, **bulk_options):
         """
         Indexes documents with dense embeddings and placeholder ELSER features.
+        With bulk=True the work is handed to bulk_index_documents (batched
+        encoding + Elasticsearch bulk API); extra keyword arguments go with it.
         """
+        if bulk:
+            return self.bulk_index_documents(docs, **bulk_options)
+
         for doc in docs:
             dense_vector = self.model.encode(doc["text"]).tolist()
+            body = self._build_body(doc, dense_vector)
+            self.es.index(index=self.index_name, id=doc["id"], document=body)
+            self._sync_upsert([body], [dense_vector])
+        self._sync_flush()
 
-            body = {
-                "id": doc["id"],
-                "filename": doc["filename"],
-                "drive_url": doc["drive_url"],
-                "chunk_id": doc["chunk_id"],
-                "text": doc["text"],
+        print(f"✅ Indexed {len(docs)} documents into {self.index_name}")
 
-                "text_expansion": {"dummy_feature": 1.0},
+    def _bulk_actions(self, docs, batch_size):
+        """
+        Lazily encodes docs batch_size at a time and yields bulk index actions,
+        so encoding overlaps with the bulk requests already in flight.
+        """
+        batch = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield from self._encode_batch(batch, batch_size)
+                batch = []
+        if batch:
+            yield from self._encode_batch(batch, batch_size)
 
-                "dense_vector": dense_vector
+    def _encode_batch(self, batch, batch_size):
+        with span("indexing.encode"):
+            vectors = self.model.encode([doc["text"] for doc in batch], batch_size=batch_size)
+        self._sync_upsert(batch, vectors)
+        for doc, vector in zip(batch, vectors):
+            yield {
+                "_op_type": "index",
+                "_index": self.index_name,
+                "_id": doc["id"],
+                "_source": self._build_body(doc, vector.tolist()),
             }
 
-            self.es.index(index=self.index_name, id=doc["id"], document=body)
+    @contextmanager
+    def refresh_disabled(self):
+        """
+        Turns off periodic refresh for the duration of a load, then puts the
+        configured refresh_interval back and refreshes once so the new docs
+        are searchable. The interval is not read from the index: a load that
+        overlapped another one (or followed one that crashed) would read
+        "-1" and leave refresh off for good.
+        """
+        self.es.indices.put_settings(index=self.index_name, settings={"index": {"refresh_interval": "-1"}})
+        try:
+            yield
+        finally:
+            self.es.indices.put_settings(index=self.index_name,
+                                         settings={"index": {"refresh_interval": self.refresh_interval}})
+            self.es.indices.refresh(index=self.index_name)
 
-        print(f"✅ Indexed {len(docs)} documents into {self.index_name}")
+    def bulk_index_documents(self, docs, batch_size=64, chunk_size=500, thread_count=4, queue_size=4):
+        """
+        Bulk indexing path:
+        - chunks are encoded batch_size at a time,
+        - actions are shipped through the bulk API in chunk_size requests,
+          thread_count of them in flight at once, with at most queue_size
+          chunks waiting (so memory stays bounded),
+        - refresh is disabled until the load finishes.
+        Failed items are collected instead of aborting the load.
+        """
+        return self.bulk_index_actions(
+            self._bulk_actions(docs, batch_size), chunk_size=chunk_size, thread_count=thread_count,
+            queue_size=queue_size,
+        )
+
+    @traced("indexing.bulk")
+    def bulk_index_actions(self, actions, chunk_size=500, thread_count=4, queue_size=4):
+        """
+        Ships already-encoded bulk actions (see bulk_index_documents).
+        """
+        indexed = 0
+        errors = []
+        with self.refresh_disabled():
+            results = helpers.parallel_bulk(
+                self.es,
+                actions,
+                thread_count=thread_count,
+                chunk_size=chunk_size,
+                queue_size=queue_size,
+                raise_on_error=False,
+                raise_on_exception=False,
+            )
+            for ok, item in results:
+                if ok:
+                    indexed += 1
+                    continue
+                op_type, info = next(iter(item.items()))
+                error = info.get("error")
+                errors.append({
+                    "id": info.get("_id"),
+                    "op": op_type,
+                    "status": info.get("status"),
+                    "error": error if isinstance(error, (dict, str)) else str(error),
+                })
+        # Chunks ES rejected are dropped locally too, so the backends agree
+        self._sync_delete([error["id"] for error in errors])
+        self._sync_flush()
 
+        print(f"✅ Bulk indexed {indexed} documents into {self.index_name} ({len(errors)} failed)")
+        return {"indexed": indexed, "failed": len(errors), "errors": errors}
 
-if __name__ == "__main__":
-    from rag.ingestion import process_pdfs
+    @traced("indexing.delete")
+    def delete_documents(self, doc_ids, chunk_size=500):
+        """
+        Deletes chunks by id through the bulk API. Ids that are already gone
+        are not errors. Returns the number of delete operations acknowledged.
+        """
+        if not doc_ids:
+            return 0
+        self._sync_delete(doc_ids)
+        self._sync_flush()
+        actions = ({"_op_type": "delete", "_index": self.index_name, "_id": doc_id} for doc_id in doc_ids)
+        deleted, _ = helpers.bulk(
+            self.es, actions, chunk_size=chunk_size, ignore_status=(404,), raise_on_error=False, refresh=True
+        )
+        return deleted
 
+    @traced("indexing.ingest")
+    def incremental_ingest(self, folder_path, drive_url, manifest_path=MANIFEST_PATH, rebuild=False, workers=None,
+                           **options):
+        """
+        Brings the index in line with the PDFs in folder_path, doing work
+        proportional to what changed since the last run:
+        - new / modified PDFs are extracted, embedded and indexed through the
+          streaming IngestionPipeline, so memory stays flat,
+        - chunks of removed PDFs (and past the end of shrunken ones) are deleted,
+        - unchanged PDFs are not read at all (unless a local index is empty
+          and has to be filled).
+        The manifest (file hashes + chunk ids) is rewritten afterwards. A file
+        with a failed chunk is marked dirty in it, so the next run retries it.
+        rebuild=True (or a missing index) recreates the index from scratch.
+        workers and other options go to IngestionPipeline.
+        """
+        if rebuild or not self.es.indices.exists(index=self.index_name):
+            self.create_index()
+            manifest = {"files": {}}
+        else:
+            manifest = load_manifest(manifest_path)
+
+        pipeline = IngestionPipeline(self, drive_url, workers=workers, **options)
+        stale = manifest.get("chunker", WORD_CHUNKER_SIGNATURE) != pipeline.chunker_signature
+        if any(not len(store) for store in self.local_indexes):
+            stale = True  # a local index is missing: re-index everything into it
+        if stale:
+            # Chunking changed: every file's chunks are stale
+            for entry in manifest["files"].values():
+                entry.update(sha256=None, size=None)
+
+        changes, files = scan_changes(folder_path, manifest)
+        changed = [os.path.join(folder_path, f) for f in files if f not in changes["unchanged"]]
+        if changed:
+            report = pipeline.run(changed)
+            chunk_ids, failed_files = pipeline.chunk_ids, pipeline.failed_files
+        else:
+            report = {"indexed": 0, "failed": 0, "errors": [], "stages": {}}
+            chunk_ids, failed_files = {}, []
+
+        new_manifest, delete_ids = apply_changes(manifest, changes, files, chunk_ids, failed_files)
+        new_manifest["chunker"] = pipeline.chunker_signature
+        report["deleted"] = self.delete_documents(delete_ids)
+
+        failed_ids = {error["id"] for error in report["errors"]}
+        for entry in new_manifest["files"].values():
+            if failed_ids.intersection(entry["chunk_ids"]):
+                entry.update(sha256=None, size=None)  # seen as modified next run
+        save_manifest(new_manifest, manifest_path)
+
+        report["files"] = {change: len(fnames) for change, fnames in changes.items()}
+        print(f"✅ Incremental ingest: {report['files']}, {report['deleted']} chunks deleted")
+        return report
+
+
+if __name__ == "__main__":
     local_dir = "data/pdfs"
-    docs = process_pdfs(local_dir, FOLDER_URL)
 
     indexer = Indexer()
-    indexer.create_index()
-    indexer.index_documents(docs)
+    indexer.incremental_ingest(local_dir, FOLDER_URL, rebuild=True)
@@ -1,11 +1,19 @@
 import os
+import json
+import signal
 import hashlib
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import gdown
 from PyPDF2 import PdfReader
 import dotenv
 
 dotenv.load_dotenv()
 FOLDER_URL = os.getenv("GOOGLE_DRIVE_FOLDER_URL")  # Google Drive folder URL
+MANIFEST_PATH = "data/ingest_manifest.json"  # per-file hashes + chunk ids of what is indexed
+# Extraction workers start from a clean interpreter, not a fork of the
+# caller (the API process has threads, sockets and loaded models)
+MP_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
 
 def download_pdfs_from_gdrive(folder_url: str, output_dir: str = "data/pdfs") -> str:
     if os.path.exists(output_dir) and len(os.listdir(output_dir)) > 0:
@@ -17,21 +25,120 @@ def download_pdfs_from_gdrive(folder_url: str, output_dir: str = "data/pdfs") ->
         return output_dir
 
 
-def extract_text_from_pdf(pdf_path: str) -> str:
+def extract_text_from_pdf(pdf_path: str, start: int = 0, stop: int = None) -> str:
     """
-    Extracts raw text from a PDF file.
+    Extracts raw text from a PDF file (optionally only pages [start, stop)).
     """
     reader = PdfReader(pdf_path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() or ""
-    return text
+    return "".join(page.extract_text() or "" for page in reader.pages[start:stop])
+
+
+def _on_timeout(signum, frame):
+    raise TimeoutError("PDF extraction timed out")
+
+
+def _extract_task(pdf_path: str, start: int, stop, max_pages: int, timeout, extract=extract_text_from_pdf):
+    """
+    Worker-side extraction of one PDF or page range. A whole file with more
+    than max_pages pages is not extracted; its page count is returned instead
+    so the parent can split it into ranges. The timeout is enforced inside the
+    worker (SIGALRM), so a stuck parse frees the worker instead of blocking it.
+    """
+    use_alarm = timeout and hasattr(signal, "setitimer")
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        if stop is None:
+            num_pages = len(PdfReader(pdf_path).pages)
+            if num_pages > max_pages:
+                return "split", num_pages
+        return "text", extract(pdf_path, start, stop)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+def iter_extracted_texts(pdf_paths, workers: int = None, timeout: float = 300.0, pages_per_task: int = 64,
+                         max_pending: int = None, extract=extract_text_from_pdf):
+    """
+    Extracts PDFs on a process pool and yields (pdf_path, text) as each file
+    completes; text is None for a file that failed or timed out.
+    - PDFs with more than pages_per_task pages are split into page ranges
+      across workers and re-joined in order, so the text is identical to
+      extract_text_from_pdf.
+    - Each task is limited to timeout seconds.
+    - At most max_pending files (default 2 per worker) are in flight, so
+      extracted text never piles up ahead of a slow consumer.
+    - extract(path, start, stop) does the parsing; it runs in the workers,
+      so it must be a module-level function.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    paths = iter(pdf_paths)
+    parts = {}      # path -> {part index: text}
+    remaining = {}  # path -> tasks still running
+    failed = set()
+    pending = {}
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(MP_START_METHOD)) as pool:
+        def submit_files():
+            while len(remaining) < max_pending:
+                path = next(paths, None)
+                if path is None:
+                    return
+                pending[pool.submit(_extract_task, path, 0, None, pages_per_task, timeout, extract)] = (path, 0)
+                parts[path] = {}
+                remaining[path] = 1
+
+        submit_files()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, part = pending.pop(future)
+                remaining[path] -= 1
+                try:
+                    kind, value = future.result()
+                except Exception as e:
+                    if path not in failed:
+                        print(f"⚠️ Skipping {os.path.basename(path)}: {e!r}")
+                        failed.add(path)
+                    kind = None
+                if kind == "text":
+                    parts[path][part] = value
+                elif kind == "split" and path not in failed:
+                    # Large PDF: one task per page range
+                    for i, start in enumerate(range(0, value, pages_per_task)):
+                        task = pool.submit(_extract_task, path, start, start + pages_per_task, pages_per_task, timeout,
+                                           extract)
+                        pending[task] = (path, i)
+                        remaining[path] += 1
+
+                if remaining[path] == 0:
+                    del remaining[path]
+                    texts = parts.pop(path)
+                    if path in failed:
+                        failed.discard(path)
+                        yield path, None
+                    else:
+                        yield path, "".join(texts[i] for i in sorted(texts))
+                    submit_files()
+
+
+def extract_texts(pdf_paths, workers: int = None, **options):
+    """
+    Extracts several PDFs in parallel (see iter_extracted_texts).
+    Returns {pdf_path: text}; files that failed are left out.
+    """
+    return {path: text for path, text in iter_extracted_texts(pdf_paths, workers, **options) if text is not None}
 
 
 def chunk_text(text: str, chunk_size: int = 300, overlap: int = 50):
     """
     Splits text into overlapping chunks (~300 tokens).
-    Uses simple word splitting for now; can be upgraded to tokenizer-based.
+    Uses simple word splitting; TokenChunker (rag/chunking.py) is the
+    tokenizer-based alternative used when the embedding model provides one.
     """
     words = text.split()
     chunks = []
@@ -41,30 +148,172 @@ def chunk_text(text: str, chunk_size: int = 300, overlap: int = 50):
     return chunks
 
 
-def process_pdfs(folder_path: str, drive_url: str):
+WORD_CHUNKER_SIGNATURE = "words:300:50"
+
+
+def chunk_doc_id(fname: str, idx: int) -> str:
+    return hashlib.md5((fname + str(idx)).encode()).hexdigest()
+
+
+def build_chunks(fname: str, raw_text: str, drive_url: str, chunker=None):
+    """
+    Splits a file's text into chunks and attaches metadata to every chunk.
+    With a TokenChunker, chunks are token windows of the raw text and also
+    carry their char_start / char_end offsets into it.
+    """
+    if chunker is None:
+        pieces = [(chunk, None, None) for chunk in chunk_text(raw_text)]
+    else:
+        pieces = chunker.chunk(raw_text)
+
+    documents = []
+    for idx, (chunk, start, end) in enumerate(pieces):
+        doc = {
+            "id": chunk_doc_id(fname, idx),
+            "filename": fname,
+            "drive_url": drive_url,
+            "chunk_id": idx,
+            "text": chunk
+        }
+        if start is not None:
+            doc["char_start"], doc["char_end"] = start, end
+        documents.append(doc)
+    return documents
+
+
+def process_pdf(fpath: str, drive_url: str, chunker=None):
+    """
+    Extracts and chunks a single PDF, with metadata attached to every chunk.
+    """
+    return build_chunks(os.path.basename(fpath), extract_text_from_pdf(fpath), drive_url, chunker)
+
+
+def process_pdf_files(pdf_paths, drive_url: str, workers: int = None, chunker=None, **extract_options):
+    """
+    Chunks of several PDFs, in the order given.
+    Extraction runs on a pool of `workers` processes (default: one per core)
+    with the options of extract_texts; files that fail there are skipped.
+    workers=1 (or a single core) extracts serially in this process, as before.
+    Returns (documents, list of paths that failed).
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        documents = []
+        for path in pdf_paths:
+            documents.extend(process_pdf(path, drive_url, chunker))
+        return documents, []
+
+    texts = extract_texts(pdf_paths, workers=workers, **extract_options)
+    documents = []
+    for path in pdf_paths:
+        if path in texts:
+            documents.extend(build_chunks(os.path.basename(path), texts[path], drive_url, chunker))
+    return documents, [path for path in pdf_paths if path not in texts]
+
+
+def process_pdfs(folder_path: str, drive_url: str, workers: int = None, chunker=None, **extract_options):
     """
     Loads all PDFs in a folder, extracts text, splits into chunks,
     and attaches metadata.
+    Extraction runs in parallel across cores; workers=1 keeps it serial.
+    chunker: a TokenChunker, or None for word chunks (chunk_text).
     """
-    documents = []
-    for fname in os.listdir(folder_path):
-        if fname.endswith(".pdf"):
-            fpath = os.path.join(folder_path, fname)
-            raw_text = extract_text_from_pdf(fpath)
-            chunks = chunk_text(raw_text)
-
-            for idx, chunk in enumerate(chunks):
-                doc_id = hashlib.md5((fname + str(idx)).encode()).hexdigest()
-                documents.append({
-                    "id": doc_id,
-                    "filename": fname,
-                    "drive_url": drive_url,
-                    "chunk_id": idx,
-                    "text": chunk
-                })
+    pdf_paths = [os.path.join(folder_path, fname) for fname in os.listdir(folder_path) if fname.endswith(".pdf")]
+    documents, _ = process_pdf_files(pdf_paths, drive_url, workers=workers, chunker=chunker, **extract_options)
     return documents
 
 
+# --------- INCREMENTAL INGESTION ---------
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path: str = MANIFEST_PATH):
+    """
+    Manifest of what is currently indexed:
+    {"files": {filename: {"sha256", "size", "mtime_ns", "chunk_ids": [...]}}}
+    """
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path: str = MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def scan_changes(folder_path: str, manifest):
+    """
+    Compares the PDFs in folder_path with the manifest.
+    Returns ({"added", "modified", "removed", "unchanged": [filenames]}, {filename: file info}).
+    Files whose size and mtime match the manifest are not re-hashed.
+    """
+    known = manifest.get("files", {})
+    changes = {"added": [], "modified": [], "removed": [], "unchanged": []}
+    files = {}
+    for fname in sorted(os.listdir(folder_path)):
+        if not fname.endswith(".pdf"):
+            continue
+        stat = os.stat(os.path.join(folder_path, fname))
+        info = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        entry = known.get(fname)
+        if entry and entry.get("size") == info["size"] and entry.get("mtime_ns") == info["mtime_ns"]:
+            info["sha256"] = entry["sha256"]
+        else:
+            info["sha256"] = file_sha256(os.path.join(folder_path, fname))
+        files[fname] = info
+
+        if entry is None:
+            changes["added"].append(fname)
+        elif entry["sha256"] != info["sha256"]:
+            changes["modified"].append(fname)
+        else:
+            changes["unchanged"].append(fname)
+    changes["removed"] = sorted(set(known) - set(files))
+    return changes, files
+
+
+def apply_changes(manifest, changes, files, chunk_ids, failed=()):
+    """
+    Manifest after (re-)indexing the changed files of scan_changes.
+    chunk_ids: {filename: ids of its new chunks}; failed: filenames that could
+    not be extracted. Those keep their old chunks and are marked dirty, so the
+    next run tries them again.
+    Returns (new manifest, ids of chunks to delete): chunks of removed files,
+    and the tail of files that shrank.
+    """
+    known = manifest.get("files", {})
+    delete_ids = []
+    new_files = {}
+    for fname, info in files.items():
+        if fname in changes["unchanged"]:
+            new_files[fname] = dict(known[fname], size=info["size"], mtime_ns=info["mtime_ns"])
+        elif fname in failed:
+            if fname in known:
+                new_files[fname] = dict(known[fname], sha256=None, size=None)
+        else:
+            new_files[fname] = dict(info, chunk_ids=chunk_ids.get(fname, []))
+            if fname in known:
+                # chunk ids are positional, so only chunks past the new end go away
+                kept = set(new_files[fname]["chunk_ids"])
+                delete_ids.extend(cid for cid in known[fname]["chunk_ids"] if cid not in kept)
+
+    for fname in changes["removed"]:
+        delete_ids.extend(known[fname]["chunk_ids"])
+
+    return {"files": new_files}, delete_ids
+
+
 if __name__ == "__main__":
     # Example usage
     local_dir = download_pdfs_from_gdrive(FOLDER_URL)
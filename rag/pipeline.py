@@ -0,0 +1,247 @@
+import os
+import queue
+import threading
+import time
+
+from rag.chunking import TokenChunker
+from rag.ingestion import WORD_CHUNKER_SIGNATURE, build_chunks, extract_text_from_pdf, iter_extracted_texts
+
+_DONE = object()
+
+
+class _Aborted(Exception):
+    """Raised inside a stage when another stage failed."""
+
+
+class StageStats:
+    """
+    Counters for one pipeline stage. wait_in is time spent starved (upstream
+    queue empty), wait_out time spent blocked on a full downstream queue
+    (backpressure); the rest is busy time. The bottleneck is the stage that is
+    busy nearly all the time while the stages before it wait on output.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.wait_in = 0.0
+        self.wait_out = 0.0
+        self.started = None
+        self.finished = None
+
+    def as_dict(self):
+        if self.started is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished or time.perf_counter()) - self.started
+        busy = max(elapsed - self.wait_in - self.wait_out, 0.0)
+        return {
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "elapsed_s": round(elapsed, 3),
+            "busy_s": round(busy, 3),
+            "wait_in_s": round(self.wait_in, 3),
+            "wait_out_s": round(self.wait_out, 3),
+            "items_per_s": round(self.items_out / busy, 1) if busy > 0 else 0.0,
+        }
+
+
+class IngestionPipeline:
+    """
+    Streaming ingestion: extract -> chunk -> embed -> bulk index.
+
+    Each stage runs in its own thread and hands work to the next through a
+    bounded queue, so a slow stage blocks the ones before it instead of letting
+    text, chunks or vectors pile up. Memory stays flat however many PDFs go in:
+    at most a few files, chunk batches and bulk requests are in flight at once.
+
+    - extract: PDFs are parsed on a process pool (workers, default one per
+      core; workers=1 parses serially in the stage thread)
+    - chunk:   text -> chunk documents with metadata; by default token
+      windows of the embedding model's tokenizer (TokenChunker), falling
+      back to word chunks when the model has no fast tokenizer
+    - embed:   chunks are encoded batch_size at a time
+    - index:   bulk API via Indexer.bulk_index_actions, refresh disabled
+
+    After run(), chunk_ids maps each filename to the ids of its chunks and
+    failed_files lists PDFs that could not be extracted.
+    """
+
+    STAGES = ("extract", "chunk", "embed", "index")
+
+    def __init__(self, indexer, drive_url, workers=None, batch_size=64, queue_size=4, chunk_size=500,
+                 thread_count=4, chunker="auto", **extract_options):
+        self.indexer = indexer
+        self.chunker = TokenChunker.from_embedder(indexer.model) if chunker == "auto" else chunker
+        self.drive_url = drive_url
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.chunk_size = chunk_size
+        self.thread_count = thread_count
+        self.extract_options = extract_options
+        self.chunk_ids = {}
+        self.failed_files = []
+        self._stats = {name: StageStats(name) for name in self.STAGES}
+        self._stop = threading.Event()
+        self._errors = []
+
+    @property
+    def chunker_signature(self):
+        return self.chunker.signature if self.chunker is not None else WORD_CHUNKER_SIGNATURE
+
+    def stats(self):
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    # --------- QUEUES ---------
+
+    def _get(self, q, stats):
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    if self._stop.is_set():
+                        raise _Aborted()
+        finally:
+            stats.wait_in += time.perf_counter() - start
+
+    def _put(self, q, item, stats):
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    if self._stop.is_set():
+                        raise _Aborted()
+        finally:
+            stats.wait_out += time.perf_counter() - start
+
+    # --------- STAGES ---------
+
+    def _texts(self, pdf_paths):
+        if self.workers == 1:
+            for path in pdf_paths:
+                yield path, extract_text_from_pdf(path)
+        else:
+            yield from iter_extracted_texts(
+                pdf_paths, self.workers, max_pending=self.queue_size + self.workers, **self.extract_options
+            )
+
+    def _extract(self, pdf_paths, out):
+        stats = self._stats["extract"]
+        stats.items_in = len(pdf_paths)
+        for path, text in self._texts(pdf_paths):
+            self._put(out, (path, text), stats)
+            stats.items_out += 1
+
+    def _chunk(self, inq, out):
+        stats = self._stats["chunk"]
+        while True:
+            item = self._get(inq, stats)
+            if item is _DONE:
+                return
+            path, text = item
+            stats.items_in += 1
+            fname = os.path.basename(path)
+            if text is None:
+                self.failed_files.append(fname)
+                continue
+            docs = build_chunks(fname, text, self.drive_url, self.chunker)
+            self.chunk_ids[fname] = [doc["id"] for doc in docs]
+            for doc in docs:
+                self._put(out, doc, stats)
+                stats.items_out += 1
+
+    def _embed(self, inq, out):
+        stats = self._stats["embed"]
+        batch = []
+        while True:
+            doc = self._get(inq, stats)
+            if doc is not _DONE:
+                batch.append(doc)
+                stats.items_in += 1
+            if batch and (doc is _DONE or len(batch) >= self.batch_size):
+                actions = list(self.indexer._encode_batch(batch, self.batch_size))
+                self._put(out, actions, stats)
+                stats.items_out += len(actions)
+                batch = []
+            if doc is _DONE:
+                return
+
+    def _actions(self, inq):
+        stats = self._stats["index"]
+        while True:
+            actions = self._get(inq, stats)
+            if actions is _DONE:
+                return
+            stats.items_in += len(actions)
+            yield from actions
+
+    def _stage(self, name, fn, *args, out=None):
+        stats = self._stats[name]
+        stats.started = time.perf_counter()
+        try:
+            fn(*args)
+            if out is not None:
+                self._put(out, _DONE, stats)
+        except _Aborted:
+            pass
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            stats.finished = time.perf_counter()
+
+    # --------- RUN ---------
+
+    def run(self, pdf_paths):
+        """
+        Ingests pdf_paths. Returns the bulk report ({"indexed", "failed",
+        "errors"}) plus the per-stage counters under "stages".
+        """
+        pdf_paths = list(pdf_paths)
+        texts = queue.Queue(maxsize=self.queue_size)
+        docs = queue.Queue(maxsize=self.queue_size * self.batch_size)
+        batches = queue.Queue(maxsize=self.queue_size)
+        threads = [
+            threading.Thread(target=self._stage, args=("extract", self._extract, pdf_paths, texts),
+                             kwargs={"out": texts}, name="ingest-extract", daemon=True),
+            threading.Thread(target=self._stage, args=("chunk", self._chunk, texts, docs),
+                             kwargs={"out": docs}, name="ingest-chunk", daemon=True),
+            threading.Thread(target=self._stage, args=("embed", self._embed, docs, batches),
+                             kwargs={"out": batches}, name="ingest-embed", daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        index_stats = self._stats["index"]
+        index_stats.started = time.perf_counter()
+        try:
+            report = self.indexer.bulk_index_actions(
+                self._actions(batches), chunk_size=self.chunk_size, thread_count=self.thread_count,
+                queue_size=self.queue_size,
+            )
+        except _Aborted:
+            report = None
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            index_stats.finished = time.perf_counter()
+            for thread in threads:
+                thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+        index_stats.items_out = report["indexed"]
+        report["stages"] = self.stats()
+        for name, stage in report["stages"].items():
+            print(f"  {name:<8} {stage['items_out']:>7} out  busy {stage['busy_s']:>7.2f}s  "
+                  f"starved {stage['wait_in_s']:>7.2f}s  blocked {stage['wait_out_s']:>7.2f}s  "
+                  f"{stage['items_per_s']:>8.1f}/s")
+        return report
@@ -0,0 +1,62 @@
+import os
+
+# Named trade-offs for the dense_vector field, used by Indexer.create_index
+# (index_options) and by Retriever kNN queries (num_candidates per top_k).
+#
+#   exact        brute-force float vectors, no graph (recall baseline)
+#   default      whatever the cluster defaults to (ES 9.1: bbq_hnsw from 384 dims)
+#   hnsw         float32 HNSW, 4 bytes per dimension
+#   int8         int8 scalar quantization, ~4x smaller than float
+#   int4         int4 scalar quantization, ~8x smaller
+#   bbq          better binary quantization, ~32x smaller, rescored on the
+#                oversampled raw vectors
+#   high_recall  int8 with a denser graph and a wider candidate queue
+#
+# m / ef_construction trade index size and build time for graph quality;
+# num_candidates (top_k * factor, clamped to [min, 10000]) trades query
+# latency for recall. Quantized profiles need more candidates for the same
+# recall, hence the larger factors.
+INDEX_PROFILES = {
+    "exact": {"index_options": {"type": "flat"}, "num_candidates": {"factor": 1, "min": 1}},
+    "default": {"index_options": None, "num_candidates": {"factor": 10, "min": 50}},
+    "hnsw": {
+        "index_options": {"type": "hnsw", "m": 16, "ef_construction": 100},
+        "num_candidates": {"factor": 10, "min": 50},
+    },
+    "int8": {
+        "index_options": {"type": "int8_hnsw", "m": 16, "ef_construction": 100},
+        "num_candidates": {"factor": 15, "min": 75},
+    },
+    "int4": {
+        "index_options": {"type": "int4_hnsw", "m": 16, "ef_construction": 100},
+        "num_candidates": {"factor": 20, "min": 100},
+    },
+    "bbq": {
+        "index_options": {"type": "bbq_hnsw", "m": 16, "ef_construction": 100, "rescore_vector": {"oversample": 3.0}},
+        "num_candidates": {"factor": 20, "min": 100},
+    },
+    "high_recall": {
+        "index_options": {"type": "int8_hnsw", "m": 32, "ef_construction": 200},
+        "num_candidates": {"factor": 25, "min": 200},
+    },
+}
+MAX_NUM_CANDIDATES = 10000  # Elasticsearch's upper bound
+
+
+def get_profile(name=None):
+    """
+    The profile called name (default RAG_INDEX_PROFILE or "default").
+    """
+    name = name or os.getenv("RAG_INDEX_PROFILE", "default")
+    if name not in INDEX_PROFILES:
+        raise ValueError(f"Unknown index profile: {name} (one of {', '.join(INDEX_PROFILES)})")
+    return INDEX_PROFILES[name]
+
+
+def num_candidates(profile, top_k):
+    """
+    kNN candidate queue size for top_k under profile: scales with top_k
+    instead of a fixed 50 that starves recall at larger k.
+    """
+    scaling = profile["num_candidates"]
+    return max(top_k, min(max(top_k * scaling["factor"], scaling["min"]), MAX_NUM_CANDIDATES))
@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+
+from rag.cache import LRUCache
+from rag.tracing import metrics, traced
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# Outcomes where the hits come back in fused order, not cross-encoder order
+FALLBACK_OUTCOMES = ("fallback", "busy", "error")
+
+metrics.describe("rag_rerank_total", "counter", "Rerank calls by outcome (reranked / cached / fallback / busy / error)")
+
+
+class Reranker:
+    """
+    Cross-encoder rerank of fused candidates: over-fetch candidates(top_k)
+    hits, score every (query, chunk text) pair in one batch, and keep the
+    best top_n, so the prompt gets fewer but better chunks.
+
+    - Scores are cached per (query, chunk id, chunk text digest), so repeat
+      and overlapping queries only score the new pairs.
+    - Scoring runs on a dedicated thread with a budget of budget_ms
+      (default RAG_RERANK_BUDGET_MS): past it, the fused order is returned
+      instead. A job that has not started yet is cancelled; one already
+      running still lands its scores in the cache for the next call.
+    - One job is submitted at a time: a call that finds another job pending
+      waits for it within its own budget (its pairs may get scored there),
+      then submits the rest. If the budget runs out first, it keeps the
+      fused order (outcome "busy").
+    - A failing model also falls back to the fused order.
+
+    rerank() / arerank() return (hits, outcome); outcome is one of
+    "reranked", "cached" or FALLBACK_OUTCOMES.
+
+    The model (default RAG_RERANK_MODEL) is a sentence-transformers
+    CrossEncoder loaded on first use; anything with predict(pairs,
+    batch_size=...) works.
+    """
+
+    def __init__(self, model_name=None, model=None, batch_size=32, max_length=256, budget_ms=None,
+                 cache_size=8192, candidates_factor=4, min_candidates=20):
+        self.model_name = model_name or os.getenv("RAG_RERANK_MODEL", DEFAULT_RERANK_MODEL)
+        self._model = model
+        self._load_lock = threading.Lock()
+        self.batch_size = batch_size
+        self.max_length = max_length
+        if budget_ms is None:
+            budget_ms = float(os.getenv("RAG_RERANK_BUDGET_MS", "500"))
+        self.budget = budget_ms / 1000.0
+        self.scores = LRUCache(maxsize=cache_size)
+        self.candidates_factor = candidates_factor
+        self.min_candidates = min_candidates
+        # One scoring thread: the model already uses every core per batch
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="rerank")
+        self._job = None
+        self._job_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+        return self._model
+
+    def candidates(self, top_k):
+        """
+        Hits to fetch before reranking down to top_k.
+        """
+        return max(top_k * self.candidates_factor, self.min_candidates, top_k)
+
+    def _key(self, query, doc):
+        return (self.model_name, query, doc.get("id"), hashlib.md5(doc["text"].encode()).hexdigest())
+
+    def _score(self, pairs, keys):
+        scores = [float(s) for s in self.model.predict(pairs, batch_size=self.batch_size)]
+        for key, score in zip(keys, scores):
+            self.scores.put(key, score)
+        return scores
+
+    def _lookup(self, query, hits):
+        # (keys, cached scores, indexes of the hits still to score)
+        keys = [self._key(query, doc) for doc, _ in hits]
+        scores = [self.scores.get(key) for key in keys]
+        return keys, scores, [i for i, score in enumerate(scores) if score is None]
+
+    def _claim(self, query, hits, keys, missing):
+        # (our scoring job, None), or (None, the pending job to wait for first)
+        with self._job_lock:
+            if self._job is not None and not self._job.done():
+                return None, self._job
+            pairs = [(query, hits[i][0]["text"]) for i in missing]
+            self._job = self._executor.submit(self._score, pairs, [keys[i] for i in missing])
+            return self._job, None
+
+    @staticmethod
+    def _finish(hits, scores, missing, fresh, top_n, outcome):
+        for i, score in zip(missing, fresh):
+            scores[i] = score
+        metrics.inc("rag_rerank_total", (("outcome", outcome),))
+        order = sorted(range(len(hits)), key=lambda i: -scores[i])  # stable: ties keep the fused order
+        return [(hits[i][0], scores[i]) for i in order[:top_n]], outcome
+
+    @staticmethod
+    def _fallback(hits, top_n, outcome, error=None):
+        if error is not None:
+            print(f"⚠️ Rerank failed, keeping the fused order: {error}")
+        metrics.inc("rag_rerank_total", (("outcome", outcome),))
+        return hits[:top_n], outcome
+
+    @traced("rerank")
+    def rerank(self, query, hits, top_n=5):
+        """
+        (hits, outcome): the top_n of hits ([(doc, score)]) by cross-encoder
+        score, or the first top_n in fused order if scoring misses the budget.
+        """
+        if not hits:
+            return [], "reranked"
+        deadline = time.monotonic() + self.budget
+        keys, scores, missing = self._lookup(query, hits)
+        while missing:
+            job, pending = self._claim(query, hits, keys, missing)
+            if job is not None:
+                break
+            if not wait([pending], timeout=max(deadline - time.monotonic(), 0)).done:
+                return self._fallback(hits, top_n, "busy")
+            keys, scores, missing = self._lookup(query, hits)
+        if not missing:
+            return self._finish(hits, scores, [], [], top_n, "cached")
+        try:
+            fresh = job.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeout:
+            job.cancel()
+            return self._fallback(hits, top_n, "fallback")
+        except Exception as e:
+            return self._fallback(hits, top_n, "error", e)
+        return self._finish(hits, scores, missing, fresh, top_n, "reranked")
+
+    @traced("rerank")
+    async def arerank(self, query, hits, top_n=5):
+        """
+        Async rerank: waits for the scoring thread without blocking the loop.
+        """
+        if not hits:
+            return [], "reranked"
+        deadline = time.monotonic() + self.budget
+        keys, scores, missing = self._lookup(query, hits)
+        while missing:
+            job, pending = self._claim(query, hits, keys, missing)
+            if job is not None:
+                break
+            done, _ = await asyncio.wait([asyncio.wrap_future(pending)], timeout=max(deadline - time.monotonic(), 0))
+            if not done:
+                return self._fallback(hits, top_n, "busy")
+            keys, scores, missing = self._lookup(query, hits)
+        if not missing:
+            return self._finish(hits, scores, [], [], top_n, "cached")
+        try:
+            # shield: a timeout abandons the wait, not running scoring (it fills the cache)
+            fresh = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job)),
+                                           max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            job.cancel()  # only drops it if it hasn't started
+            return self._fallback(hits, top_n, "fallback")
+        except Exception as e:
+            return self._fallback(hits, top_n, "error", e)
+        return self._finish(hits, scores, missing, fresh, top_n, "reranked")
@@ -1,91 +1,489 @@
-from elasticsearch import Elasticsearch
-from sentence_transformers import SentenceTransformer
+import asyncio
+import json
+import os
+from elasticsearch import AsyncElasticsearch, Elasticsearch
 import numpy as np
+from rag.bm25 import get_bm25_index
+from rag.embeddings import get_embedding_service
+from rag.fusion import fuse
+from rag.profiles import get_profile, num_candidates
+from rag.tracing import traced
+from rag.vector_store import get_vector_store
+
+HYBRID_STRATEGIES = ("msearch", "rrf", "sequential")
+# What the answer path reads from a hit (context packing, grounding, citations)
+HIT_FIELDS = ("id", "filename", "drive_url", "chunk_id", "char_start", "char_end", "text")
+BACKENDS = ("es", "local")
+
 
 class Retriever:
-    def __init__(self, index_name="rag_docs", es_url="http://localhost:9200"):
+    """
+    Synchronous search methods (search_*) plus async twins (asearch_*) that go
+    through AsyncElasticsearch and encode queries off the event loop. Both
+    share the same request bodies, so they always return identical results.
+
+    dense_backend (default RAG_DENSE_BACKEND or "es") picks where dense
+    search runs: "es" sends a kNN query, "local" scores the query against
+    the memory-mapped LocalVectorIndex in-process (vector_store, default the
+    shared one the Indexer keeps in sync). lexical_backend (default
+    RAG_LEXICAL_BACKEND or "es") does the same for BM25 and the ELSER stub,
+    with the in-process BM25Index (bm25_index). With both local, a hybrid
+    search makes no network request at all.
+
+    index_profile (see rag.profiles, default RAG_INDEX_PROFILE) sets the kNN
+    num_candidates for a given top_k; use the profile the index was created
+    with, or a wider one to buy recall with latency.
+
+    source_fields (default HIT_FIELDS) is the _source projection of every
+    hit, local ones included: the 384-float dense_vector and text_expansion
+    are neither sent nor decoded. Local dense hits keep their dense_vector,
+    which costs nothing in-process. The final hits that go to grounding get
+    their vectors through stored_vectors() instead. None returns whole
+    documents.
+    """
+
+    def __init__(self, index_name="rag_docs", es_url="http://localhost:9200", embedder=None,
+                 connections_per_node=32, dense_backend=None, vector_store=None, lexical_backend=None,
+                 bm25_index=None, index_profile=None, source_fields=HIT_FIELDS):
         self.index_name = index_name
+        self.es_url = es_url
+        self.connections_per_node = connections_per_node
         self.es = Elasticsearch(es_url, verify_certs=False)
-        self.model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+        self.model = embedder or get_embedding_service()
+        self._async_es = None
+        self.dense_backend = dense_backend or os.getenv("RAG_DENSE_BACKEND", "es")
+        self.lexical_backend = lexical_backend or os.getenv("RAG_LEXICAL_BACKEND", "es")
+        for backend in (self.dense_backend, self.lexical_backend):
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown search backend: {backend}")
+        if self.dense_backend == "local" and vector_store is None:
+            vector_store = get_vector_store()
+        if self.lexical_backend == "local" and bm25_index is None:
+            bm25_index = get_bm25_index()
+        self.vector_store = vector_store
+        self.bm25_index = bm25_index
+        self.profile = get_profile(index_profile)
+        self.source_fields = list(source_fields) if source_fields else None
+        self._source = {"includes": self.source_fields} if self.source_fields else None
+
+    @property
+    def async_es(self):
+        # Created on first use so it binds to the running event loop
+        if self._async_es is None:
+            self._async_es = AsyncElasticsearch(
+                self.es_url, verify_certs=False, connections_per_node=self.connections_per_node
+            )
+        return self._async_es
+
+    async def aclose(self):
+        if self._async_es is not None:
+            await self._async_es.close()
+            self._async_es = None
+
+    # --------- REQUEST BODIES ---------
+
+    def _bm25_body(self, query, top_k):
+        body = {
+            "query": {
+                "match": {"text": query}
+            },
+            "size": top_k
+        }
+        return self._projected(body)
+
+    def _projected(self, body):
+        if self._source is not None:
+            body["_source"] = self._source
+        return body
+
+    def _project(self, hits):
+        # Local backends: the same fields ES would have returned
+        if self.source_fields is None:
+            return hits
+        return [({k: doc[k] for k in self.source_fields if k in doc}, score) for doc, score in hits]
+
+    def _local_bm25(self, query, top_k):
+        return self._project(self.bm25_index.search(query, top_k))
+
+    def _local_dense(self, query_vector, top_k):
+        hits = self.vector_store.search(query_vector, top_k)
+        if self.source_fields is None:
+            return hits
+        # The vector is already in memory: keep it for grounding
+        return [(dict(doc, dense_vector=full["dense_vector"]), score)
+                for (doc, score), (full, _) in zip(self._project(hits), hits)]
+
+    def _dense_knn(self, query_vector, top_k):
+        return {
+            "field": "dense_vector",
+            "query_vector": query_vector,
+            "k": top_k,
+            "num_candidates": num_candidates(self.profile, top_k)
+        }
+
+    def _elser_body(self, query, top_k):
+        # ELSER stub: same lexical match as BM25 until the real model is deployed
+        return self._bm25_body(query, top_k)
+
+    def _rrf_retriever(self, query, query_vector, window):
+        return {
+            "rrf": {
+                "retrievers": [
+                    {"standard": {"query": self._bm25_body(query, window)["query"]}},
+                    {"knn": self._dense_knn(query_vector, window)},
+                    {"standard": {"query": self._elser_body(query, window)["query"]}},
+                ],
+                "rank_window_size": window,
+                "rank_constant": 60,
+            }
+        }
+
+    def _msearch_request(self, bodies):
+        # Identical bodies (e.g. BM25 and the ELSER stub) are only sent once
+        unique = {}
+        for body in bodies:
+            unique.setdefault(json.dumps(body, sort_keys=True), body)
+        searches = []
+        for body in unique.values():
+            searches.extend([{"index": self.index_name}, body])
+        return list(unique), searches
+
+    def _msearch_results(self, bodies, keys, responses):
+        results = {}
+        for key, res in zip(keys, responses):
+            if "error" in res:
+                print(f"⚠️ Sub-search failed: {res['error']}")
+                results[key] = []
+            else:
+                results[key] = self._hits(res)
+        return [results[json.dumps(body, sort_keys=True)] for body in bodies]
+
+    @staticmethod
+    def _hits(res):
+        return [(hit["_source"], hit["_score"]) for hit in res["hits"]["hits"]]
+
+    @staticmethod
+    def _window(top_k, window_size):
+        return max(window_size or top_k, top_k)
+
+    def _check_hybrid_options(self, strategy, fusion, weights):
+        if strategy not in HYBRID_STRATEGIES:
+            raise ValueError(f"Unknown hybrid strategy: {strategy}")
+        if strategy == "rrf" and (fusion != "rrf" or weights):
+            raise ValueError("The server-side strategy only supports unweighted RRF fusion")
+        if strategy == "rrf" and "local" in (self.dense_backend, self.lexical_backend):
+            raise ValueError("The server-side strategy needs the Elasticsearch backends")
+
+    def _hybrid_plan(self, query, query_vector, window):
+        # The hybrid sub-searches that still have to go to ES, by retriever
+        plan = {}
+        if self.lexical_backend == "es":
+            plan["bm25"] = self._bm25_body(query, window)
+        if self.dense_backend == "es":
+            plan["dense"] = self._projected({"knn": self._dense_knn(query_vector.tolist(), window), "size": window})
+        if self.lexical_backend == "es":
+            plan["elser"] = self._elser_body(query, window)
+        return plan
+
+    def _hybrid_results(self, query, query_vector, window, results):
+        if self.lexical_backend == "local":
+            # The ELSER stub is the same lexical search: score it once
+            results["bm25"] = results["elser"] = self._local_bm25(query, window)
+        if self.dense_backend == "local":
+            results["dense"] = self._local_dense(query_vector, window)
+        return {name: results[name] for name in ("bm25", "dense", "elser")}
+
+    def _batch_plan(self, search, query_vector):
+        """
+        (ES bodies by name, finish) for one search of a batch; finish turns
+        the hits of those bodies into the search's results. search holds the
+        /query options (question, top_k, mode, hybrid_strategy, fusion,
+        weights, window_size). The sequential strategy is planned like
+        msearch: same hits, without the per-request round trips.
+        """
+        query, top_k, mode = search["question"], search.get("top_k", 5), search.get("mode", "hybrid")
+        if mode in ("bm25", "elser"):
+            if self.lexical_backend == "local":
+                return {}, lambda results: self._local_bm25(query, top_k)
+            body = self._bm25_body(query, top_k) if mode == "bm25" else self._elser_body(query, top_k)
+            return {mode: body}, lambda results: results[mode]
+        if mode == "dense":
+            if self.dense_backend == "local":
+                return {}, lambda results: self._local_dense(query_vector, top_k)
+            body = self._projected({"knn": self._dense_knn(query_vector.tolist(), top_k), "size": top_k})
+            return {"dense": body}, lambda results: results["dense"]
+        if mode != "hybrid":
+            return {}, lambda results: []
+
+        strategy = search.get("hybrid_strategy", "msearch")
+        fusion, weights = search.get("fusion", "rrf"), search.get("weights")
+        self._check_hybrid_options(strategy, fusion, weights)
+        window = self._window(top_k, search.get("window_size"))
+        if strategy == "rrf":
+            body = self._projected(
+                {"retriever": self._rrf_retriever(query, query_vector.tolist(), window), "size": top_k}
+            )
+            return {"rrf": body}, lambda results: results["rrf"]
+
+        def finish(results):
+            results = self._hybrid_results(query, query_vector, window, dict(results))
+            return fuse(results, method=fusion, weights=weights, top_k=top_k)
+        return self._hybrid_plan(query, query_vector, window), finish
+
+    def _batch_plans(self, searches, query_vectors, msearch_size):
+        plans = []
+        for search, query_vector in zip(searches, query_vectors):
+            try:
+                plans.append(self._batch_plan(search, query_vector))
+            except Exception as e:
+                plans.append(e)
+        bodies = [body for plan in plans if not isinstance(plan, Exception) for body in plan[0].values()]
+        keys, searches = self._msearch_request(bodies)
+        # msearch_size sub-searches (header + body pairs) per request
+        chunks = [searches[i:i + 2 * msearch_size] for i in range(0, len(searches), 2 * msearch_size)]
+        return plans, keys, chunks
+
+    def _batch_results(self, plans, keys, chunks, chunk_responses):
+        responses = []
+        for chunk, response in zip(chunks, chunk_responses):
+            if isinstance(response, Exception):
+                # The whole request failed: so did each of its sub-searches
+                responses.extend([{"error": str(response)}] * (len(chunk) // 2))
+            else:
+                responses.extend(response["responses"])
+        by_key = dict(zip(keys, responses))
+
+        results = []
+        for plan in plans:
+            if isinstance(plan, Exception):
+                results.append(plan)
+                continue
+            bodies, finish = plan
+            try:
+                hits = {}
+                for name, body in bodies.items():
+                    res = by_key[json.dumps(body, sort_keys=True)]
+                    if "error" in res:
+                        raise RuntimeError(f"Sub-search failed: {res['error']}")
+                    hits[name] = self._hits(res)
+                results.append(finish(hits))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    # --------- SYNC SEARCH ---------
 
+    @traced("retrieval.bm25")
     def search_bm25(self, query, top_k=5):
         """
         Classic BM25 keyword search.
         """
-        res = self.es.search(
-            index=self.index_name,
-            body={
-                "query": {
-                    "match": {"text": query}
-                },
-                "size": top_k
-            }
-        )
-        return [(hit["_source"], hit["_score"]) for hit in res["hits"]["hits"]]
+        if self.lexical_backend == "local":
+            return self._local_bm25(query, top_k)
+        res = self.es.search(index=self.index_name, body=self._bm25_body(query, top_k))
+        return self._hits(res)
 
+    @traced("retrieval.dense")
     def search_dense(self, query, top_k=5):
         """
         Dense vector search using cosine similarity.
         """
-        query_vector = self.model.encode(query).tolist()
-        res = self.es.search(
-            index=self.index_name,
-            knn={
-                "field": "dense_vector",
-                "query_vector": query_vector,
-                "k": top_k,
-                "num_candidates": 50
-            }
-        )
-        return [(hit["_source"], hit["_score"]) for hit in res["hits"]["hits"]]
+        query_vector = self.model.encode_query(query)
+        if self.dense_backend == "local":
+            return self._local_dense(query_vector, top_k)
+        res = self.es.search(index=self.index_name, knn=self._dense_knn(query_vector.tolist(), top_k),
+                             source=self._source)
+        return self._hits(res)
 
+    @traced("retrieval.elser")
     def search_elser(self, query, top_k=5):
         """
         Stub for ELSER sparse search.
         In real Elastic Cloud, you'd expand query using ELSER model.
         Here, we simulate by treating it as another BM25 field.
         """
-        res = self.es.search(
-            index=self.index_name,
-            body={
-                "query": {
-                    "match": {"text": query}
-                },
-                "size": top_k
-            }
-        )
-        return [(hit["_source"], hit["_score"]) for hit in res["hits"]["hits"]]
+        if self.lexical_backend == "local":
+            return self._local_bm25(query, top_k)
+        res = self.es.search(index=self.index_name, body=self._elser_body(query, top_k))
+        return self._hits(res)
 
-    def reciprocal_rank_fusion(self, results_list, top_k=5, k=60):
+    def reciprocal_rank_fusion(self, results_list, top_k=5, k=60, fetch_sources=False):
         """
         Combine multiple result sets using Reciprocal Rank Fusion (RRF).
         results_list: list of lists of (doc, score) from different retrievers
+        The _source already in the hits is kept; fetch_sources=True re-reads
+        every fused document from ES instead (the original behaviour).
         """
-        scores = {}
-        for results in results_list:
-            for rank, (doc, _) in enumerate(results):
-                doc_id = doc["id"]
-                rr_score = 1.0 / (k + rank + 1)
-                scores[doc_id] = scores.get(doc_id, 0) + rr_score
-
-        # sort docs by fused score
-        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        fused_docs = []
-        for doc_id, score in ranked[:top_k]:
+        fused_docs = fuse(results_list, method="rrf", top_k=top_k, k=k)
+        if fetch_sources:
             # get full document from ES
-            doc = self.es.get(index=self.index_name, id=doc_id)["_source"]
-            fused_docs.append((doc, score))
+            fused_docs = [
+                (self.es.get(index=self.index_name, id=doc["id"], source_includes=self.source_fields)["_source"],
+                 score)
+                for doc, score in fused_docs
+            ]
         return fused_docs
 
-    def search_hybrid(self, query, top_k=5):
+    @traced("retrieval.vectors")
+    def stored_vectors(self, doc_ids):
+        """
+        {doc id: dense_vector} stored at index time, for the few chunks an
+        answer is grounded against (Guardrails vector_lookup): read from the
+        local vector index, or with one _mget. Chunks without a stored vector
+        (e.g. an index that excludes it from _source) are left out.
+        """
+        if not doc_ids:
+            return {}
+        if self.dense_backend == "local":
+            return self.vector_store.vectors(doc_ids)
+        res = self.es.mget(index=self.index_name, ids=list(doc_ids), source_includes=["dense_vector"])
+        return {
+            doc["_id"]: doc["_source"]["dense_vector"]
+            for doc in res["docs"] if doc.get("found") and "dense_vector" in doc.get("_source", {})
+        }
+
+    @traced("retrieval.msearch")
+    def msearch(self, bodies):
+        """
+        Runs several search bodies in one _msearch round trip.
+        Identical bodies are only sent once. A failed sub-search yields [].
+        """
+        keys, searches = self._msearch_request(bodies)
+        responses = self.es.msearch(searches=searches)["responses"]
+        return self._msearch_results(bodies, keys, responses)
+
+    @traced("retrieval.hybrid")
+    def search_hybrid(self, query, top_k=5, strategy="msearch", fusion="rrf", weights=None, window_size=None):
         """
         Hybrid search: BM25 + Dense + ELSER stub fused with RRF.
+        strategy:
+          - "msearch":    all sub-queries in one _msearch request, fused client-side
+                          from the returned hits (1 round trip; sub-searches on a
+                          local backend run in-process instead)
+          - "rrf":        Elasticsearch's server-side RRF retriever (1 round trip)
+          - "sequential": one request per retriever plus an es.get per fused doc
+        fusion / weights: client-side fusion method ("rrf" | "minmax" | "zscore")
+        and per-retriever weights, e.g. {"bm25": 1.0, "dense": 2.0, "elser": 0.5}.
+        window_size: candidates fetched per retriever before fusion (default top_k).
         """
-        bm25 = self.search_bm25(query, top_k=top_k)
-        dense = self.search_dense(query, top_k=top_k)
-        elser = self.search_elser(query, top_k=top_k)
+        self._check_hybrid_options(strategy, fusion, weights)
+        window = self._window(top_k, window_size)
+
+        if strategy == "sequential":
+            bm25 = self.search_bm25(query, top_k=window)
+            dense = self.search_dense(query, top_k=window)
+            elser = self.search_elser(query, top_k=window)
+            if fusion == "rrf" and not weights:
+                return self.reciprocal_rank_fusion([bm25, dense, elser], top_k=top_k, fetch_sources=True)
+            results = {"bm25": bm25, "dense": dense, "elser": elser}
+            return fuse(results, method=fusion, weights=weights, top_k=top_k)
+
+        query_vector = self.model.encode_query(query)
+        if strategy == "rrf":
+            res = self.es.search(
+                index=self.index_name, retriever=self._rrf_retriever(query, query_vector.tolist(), window),
+                size=top_k, source=self._source,
+            )
+            return self._hits(res)
+
+        plan = self._hybrid_plan(query, query_vector, window)
+        results = dict(zip(plan, self.msearch(list(plan.values())))) if plan else {}
+        results = self._hybrid_results(query, query_vector, window, results)
+        return fuse(results, method=fusion, weights=weights, top_k=top_k)
 
-        return self.reciprocal_rank_fusion([bm25, dense, elser], top_k=top_k)
+    @traced("retrieval.batch")
+    def search_batch(self, searches, query_vectors, msearch_size=100):
+        """
+        Runs many searches (see _batch_plan) with their Elasticsearch parts
+        packed into _msearch requests of at most msearch_size sub-searches;
+        identical sub-searches across the batch are sent once. Returns one
+        entry per search: its hits, or the exception it failed with.
+        """
+        plans, keys, chunks = self._batch_plans(searches, query_vectors, msearch_size)
+        chunk_responses = []
+        for chunk in chunks:
+            try:
+                chunk_responses.append(self.es.msearch(searches=chunk))
+            except Exception as e:
+                chunk_responses.append(e)
+        return self._batch_results(plans, keys, chunks, chunk_responses)
+
+    # --------- ASYNC SEARCH ---------
+
+    @traced("retrieval.bm25")
+    async def asearch_bm25(self, query, top_k=5):
+        if self.lexical_backend == "local":
+            return self._local_bm25(query, top_k)
+        res = await self.async_es.search(index=self.index_name, body=self._bm25_body(query, top_k))
+        return self._hits(res)
+
+    @traced("retrieval.dense")
+    async def asearch_dense(self, query, top_k=5):
+        query_vector = await self.model.aencode_query(query)
+        if self.dense_backend == "local":
+            return self._local_dense(query_vector, top_k)  # sub-millisecond, fine on the loop
+        res = await self.async_es.search(index=self.index_name, knn=self._dense_knn(query_vector.tolist(), top_k),
+                                         source=self._source)
+        return self._hits(res)
+
+    @traced("retrieval.elser")
+    async def asearch_elser(self, query, top_k=5):
+        if self.lexical_backend == "local":
+            return self._local_bm25(query, top_k)
+        res = await self.async_es.search(index=self.index_name, body=self._elser_body(query, top_k))
+        return self._hits(res)
+
+    @traced("retrieval.msearch")
+    async def amsearch(self, bodies):
+        keys, searches = self._msearch_request(bodies)
+        responses = (await self.async_es.msearch(searches=searches))["responses"]
+        return self._msearch_results(bodies, keys, responses)
+
+    @traced("retrieval.hybrid")
+    async def asearch_hybrid(self, query, top_k=5, strategy="msearch", fusion="rrf", weights=None, window_size=None):
+        """
+        Async search_hybrid; same options and results.
+        """
+        self._check_hybrid_options(strategy, fusion, weights)
+        window = self._window(top_k, window_size)
+
+        if strategy == "sequential":
+            bm25 = await self.asearch_bm25(query, top_k=window)
+            dense = await self.asearch_dense(query, top_k=window)
+            elser = await self.asearch_elser(query, top_k=window)
+            fused_docs = fuse({"bm25": bm25, "dense": dense, "elser": elser},
+                              method=fusion, weights=weights, top_k=top_k)
+            if fusion == "rrf" and not weights:
+                fused_docs = [
+                    ((await self.async_es.get(index=self.index_name, id=doc["id"],
+                                              source_includes=self.source_fields))["_source"], score)
+                    for doc, score in fused_docs
+                ]
+            return fused_docs
+
+        query_vector = await self.model.aencode_query(query)
+        if strategy == "rrf":
+            res = await self.async_es.search(
+                index=self.index_name, retriever=self._rrf_retriever(query, query_vector.tolist(), window),
+                size=top_k, source=self._source,
+            )
+            return self._hits(res)
+
+        plan = self._hybrid_plan(query, query_vector, window)
+        results = dict(zip(plan, await self.amsearch(list(plan.values())))) if plan else {}
+        results = self._hybrid_results(query, query_vector, window, results)
+        return fuse(results, method=fusion, weights=weights, top_k=top_k)
+
+    @traced("retrieval.batch")
+    async def asearch_batch(self, searches, query_vectors, msearch_size=100):
+        """
+        Async search_batch; the _msearch requests are in flight together.
+        """
+        plans, keys, chunks = self._batch_plans(searches, query_vectors, msearch_size)
+        chunk_responses = await asyncio.gather(
+            *(self.async_es.msearch(searches=chunk) for chunk in chunks), return_exceptions=True
+        )
+        return self._batch_results(plans, keys, chunks, chunk_responses)
 
 
 if __name__ == "__main__":
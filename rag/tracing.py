@@ -0,0 +1,234 @@
+"""
+Stage timing for the RAG pipeline.
+
+    with span("retrieval.bm25"):
+        ...
+
+    @traced("indexing.bulk")
+    def bulk_index_actions(...):
+
+Every span feeds a latency histogram per stage (rag_stage_duration_seconds)
+and, inside tracer.request(), the per-request breakdown that the API turns
+into a Server-Timing header. metrics.render() is the Prometheus text format
+served on /metrics.
+
+RAG_TRACING=0 turns spans into a shared no-op: one attribute check per call.
+"""
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; from a cached BM25 lookup to a long generation
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_timings = contextvars.ContextVar("rag_timings", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Thread-safe histograms and counters keyed by (name, labels), rendered in
+    the Prometheus text exposition format. Labels are a tuple of
+    (key, value) pairs so they can be dict keys.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help = {}
+        self._histograms = {}
+        self._counters = {}
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + value
+
+    def histogram(self, name, **labels):
+        return self._histograms.get((name, tuple(labels.items())))
+
+    def counter(self, name, **labels):
+        return self._counters.get((name, tuple(labels.items())), 0)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self):
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        by_name = {}
+        for (name, labels), value in histograms.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), value in counters.items():
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(by_name):
+            default_kind = "histogram" if any(key[0] == name for key in histograms) else "counter"
+            kind, help_text = self._help.get(name, (default_kind, ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(by_name[name]):
+                if kind != "histogram":
+                    lines.append(f"{name}{self._labels(labels)} {value}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{self._labels(labels)} {total}")
+                lines.append(f"{name}_count{self._labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "stage", "start")
+
+    def __init__(self, tracer, stage):
+        self.tracer = tracer
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Cancellation / generator close are not failures of the stage
+        error = exc_type is not None and issubclass(exc_type, Exception)
+        self.tracer.record(self.stage, time.perf_counter() - self.start, error=error)
+        return False
+
+
+class Tracer:
+    """
+    Hands out spans. enabled defaults to RAG_TRACING (on unless "0"); it is
+    read on every span, so it can be flipped at run time.
+    """
+
+    def __init__(self, enabled=None, metrics=None):
+        if enabled is None:
+            enabled = os.getenv("RAG_TRACING", "1").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self.metrics = metrics or Metrics()
+        self.metrics.describe("rag_stage_duration_seconds", "histogram", "Time spent in a pipeline stage")
+        self.metrics.describe("rag_stage_errors_total", "counter", "Pipeline stages that raised")
+
+    def span(self, stage):
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, stage)
+
+    def record(self, stage, seconds, error=False):
+        labels = (("stage", stage),)
+        self.metrics.observe("rag_stage_duration_seconds", labels, seconds)
+        if error:
+            self.metrics.inc("rag_stage_errors_total", labels)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def request(self):
+        """
+        Collects {stage: seconds} for the spans run in this context (and in
+        tasks / executor calls that copy it) into the yielded dict.
+        """
+        timings = {}
+        token = _timings.set(timings)
+        try:
+            yield timings
+        finally:
+            _timings.reset(token)
+
+
+tracer = Tracer()
+metrics = tracer.metrics
+
+
+def span(stage):
+    """
+    Context manager timing a stage with the process tracer.
+    """
+    return tracer.span(stage)
+
+
+def traced(stage):
+    """
+    Decorator: the whole call (awaited, for coroutine functions) is one span.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return await fn(*args, **kwargs)
+                with _Span(tracer, stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with _Span(tracer, stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing(timings):
+    """
+    Server-Timing header value for a {stage: seconds} breakdown.
+    """
+    return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items())
@@ -0,0 +1,293 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+DEFAULT_PATH = "data/vector_index"
+
+
+class LocalVectorIndex:
+    """
+    In-process dense index: L2-normalized chunk embeddings in a memory-mapped
+    float32 / float16 .npy matrix, with the chunk metadata next to it.
+
+    Files in `path`:
+      vectors.npy  -- (capacity, dim) matrix, opened with mmap
+      docs.json    -- {"dtype", "ids", "docs", "live"}; row i belongs to ids[i]
+      ivf.npz      -- optional IVF partitioning (centroids + row assignments)
+
+    search() scores with blocked NumPy dot products, so a float16 matrix is
+    never materialized as float32 all at once (float16 halves disk and page
+    cache, but the upcast makes a flat scan several times slower on CPU;
+    pair it with IVF). Scores are ES-compatible
+    cosine scores, (1 + cos) / 2. With an IVF partitioning (build_ivf), only
+    the rows of the nprobe closest partitions are scored.
+
+    Upserts overwrite a chunk's row in place (or append); deletes only clear
+    the row's live flag until compact(). Thread-safe; flush() persists.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, dim=None, dtype="float32", block_rows=65536):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.block_rows = block_rows
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._ids = []
+        self._docs = []
+        self._live = np.zeros(0, dtype=bool)
+        self._rows = {}
+        self._count = 0
+        self._centroids = None
+        self._assignments = None
+        self.dim = dim
+        self._load()
+
+    # --------- STORAGE ---------
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if not os.path.exists(self._file("docs.json")):
+            return
+        with open(self._file("docs.json")) as f:
+            meta = json.load(f)
+        self.dtype = np.dtype(meta["dtype"])
+        self._ids = meta["ids"]
+        self._docs = meta["docs"]
+        self._live = np.array(meta["live"], dtype=bool)
+        self._count = len(self._ids)
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._matrix = np.load(self._file("vectors.npy"), mmap_mode="r+")
+        self.dim = self._matrix.shape[1]
+        if os.path.exists(self._file("ivf.npz")):
+            with np.load(self._file("ivf.npz")) as ivf:
+                self._centroids = ivf["centroids"]
+                self._assignments = ivf["assignments"]
+
+    def _ensure_capacity(self, rows):
+        if self._matrix is not None and self._matrix.shape[0] >= rows:
+            return
+        capacity = max(rows, 1024, 2 * (self._matrix.shape[0] if self._matrix is not None else 0))
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self._file("vectors.tmp.npy")
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self.dtype, shape=(capacity, self.dim))
+        if self._matrix is not None:
+            grown[:self._count] = self._matrix[:self._count]
+            grown.flush()
+            del self._matrix
+        del grown
+        os.replace(tmp_path, self._file("vectors.npy"))
+        self._matrix = np.load(self._file("vectors.npy"), mmap_mode="r+")
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self._live)] = self._live[:capacity]
+        self._live = live
+
+    def flush(self):
+        """
+        Persists the metadata (atomically) and the memory-mapped vectors.
+        """
+        with self._lock:
+            if self._matrix is None:
+                return
+            self._matrix.flush()
+            meta = {
+                "dtype": self.dtype.name,
+                "ids": self._ids,
+                "docs": self._docs,
+                "live": self._live[:self._count].tolist(),
+            }
+            tmp_path = self._file("docs.json.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, self._file("docs.json"))
+            if self._centroids is not None:
+                np.savez(self._file("ivf.tmp.npz"), centroids=self._centroids,
+                         assignments=self._assignments[:self._count])
+                os.replace(self._file("ivf.tmp.npz"), self._file("ivf.npz"))
+
+    def reset(self):
+        """
+        Drops every vector (the index is being rebuilt).
+        """
+        with self._lock:
+            self._matrix = None
+            self._ids, self._docs, self._rows, self._count = [], [], {}, 0
+            self._live = np.zeros(0, dtype=bool)
+            self._centroids = self._assignments = None
+            for name in ("vectors.npy", "docs.json", "ivf.npz"):
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+
+    def __len__(self):
+        return int(self._live[:self._count].sum())
+
+    # --------- SYNC ---------
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def upsert(self, docs, vectors):
+        """
+        Adds or replaces chunks. docs are chunk sources (anything but
+        dense_vector is kept as metadata); vectors their embeddings.
+        """
+        vectors = self._normalize(vectors)
+        if not len(docs):
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dim vectors, got {vectors.shape[1]}")
+            new_ids = [doc["id"] for doc in docs if doc["id"] not in self._rows]
+            self._ensure_capacity(self._count + len(set(new_ids)))
+
+            rows = np.empty(len(docs), dtype=np.int64)
+            for i, doc in enumerate(docs):
+                row = self._rows.get(doc["id"])
+                meta = {k: v for k, v in doc.items() if k != "dense_vector"}
+                if row is None:
+                    row = self._rows[doc["id"]] = self._count
+                    self._ids.append(doc["id"])
+                    self._docs.append(meta)
+                    self._count += 1
+                else:
+                    self._docs[row] = meta
+                rows[i] = row
+            self._matrix[rows] = vectors.astype(self.dtype)
+            self._live[rows] = True
+            if self._centroids is not None:
+                self._assign(rows, vectors)
+
+    def vectors(self, doc_ids):
+        """
+        {doc id: stored (normalized) vector} for the live chunks among doc_ids.
+        """
+        with self._lock:
+            rows = {doc_id: self._rows.get(doc_id) for doc_id in doc_ids}
+            return {
+                doc_id: np.asarray(self._matrix[row], dtype=np.float32)
+                for doc_id, row in rows.items() if row is not None and self._live[row]
+            }
+
+    def delete(self, doc_ids):
+        with self._lock:
+            rows = [self._rows[doc_id] for doc_id in doc_ids if doc_id in self._rows]
+            self._live[rows] = False
+            return len(rows)
+
+    def compact(self):
+        """
+        Rewrites the matrix without deleted rows.
+        """
+        with self._lock:
+            keep = np.flatnonzero(self._live[:self._count])
+            vectors = np.asarray(self._matrix[keep], dtype=np.float32)
+            docs = [self._docs[row] for row in keep]
+            assignments = self._assignments[keep] if self._centroids is not None else None
+            centroids = self._centroids
+            self.reset()
+            self.upsert(docs, vectors)
+            if centroids is not None:
+                self._centroids, self._assignments = centroids, assignments
+            self.flush()
+
+    # --------- IVF ---------
+
+    def _assign(self, rows, vectors):
+        needed = max(self._matrix.shape[0], int(rows.max()) + 1)
+        if len(self._assignments) < needed:
+            grown = np.zeros(needed, dtype=np.int32)
+            grown[:len(self._assignments)] = self._assignments
+            self._assignments = grown
+        self._assignments[rows] = np.argmax(vectors @ self._centroids.T, axis=1)
+
+    def build_ivf(self, nlist=None, iterations=10, seed=0):
+        """
+        Partitions the live vectors into nlist clusters (spherical k-means,
+        default ~sqrt(n)). Later upserts are assigned to the closest centroid.
+        """
+        with self._lock:
+            live_rows = np.flatnonzero(self._live[:self._count])
+            vectors = np.asarray(self._matrix[live_rows], dtype=np.float32)
+            nlist = min(nlist or max(1, int(np.sqrt(len(live_rows)))), len(live_rows))
+            rng = np.random.default_rng(seed)
+            centroids = vectors[rng.choice(len(vectors), nlist, replace=False)]
+            for _ in range(iterations):
+                labels = np.argmax(vectors @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, vectors)
+                empty = np.bincount(labels, minlength=nlist) == 0
+                sums[empty] = centroids[empty]
+                centroids = self._normalize(sums)
+            self._centroids = centroids
+            self._assignments = np.zeros(self._matrix.shape[0], dtype=np.int32)
+            self._assign(np.arange(self._count), np.asarray(self._matrix[:self._count], dtype=np.float32))
+
+    # --------- SEARCH ---------
+
+    def _scores(self, rows, query):
+        scores = np.empty(len(rows) if rows is not None else self._count, dtype=np.float32)
+        total = len(scores)
+        for start in range(0, total, self.block_rows):
+            stop = min(start + self.block_rows, total)
+            if rows is None:
+                block = self._matrix[start:stop]
+            else:
+                block = self._matrix[rows[start:stop]]
+            scores[start:stop] = np.asarray(block, dtype=np.float32) @ query
+        return scores
+
+    def search(self, query_vector, top_k=5, nprobe=8):
+        """
+        Top-k live chunks by cosine similarity: [(doc, score)] like an ES kNN
+        hit list. The doc includes its (normalized) dense_vector.
+        """
+        query = self._normalize(query_vector)
+        with self._lock:
+            if not self._count:
+                return []
+            if self._centroids is not None:
+                probe = np.argsort(-(self._centroids @ query))[:nprobe]
+                rows = np.flatnonzero(np.isin(self._assignments[:self._count], probe) & self._live[:self._count])
+                scores = self._scores(rows, query)
+            else:
+                rows = None
+                scores = self._scores(None, query)
+                scores[~self._live[:self._count]] = -np.inf
+
+            k = min(top_k, len(scores))
+            if k == 0:
+                return []
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.lexsort((best, -scores[best]))]
+            hits = []
+            for i in best:
+                if not np.isfinite(scores[i]):
+                    continue
+                row = int(rows[i]) if rows is not None else int(i)
+                doc = dict(self._docs[row], dense_vector=np.asarray(self._matrix[row], dtype=np.float32))
+                hits.append((doc, float((1.0 + scores[i]) / 2.0)))
+            return hits
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_vector_store(path=None, **options) -> LocalVectorIndex:
+    """
+    Process-wide LocalVectorIndex for path (default RAG_VECTOR_INDEX_PATH or
+    data/vector_index), so Indexer and Retriever share one instance.
+    """
+    path = path or os.getenv("RAG_VECTOR_INDEX_PATH", DEFAULT_PATH)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = LocalVectorIndex(path, **options)
+        return _stores[path]
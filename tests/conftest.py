@@ -0,0 +1,16 @@
+import pytest
+
+from benchmarks.stand_ins import FakeElasticsearch
+
+
+@pytest.fixture
+def es():
+    with FakeElasticsearch() as server:
+        yield server
+
+
+@pytest.fixture(scope="module")
+def module_es():
+    # One stand-in per test module, for fixtures that index a corpus once
+    with FakeElasticsearch() as server:
+        yield server
@@ -0,0 +1,30 @@
+"""
+Builders shared by the offline tests. The test doubles themselves
+(FakeElasticsearch, HashingEncoder, ...) live in benchmarks/stand_ins.py.
+"""
+from benchmarks.stand_ins import HashingEncoder
+from rag.embeddings import EmbeddingService
+from rag.indexing import Indexer
+
+
+def make_chunks(texts, files=3, drive_url="https://drive.example"):
+    """
+    Chunk sources for texts, ids doc-0, doc-1, ... spread over `files` PDFs.
+    """
+    return [
+        {"id": f"doc-{i}", "filename": f"file{i % files}.pdf", "drive_url": drive_url, "chunk_id": i, "text": text}
+        for i, text in enumerate(texts)
+    ]
+
+
+def hashing_embedder(encoder=None):
+    return EmbeddingService(model=encoder or HashingEncoder())
+
+
+def make_indexer(es_url, index_name="rag_docs", embedder=None, **options):
+    """
+    Indexer with its index created, embedding with HashingEncoder by default.
+    """
+    indexer = Indexer(index_name=index_name, es_url=es_url, embedder=embedder or hashing_embedder(), **options)
+    indexer.create_index()
+    return indexer
@@ -0,0 +1,129 @@
+import pytest
+from elasticsearch import Elasticsearch
+
+from rag.bm25 import BM25Index, quantize_lengths
+from rag.indexing import Indexer
+from rag.retrieval import Retriever
+from tests.helpers import hashing_embedder, make_chunks, make_indexer
+
+WORDS = ["docker", "container", "image", "kubernetes", "pod", "node", "python", "wheel", "shard", "replica",
+         "network", "volume", "build", "deploy", "cluster", "index"]
+QUERIES = ["docker image", "kubernetes pod node", "python wheel build", "shard replica cluster index",
+           "container network volume", "deploy docker cluster"]
+
+
+def make_docs(n=120):
+    # Varied lengths and term frequencies, deterministic; no two texts alike
+    texts = []
+    for i in range(n):
+        words = [WORDS[(i * 7 + j * j) % len(WORDS)] for j in range(5 + (i * 13) % 41)]
+        texts.append(" ".join(words + [f"chunk{i}"]))
+    return make_chunks(texts, files=5)
+
+
+def ranked(hits, scale=1.0):
+    # Equal scores come back in arbitrary order
+    return sorted((-round(score * scale, 4), doc["id"]) for doc, score in hits)
+
+
+def test_lucene_length_quantization():
+    assert list(quantize_lengths([0, 1, 23, 24, 25])) == [0, 1, 23, 24, 25]
+    assert quantize_lengths([100])[0] == 96
+    lengths = quantize_lengths(range(2000))
+    assert all(lengths[i] <= lengths[i + 1] for i in range(1999)) and all(lengths <= range(2000))
+
+
+@pytest.fixture(scope="module")
+def stand_in(module_es, tmp_path_factory):
+    embedder = hashing_embedder()
+    # The stand-in scores with exact document lengths
+    bm25 = BM25Index(str(tmp_path_factory.mktemp("bm25") / "idx"), quantize_norms=False)
+    indexer = make_indexer(module_es.url, embedder=embedder, bm25_index=bm25)
+    indexer.index_documents(make_docs(), bulk=True)
+    return module_es, indexer, Retriever(es_url=module_es.url, embedder=embedder), \
+        Retriever(es_url=module_es.url, embedder=embedder, lexical_backend="local", bm25_index=bm25)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_local_bm25_matches_stand_in(stand_in, query):
+    _, _, remote, local = stand_in
+    # All matching docs, so ties cannot straddle the cut-off
+    expected = remote.search_bm25(query, top_k=200)
+    hits = local.search_bm25(query, top_k=200)
+    # Lucene 8+ dropped BM25's constant (k1 + 1) factor; the stand-in keeps it
+    assert ranked(hits, scale=2.2) == ranked(expected)
+
+
+def test_persisted_index_loads_lazily(stand_in):
+    _, indexer, _, local = stand_in
+    reloaded = BM25Index(indexer.bm25_index.path, quantize_norms=False)
+    assert reloaded._arrays is None
+    assert ranked(reloaded.search("docker image", 10)) == ranked(local.search_bm25("docker image", 10))
+    assert reloaded.search("nothing matches", 5) == []
+
+
+def test_local_hybrid_needs_no_lexical_requests(stand_in, tmp_path):
+    es, indexer, _, local = stand_in
+    before = dict(es.request_counts)
+    hybrid = local.search_hybrid("docker image", top_k=5)
+    sent = {k: v - before.get(k, 0) for k, v in es.request_counts.items() if v != before.get(k, 0)}
+    assert sent == {"_msearch": 1}  # only the kNN query
+    assert len(hybrid) == 5
+    assert local.search_elser("docker image", 3) == local.search_bm25("docker image", 3)
+
+
+def test_indexer_keeps_bm25_in_sync(stand_in):
+    _, indexer, remote, local = stand_in
+    indexer.delete_documents(["doc-1", "doc-2"])
+    indexer.index_documents([{"id": "doc-new", "filename": "new.pdf", "drive_url": "https://drive.example",
+                              "chunk_id": 0, "text": "docker docker docker image"}], bulk=True)
+    hits = local.search_bm25("docker image", top_k=200)
+    assert hits[0][0]["id"] == "doc-new"
+    assert {"doc-1", "doc-2"}.isdisjoint(d["id"] for d, _ in hits)
+    assert ranked(hits, scale=2.2) == ranked(remote.search_bm25("docker image", top_k=200))
+
+
+def test_merge_matches_full_rebuild(tmp_path, monkeypatch):
+    docs = make_docs(60)
+    merged = BM25Index(str(tmp_path / "merged"))
+    merged.upsert(docs[:40])
+    merged.flush()
+
+    reloaded = BM25Index(merged.path)
+    tokenized = []
+    original = BM25Index._tokenize
+    monkeypatch.setattr(BM25Index, "_tokenize",
+                        lambda self, ids, *args, **kw: tokenized.extend(ids) or original(self, ids, *args, **kw))
+    changed = dict(docs[3], text="wheel wheel python")
+    reloaded.upsert(docs[40:] + [changed])
+    reloaded.delete([docs[5]["id"], docs[7]["id"]])
+    reloaded.flush()
+    # Only the new and changed chunks are tokenized again
+    assert sorted(tokenized) == sorted(d["id"] for d in docs[40:] + [changed])
+
+    full = BM25Index(str(tmp_path / "full"))
+    full.upsert([d for d in docs if d["id"] not in (docs[3]["id"], docs[5]["id"], docs[7]["id"])] + [changed])
+    for query in QUERIES + ["python wheel", "chunk5"]:
+        assert ranked(BM25Index(merged.path).search(query, 200)) == ranked(full.search(query, 200))
+    # Terms only the deleted chunks had leave the vocabulary
+    assert "chunk5" not in reloaded._vocab and "chunk41" in reloaded._vocab
+
+
+def test_parity_with_elasticsearch(tmp_path):
+    es = Elasticsearch("http://localhost:9200", verify_certs=False)
+    try:
+        es.info()
+    except Exception:
+        pytest.skip("Elasticsearch is not running")
+
+    bm25 = BM25Index(str(tmp_path / "idx"))
+    indexer = Indexer(index_name="rag_bm25_parity", embedder=hashing_embedder(), bm25_index=bm25)
+    indexer.create_index()
+    try:
+        indexer.index_documents(make_docs(), bulk=True)
+        remote = Retriever(index_name="rag_bm25_parity", embedder=indexer.model)
+        for query in QUERIES:
+            expected = remote.search_bm25(query, top_k=200)
+            assert ranked(bm25.search(query, 200)) == ranked(expected)
+    finally:
+        indexer.es.indices.delete(index="rag_bm25_parity")
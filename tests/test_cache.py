@@ -0,0 +1,137 @@
+import numpy as np
+from rag import cache as cache_module
+from rag.cache import AnswerCache, EmbeddingCache, LRUCache
+from rag.embeddings import EmbeddingService
+from benchmarks.stand_ins import HashingEncoder
+
+
+def test_lru_eviction_and_counters():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats() == {
+        "size": 2, "maxsize": 2, "hits": 2, "misses": 1, "evictions": 1, "hit_rate": 0.6667
+    }
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    cache = LRUCache(maxsize=4, ttl=10)
+    cache.put("a", 1)
+    now[0] += 5
+    assert cache.get("a") == 1
+    now[0] += 6
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_keys_are_normalized_per_model():
+    cache = EmbeddingCache()
+    cache.put_vector("m1", "What is  Docker?", [1.0, 0.0])
+    assert cache.get_vector("m1", "what is docker?") is not None
+    assert cache.get_vector("m2", "what is docker?") is None
+
+
+def test_persistence_round_trip(tmp_path):
+    path = str(tmp_path / "emb_cache.npz")
+    cache = EmbeddingCache(path=path)
+    cache.put_vector("m", "hello world", [0.5, 0.25, 0.125])
+    cache.save()
+
+    warm = EmbeddingCache(path=path)
+    np.testing.assert_array_equal(warm.get_vector("m", "Hello World"), [0.5, 0.25, 0.125])
+
+
+def test_service_skips_model_on_cache_hit():
+    class CountingEncoder(HashingEncoder):
+        calls = 0
+
+        def encode(self, sentences, **kwargs):
+            CountingEncoder.calls += 1
+            return super().encode(sentences, **kwargs)
+
+    service = EmbeddingService(model=CountingEncoder(), cache=EmbeddingCache())
+    first = service.encode_query("Explain Docker")
+    second = service.encode_query("explain   docker")
+    assert CountingEncoder.calls == 1
+    np.testing.assert_array_equal(first, second)
+    assert service.cache.stats()["hits"] == 1
+
+
+def test_answer_cache_exact_and_semantic_hits():
+    cache = AnswerCache(threshold=0.9)
+    scope = ("hybrid", 5)
+    cache.store(scope, "What is Docker?", [1.0, 0.0], ["a", "b"], "answer")
+
+    assert cache.lookup(scope, "what is  docker?") == "answer"
+    assert cache.lookup(("bm25", 5), "What is Docker?") is None
+
+    # paraphrase: close embedding, same chunks
+    assert cache.lookup_similar(scope, [0.95, 0.1], ["a", "b"]) == "answer"
+    # same neighbourhood but retrieval changed -> not served
+    assert cache.lookup_similar(scope, [0.95, 0.1], ["a", "c"]) is None
+    assert cache.lookup_similar(scope, [0.0, 1.0], ["a", "b"]) is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["semantic_hits"], stats["stale"]) == (1, 1, 1)
+
+
+def test_answer_cache_invalidate_drops_in_flight_answers():
+    cache = AnswerCache()
+    generation = cache.generation
+    cache.store("s", "q", [1.0], ["a"], "old")
+    cache.invalidate()
+    cache.store("s", "q", [1.0], ["a"], "stale", generation=generation)
+    assert cache.lookup("s", "q") is None
+    cache.store("s", "q", [1.0], ["a"], "new", generation=cache.generation)
+    assert cache.lookup("s", "q") == "new"
+
+
+def test_query_route_serves_repeats_from_answer_cache(monkeypatch):
+    from fastapi.testclient import TestClient
+    from rag import api
+
+    doc = {"id": "a", "filename": "docker.pdf", "drive_url": "u", "text": "Docker builds containers."}
+    calls = {"retrieve": 0, "generate": 0}
+
+    class StubRetriever:
+        model = EmbeddingService(model=HashingEncoder())
+
+        async def asearch_bm25(self, question, top_k=5):
+            calls["retrieve"] += 1
+            return [(doc, 1.0)]
+
+        async def aclose(self):
+            pass
+
+    class StubGenerator:
+        citations = staticmethod(api.AnswerGenerator.citations)
+
+        def refusal(self, question):
+            return None
+
+        async def agenerate_answer(self, question, retrieved):
+            calls["generate"] += 1
+            return "Docker builds containers."
+
+        async def aclose(self):
+            pass
+
+    monkeypatch.setattr(api, "retriever", StubRetriever())
+    monkeypatch.setattr(api, "generator", StubGenerator())
+    monkeypatch.setattr(api, "answer_cache", AnswerCache())
+
+    client = TestClient(api.app)
+    first = client.post("/query", json={"question": "What is Docker?", "mode": "bm25"}).json()
+    second = client.post("/query", json={"question": "what is docker?", "mode": "bm25"}).json()
+    assert first == second
+    assert calls == {"retrieve": 1, "generate": 1}
+
+    client.post("/query", json={"question": "What is Docker?", "mode": "bm25", "top_k": 3})
+    assert calls == {"retrieve": 2, "generate": 2}
+    assert client.get("/cache/stats").json()["answers"]["hits"] == 1
@@ -0,0 +1,42 @@
+from rag.chunking import TokenChunker
+from rag.embeddings import EmbeddingService
+from benchmarks.stand_ins import HashingEncoder, make_wordpiece_tokenizer
+
+TEXT = " ".join(
+    f"Section {i}: docker containers run the image, kubernetes schedules pods across nodes."
+    for i in range(40)
+)
+
+
+def test_windows_fit_the_token_budget():
+    tokenizer = make_wordpiece_tokenizer()
+    chunker = TokenChunker(tokenizer, max_tokens=64, overlap=16)
+    chunks = chunker.chunk(TEXT)
+    total = len(tokenizer(TEXT, add_special_tokens=False)["input_ids"])
+
+    assert len(chunks) > 1
+    for text, start, end in chunks:
+        assert text == TEXT[start:end]
+        assert len(tokenizer(text, add_special_tokens=False)["input_ids"]) <= 64
+    # windows start every 48 tokens and the last one reaches the end of the text
+    assert len(chunks) == -(-(total - 16) // 48)
+    assert chunks[0][1] == 0 and chunks[-1][2] == len(TEXT.rstrip())
+    # consecutive windows overlap
+    assert all(nxt[1] < prev[2] for prev, nxt in zip(chunks, chunks[1:]))
+
+
+def test_batch_spans_match_single_documents():
+    chunker = TokenChunker(make_wordpiece_tokenizer(), max_tokens=32, overlap=8)
+    texts = [TEXT, "short text", ""]
+    assert chunker.spans(texts) == [chunker.spans([t])[0] for t in texts]
+    assert chunker.spans([""]) == [[]]
+
+
+def test_from_embedder_uses_the_model_tokenizer():
+    assert TokenChunker.from_embedder(EmbeddingService(model=HashingEncoder())) is None
+
+    encoder = HashingEncoder()
+    encoder.tokenizer = make_wordpiece_tokenizer()
+    encoder.max_seq_length = 128
+    chunker = TokenChunker.from_embedder(EmbeddingService(model=encoder), overlap=10)
+    assert (chunker.max_tokens, chunker.overlap) == (128, 10)
@@ -0,0 +1,45 @@
+from rag.context import ContextBuilder
+from rag.ingestion import build_chunks
+from rag.chunking import TokenChunker
+from benchmarks.stand_ins import make_wordpiece_tokenizer
+
+SENTENCES = [f"Sentence {i} talks about {'docker images' if i % 7 == 0 else 'other things'}." for i in range(120)]
+TEXT = " ".join(SENTENCES)
+
+
+def hits(docs):
+    return [(doc, 1.0 / (rank + 1)) for rank, doc in enumerate(docs)]
+
+
+def test_overlapping_word_chunks_are_sent_once():
+    docs = build_chunks("a.pdf", TEXT, "u")  # 300-word windows overlapping by 50
+    assert len(docs) >= 3
+    passages = ContextBuilder().passages(hits([docs[1], docs[0], docs[2]]))
+    assert len(passages) == 1
+    assert passages[0]["text"] == " ".join(TEXT.split()[:len(docs[0]["text"].split()) + 250 + 250])
+
+
+def test_overlapping_token_chunks_use_offsets():
+    chunker = TokenChunker(make_wordpiece_tokenizer(), max_tokens=64, overlap=16)
+    docs = build_chunks("a.pdf", TEXT, "u", chunker)
+    merged = ContextBuilder().passages(hits(docs[:3]))
+    assert merged[0]["text"] == TEXT[docs[0]["char_start"]:docs[2]["char_end"]]
+
+
+def test_packing_respects_budget_and_prefers_query_terms():
+    docs = build_chunks("a.pdf", TEXT, "u") + build_chunks("b.pdf", "Unrelated text. More of it.", "u")
+    builder = ContextBuilder(max_tokens=60)
+    context = builder.build("How are docker images built?", hits(docs))
+
+    assert context["tokens"] <= 60
+    assert 0 < context["sentences"] < context["candidates"]
+    assert context["text"].startswith("[a.pdf] Sentence 0 talks about docker images.")
+    assert "other things" not in context["text"]
+    assert context["sources"] == ["a.pdf"]
+
+
+def test_everything_fits_in_a_large_budget():
+    docs = build_chunks("a.pdf", TEXT, "u")
+    context = ContextBuilder(max_tokens=100_000).build("docker", hits(docs))
+    assert context["sentences"] == context["candidates"] == len(SENTENCES)
+    assert context["text"] == f"[a.pdf] {TEXT}\n\n"
@@ -0,0 +1,83 @@
+import threading
+import numpy as np
+from rag import embeddings
+from rag.embeddings import EmbeddingService, get_embedding_service
+from benchmarks.stand_ins import HashingEncoder
+
+
+class CountingEncoder(HashingEncoder):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        self.calls.append(len(sentences))
+        return super().encode(sentences, batch_size=batch_size, **kwargs)
+
+
+def test_concurrent_queries_are_micro_batched():
+    model = CountingEncoder()
+    service = EmbeddingService(model=model, max_batch_size=8, max_wait_ms=50)
+    queries = [f"question number {i}" for i in range(32)]
+    results = [None] * len(queries)
+    barrier = threading.Barrier(len(queries))
+
+    def worker(i):
+        barrier.wait()
+        results[i] = service.encode_query(queries[i])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(queries))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for query, vector in zip(queries, results):
+        np.testing.assert_allclose(vector, HashingEncoder().encode(query), rtol=1e-6)
+    assert sum(model.calls) == len(queries)
+    assert max(model.calls) <= 8
+    assert len(model.calls) < len(queries)
+
+
+def test_encode_errors_reach_the_caller():
+    class Broken(HashingEncoder):
+        def encode(self, *args, **kwargs):
+            raise RuntimeError("boom")
+
+    service = EmbeddingService(model=Broken())
+    try:
+        service.encode_query("anything")
+    except RuntimeError as e:
+        assert str(e) == "boom"
+    else:
+        raise AssertionError("expected RuntimeError")
+
+
+def test_components_share_one_service(monkeypatch):
+    monkeypatch.setattr(embeddings, "_services", {})
+    shared = get_embedding_service()
+    assert get_embedding_service() is shared
+
+    from rag.guardrails import Guardrails
+    from rag.indexing import Indexer
+    from rag.retrieval import Retriever
+
+    assert Retriever().model is shared
+    assert Indexer().model is shared
+    assert Guardrails().embedder is shared
+    assert shared._model is None  # nothing loaded until first encode
+
+
+def test_encode_queries_batches_misses_once():
+    from rag.cache import EmbeddingCache
+
+    model = CountingEncoder()
+    service = EmbeddingService(model=model, cache=EmbeddingCache())
+    service.encode_query("cached question")
+    texts = ["first question", "cached question", "second question", "first question"]
+    vectors = service.encode_queries(texts)
+
+    assert model.calls == [1, 2]  # one query, then the two distinct misses together
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_allclose(vector, HashingEncoder().encode(text), rtol=1e-6)
+    assert service.encode_queries([]) == []
@@ -0,0 +1,51 @@
+import pytest
+from rag.fusion import fuse
+
+
+def hits(*ids_and_scores):
+    return [({"id": doc_id, "text": f"text of {doc_id}"}, score) for doc_id, score in ids_and_scores]
+
+
+def reference_rrf(results_list, top_k, k=60):
+    scores = {}
+    for results in results_list:
+        for rank, (doc, _) in enumerate(results):
+            scores[doc["id"]] = scores.get(doc["id"], 0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+
+
+def test_rrf_matches_reference_and_keeps_sources():
+    bm25 = hits(("a", 9.0), ("b", 7.0), ("c", 1.0))
+    dense = hits(("c", 0.9), ("a", 0.8), ("d", 0.7))
+    fused = fuse([bm25, dense, bm25], top_k=3)
+    assert [(d["id"], pytest.approx(s)) for d, s in fused] == reference_rrf([bm25, dense, bm25], 3)
+    assert fused[0][0] is bm25[0][0]
+
+
+def test_weights_change_the_winner():
+    results = {"bm25": hits(("a", 5.0), ("b", 4.0)), "dense": hits(("b", 0.9), ("a", 0.1))}
+    assert fuse(results, top_k=1)[0][0]["id"] == "a"  # tie broken by first-seen
+    assert fuse(results, weights={"dense": 2.0}, top_k=1)[0][0]["id"] == "b"
+
+
+def test_minmax_and_zscore():
+    results = {"bm25": hits(("a", 10.0), ("b", 5.0), ("c", 0.0)), "dense": hits(("c", 0.9), ("b", 0.5))}
+    minmax = dict((d["id"], s) for d, s in fuse(results, method="minmax", top_k=3))
+    assert minmax == pytest.approx({"a": 1.0, "b": 0.5, "c": 1.0})
+
+    zscore = [d["id"] for d, _ in fuse(results, method="zscore", top_k=3)]
+    assert zscore == ["a", "c", "b"]
+
+
+def test_deep_candidate_lists():
+    bm25 = hits(*[(f"d{i}", 200.0 - i) for i in range(150)])
+    dense = hits(*[(f"d{149 - i}", 1.0 - i / 150) for i in range(150)])
+    fused = fuse({"bm25": bm25, "dense": dense}, top_k=10)
+    assert len(fused) == 10
+    assert len({d["id"] for d, _ in fused}) == 10
+
+
+def test_empty_and_unknown_method():
+    assert fuse({"bm25": [], "dense": []}) == []
+    with pytest.raises(ValueError):
+        fuse([hits(("a", 1.0))], method="borda")
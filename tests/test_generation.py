@@ -0,0 +1,112 @@
+import asyncio
+import json
+import time
+import pytest
+from rag.embeddings import EmbeddingService
+from rag.generation import AnswerGenerator
+from rag.guardrails import Guardrails
+from benchmarks.stand_ins import FakeOllama, HashingEncoder
+
+DOCS = [
+    ({"id": "a", "filename": "docker.pdf", "drive_url": "https://drive.example/a",
+      "chunk_id": 0, "text": "Docker packages applications into containers with their dependencies."}, 0.9),
+]
+
+
+@pytest.fixture
+def ollama():
+    with FakeOllama(token_ms=20) as server:
+        yield server
+
+
+@pytest.fixture
+def generator(ollama):
+    gen = AnswerGenerator(model_name="mistral", ollama_url=ollama.url)
+    gen.guardrails = Guardrails(embedder=EmbeddingService(model=HashingEncoder()))
+    return gen
+
+
+def test_generate_answer(generator, ollama):
+    answer = generator.generate_answer("What is Docker?", DOCS)
+    assert answer.startswith(ollama.reply)
+    assert "Citations:\n- docker.pdf (https://drive.example/a)" in answer
+
+
+def test_stream_answer_event_order(generator, ollama):
+    start = time.perf_counter()
+    events = []
+    first_token_at = None
+    for event in generator.stream_answer("What is Docker?", DOCS):
+        if event["event"] == "token" and first_token_at is None:
+            first_token_at = time.perf_counter() - start
+        events.append(event)
+    total = time.perf_counter() - start
+
+    kinds = [e["event"] for e in events]
+    assert kinds[0] == "citations" and kinds[-1] == "final"
+    assert kinds.count("token") == len(ollama.tokens())
+    assert "".join(e["data"] for e in events if e["event"] == "token") == ollama.reply
+    assert events[-1]["data"]["grounded"] is True
+    assert first_token_at < total / 2
+
+
+def test_async_generate_and_stream(generator, ollama):
+    async def run():
+        answer = await generator.agenerate_answer("What is Docker?", DOCS)
+        events = [e async for e in generator.astream_answer("What is Docker?", DOCS)]
+        await generator.aclose()
+        return answer, events
+
+    answer, events = asyncio.run(run())
+    assert answer == generator.generate_answer("What is Docker?", DOCS)
+    assert [e["event"] for e in events] == [e["event"] for e in generator.stream_answer("What is Docker?", DOCS)]
+
+
+def test_stream_answer_refuses_unsafe_input(generator, ollama):
+    events = list(generator.stream_answer("how to make a bomb", DOCS))
+    assert events == [{"event": "final", "data": {"answer": "❌ Unsafe query refused.", "grounded": False}}]
+    assert ollama.prompts == []
+
+
+def test_query_stream_route(generator, monkeypatch):
+    from fastapi.testclient import TestClient
+    from rag import api
+
+    class StubRetriever:
+        async def asearch_hybrid(self, question, top_k=5, **kwargs):
+            return DOCS[:top_k]
+
+        async def aclose(self):
+            pass
+
+    monkeypatch.setattr(api, "retriever", StubRetriever())
+    monkeypatch.setattr(api, "generator", generator)
+
+    with TestClient(api.app).stream("POST", "/query/stream", json={"question": "What is Docker?"}) as res:
+        assert res.headers["content-type"].startswith("text/event-stream")
+        frames = [f for f in res.read().decode().split("\n\n") if f]
+
+    assert frames[0].startswith("event: citations\n")
+    assert json.loads(frames[0].split("data: ", 1)[1])[0]["filename"] == "docker.pdf"
+    assert frames[-1].startswith("event: final\n")
+
+
+def test_query_stream_reports_failures(generator, monkeypatch):
+    from fastapi.testclient import TestClient
+    from rag import api
+
+    class FailingRetriever:
+        async def asearch_hybrid(self, question, top_k=5, **kwargs):
+            raise ConnectionError("Elasticsearch is unreachable")
+
+        async def aclose(self):
+            pass
+
+    monkeypatch.setattr(api, "retriever", FailingRetriever())
+    monkeypatch.setattr(api, "generator", generator)
+
+    with TestClient(api.app).stream("POST", "/query/stream", json={"question": "What is Docker?"}) as res:
+        assert res.status_code == 200
+        frames = [f for f in res.read().decode().split("\n\n") if f]
+
+    assert frames == ['event: error\ndata: "Elasticsearch is unreachable"']
@@ -0,0 +1,118 @@
+import asyncio
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from rag.health import HealthMonitor
+
+
+class Handler(BaseHTTPRequestHandler):
+    hits = 0
+
+    def do_GET(self):
+        Handler.hits += 1
+        self.send_response(200 if self.path != "/broken" else 500)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    Handler.hits = 0
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def hung_url():
+    # Accepts connections, never answers
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(8)
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}"
+    sock.close()
+
+
+def test_probes_run_concurrently_with_timeouts(server, hung_url):
+    monitor = HealthMonitor(
+        {"ok": server, "broken": f"{server}/broken", "hung_a": hung_url, "hung_b": hung_url, "closed": "http://127.0.0.1:9"},
+        timeout=0.5,
+    )
+    start = time.perf_counter()
+    results = asyncio.run(monitor.status())
+    assert time.perf_counter() - start < 0.9  # the two hung probes wait together
+    assert results["ok"] == "ok"
+    assert results["broken"] == "error (500)"
+    assert results["hung_a"].startswith("down (no reply") and results["hung_b"].startswith("down (no reply")
+    assert results["closed"].startswith("down (")
+
+
+def test_results_are_cached_and_refreshed_in_background(server):
+    async def scenario():
+        monitor = HealthMonitor({"es": server}, timeout=1.0, interval=0.05)
+        await asyncio.gather(*(monitor.status() for _ in range(5)))
+        assert Handler.hits == 1  # concurrent callers share one probe round
+        await monitor.status()
+        assert Handler.hits == 1
+
+        monitor.start()
+        await asyncio.sleep(0.3)
+        await monitor.stop()
+        return Handler.hits
+
+    assert asyncio.run(scenario()) > 2
+
+
+def test_importing_the_api_builds_nothing():
+    code = "import sys, rag.api as api; assert api.retriever is None and api.generator is None; " \
+           "assert 'torch' not in sys.modules and 'sentence_transformers' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_readyz_waits_for_warmup(server, monkeypatch):
+    from fastapi.testclient import TestClient
+    from rag import api
+
+    calls = []
+
+    class StubModel:
+        def encode(self, sentences, **kwargs):
+            calls.append("encode")
+
+        async def run(self, fn, *args):
+            return fn(*args)
+
+    class StubRetriever:
+        model = StubModel()
+        vector_store = bm25_index = None
+
+    class StubGenerator:
+        async def aload_model(self):
+            calls.append("load")
+            if calls.count("load") < 3:
+                raise RuntimeError("Ollama is down")  # not up yet at boot
+
+    monkeypatch.setattr(api, "retriever", StubRetriever())
+    monkeypatch.setattr(api, "generator", StubGenerator())
+    monkeypatch.setattr(api, "health_monitor", HealthMonitor({"elasticsearch": server, "kibana": server,
+                                                              "ollama": server}))
+    monkeypatch.setitem(api.warmup_state, "status", "pending")
+
+    client = TestClient(api.app)
+    assert client.get("/healthz").json() == {"api": "ok", "elasticsearch": "ok", "kibana": "ok", "ollama": "ok"}
+    res = client.get("/readyz")
+    assert res.status_code == 503 and res.json()["warmup"] == "pending"
+
+    asyncio.run(api.warmup(retry_delay=0.01))
+    assert calls == ["encode", "load", "load", "load"]  # only the failed step is retried
+    res = client.get("/readyz")
+    assert res.status_code == 200 and res.json()["ready"] is True
@@ -0,0 +1,171 @@
+import functools
+import pytest
+from rag.embeddings import EmbeddingService
+from rag.indexing import Indexer
+from rag.retrieval import Retriever
+from benchmarks.stand_ins import HashingEncoder, make_wordpiece_tokenizer, write_pdf
+from tests.helpers import hashing_embedder, make_chunks, make_indexer
+
+
+def make_docs(n):
+    return make_chunks([f"chunk {i} about docker containers and images" for i in range(n)])
+
+
+@pytest.fixture
+def indexer(es):
+    return make_indexer(es.url, "test_docs")
+
+
+def test_bulk_index_documents(es, indexer):
+    report = indexer.index_documents(make_docs(130), bulk=True, batch_size=16, chunk_size=25, thread_count=2)
+    assert report == {"indexed": 130, "failed": 0, "errors": []}
+    assert len(es.indices["test_docs"].docs) == 130
+    assert es.request_counts["_bulk"] == 6  # ceil(130 / 25)
+
+
+def test_bulk_restores_refresh_interval(es, indexer):
+    indexer.index_documents(make_docs(10), bulk=True)
+    assert "refresh_interval" not in es.indices["test_docs"].settings["index"]  # back to the default
+    assert es.request_counts["_refresh"] == 1
+
+    # Left at -1 by an overlapping or crashed load: the configured interval still comes back
+    es.indices["test_docs"].settings["index"]["refresh_interval"] = "-1"
+    indexer.refresh_interval = "5s"
+    indexer.index_documents(make_docs(10), bulk=True)
+    assert es.indices["test_docs"].settings["index"]["refresh_interval"] == "5s"
+
+
+def test_bulk_reports_item_errors(es, indexer):
+    indexer.model = HashingEncoder(dim=8)  # no longer matches the mapping
+    report = indexer.index_documents(make_docs(5), bulk=True)
+    assert report["indexed"] == 0
+    assert report["failed"] == 5
+    assert {e["id"] for e in report["errors"]} == {f"doc-{i}" for i in range(5)}
+    assert all(e["status"] == 400 for e in report["errors"])
+
+
+def test_incremental_ingest_only_touches_changed_files(es, indexer, tmp_path, monkeypatch):
+    from rag import pipeline
+
+    extracted = []
+
+    def fake_extract(path):
+        extracted.append(path.rsplit("/", 1)[-1])
+        with open(path) as f:
+            return f.read()
+
+    monkeypatch.setattr(pipeline, "extract_text_from_pdf", fake_extract)
+    folder = tmp_path / "pdfs"
+    folder.mkdir()
+    manifest = str(tmp_path / "manifest.json")
+    ingest = functools.partial(indexer.incremental_ingest, str(folder), "https://drive.example",
+                               manifest_path=manifest, workers=1)
+    for name, words in [("a.pdf", 600), ("b.pdf", 600), ("c.pdf", 100)]:
+        (folder / name).write_text(" ".join(f"{name}-{i}" for i in range(words)))
+
+    report = ingest()
+    assert report["files"]["added"] == 3
+    assert len(es.indices["test_docs"].docs) == 3 + 3 + 1
+
+    # no changes: nothing is read, embedded or deleted
+    extracted.clear()
+    report = ingest()
+    assert extracted == [] and report["indexed"] == 0 and report["deleted"] == 0
+
+    # b shrinks to one chunk, c is removed
+    (folder / "b.pdf").write_text("short")
+    (folder / "c.pdf").unlink()
+    report = ingest()
+    assert extracted == ["b.pdf"]
+    assert report["files"] == {"added": 0, "modified": 1, "removed": 1, "unchanged": 1}
+    assert (report["indexed"], report["deleted"]) == (1, 3)
+    assert sorted(d["filename"] for d in es.indices["test_docs"].docs.values()) == ["a.pdf"] * 3 + ["b.pdf"]
+
+
+def test_changing_the_chunker_reindexes_everything(es, tmp_path):
+    folder = tmp_path / "pdfs"
+    folder.mkdir()
+    for n in range(2):
+        write_pdf(str(folder / f"doc{n}.pdf"), [[f"doc {n} line {i} docker image layers" for i in range(60)]])
+    manifest = str(tmp_path / "manifest.json")
+
+    indexer = Indexer(index_name="test_docs", es_url=es.url, embedder=hashing_embedder())
+    report = indexer.incremental_ingest(str(folder), "u", manifest_path=manifest, workers=1)
+    assert report["files"]["added"] == 2
+
+    # same files, but the model now comes with a fast tokenizer -> token chunks
+    encoder = HashingEncoder()
+    encoder.tokenizer = make_wordpiece_tokenizer()
+    encoder.max_seq_length = 64
+    indexer.model = EmbeddingService(model=encoder)
+    report = indexer.incremental_ingest(str(folder), "u", manifest_path=manifest, workers=1)
+    assert report["files"]["modified"] == 2
+
+    docs = list(es.indices["test_docs"].docs.values())
+    assert all("char_start" in doc for doc in docs)
+    assert all(len(encoder.tokenizer(d["text"], add_special_tokens=False)["input_ids"]) <= 64 for d in docs)
+
+
+@pytest.fixture
+def ingest_client(es, tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from rag import api
+
+    folder = tmp_path / "pdfs"
+    folder.mkdir()
+    for n in range(2):
+        write_pdf(str(folder / f"doc{n}.pdf"), [[f"doc {n} line {i} docker image layers" for i in range(60)]])
+    embedder = hashing_embedder()
+    monkeypatch.chdir(tmp_path)  # the manifest goes to data/
+    monkeypatch.setattr(api, "download_pdfs_from_gdrive", lambda url: str(folder))
+    monkeypatch.setattr(api, "retriever", Retriever(es_url=es.url, embedder=embedder))
+    monkeypatch.setattr(api, "Indexer", functools.partial(Indexer, es_url=es.url, embedder=embedder))
+    monkeypatch.setattr(api, "INGEST_WORKERS", 1)
+    return TestClient(api.app)
+
+
+def test_ingest_route_reports_stage_counters(es, ingest_client):
+    body = ingest_client.post("/ingest").json()
+    assert body["files"]["added"] == 2 and body["docs_indexed"] == len(es.indices["rag_docs"].docs)
+    assert set(body["stages"]) == {"extract", "chunk", "embed", "index"}
+    assert body["stages"]["extract"]["items_out"] == 2
+    assert ingest_client.post("/ingest").json()["stages"] == {}  # nothing changed
+
+
+def test_ingests_do_not_overlap(es, ingest_client, monkeypatch):
+    import threading
+    from rag import api
+
+    started, release = threading.Event(), threading.Event()
+    download = api.download_pdfs_from_gdrive
+
+    def slow_download(url):
+        started.set()
+        release.wait(5)
+        return download(url)
+
+    monkeypatch.setattr(api, "download_pdfs_from_gdrive", slow_download)
+    first = {}
+    thread = threading.Thread(target=lambda: first.update(res=ingest_client.post("/ingest")))
+    thread.start()
+    assert started.wait(5)
+    second = ingest_client.post("/ingest")
+    release.set()
+    thread.join()
+
+    assert second.status_code == 409
+    assert first["res"].status_code == 200 and first["res"].json()["files"]["added"] == 2
+    assert "refresh_interval" not in es.indices["rag_docs"].settings["index"]
+
+
+def test_vectors_can_be_left_out_of_stored_source(es):
+    embedder = hashing_embedder()
+    indexer = make_indexer(es.url, "slim_docs", embedder, exclude_source_vectors=True)
+    indexer.index_documents(make_docs(10), bulk=True)
+
+    assert es.indices["slim_docs"].mappings["_source"] == {"excludes": ["dense_vector"]}
+    assert "dense_vector" not in indexer.es.get(index="slim_docs", id="doc-3")["_source"]
+    # Still indexed: kNN search works
+    full = Retriever(index_name="slim_docs", es_url=es.url, embedder=embedder, source_fields=None)
+    hits = full.search_dense("chunk 3 about docker", top_k=1)
+    assert hits[0][0]["id"] == "doc-3" and "dense_vector" not in hits[0][0]
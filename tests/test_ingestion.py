@@ -23,3 +23,45 @@ def test_ingestion():
     assert "drive_url" in sample, "Missing drive url"
     assert "chunk_id" in sample, "Missing chunk id"
     assert "text" in sample and len(sample["text"]) > 0, "Empty text in chunk"
+
+
+def write_corpus(folder):
+    from benchmarks.stand_ins import write_pdf
+
+    for n, num_pages in enumerate([1, 3, 9]):
+        pages = [[f"file {n} page {p} line {i} about docker and kubernetes" for i in range(40)]
+                 for p in range(num_pages)]
+        write_pdf(str(folder / f"doc{n}.pdf"), pages)
+
+
+def test_parallel_extraction_matches_serial(tmp_path):
+    write_corpus(tmp_path)
+    serial = process_pdfs(str(tmp_path), "https://drive.example", workers=1)
+    # pages_per_task=2 splits the 3- and 9-page PDFs into page ranges
+    parallel = process_pdfs(str(tmp_path), "https://drive.example", workers=3, pages_per_task=2)
+    assert len(serial) > 3
+    assert parallel == serial
+
+
+def slow_on_doc1(path, start=0, stop=None):
+    # Module-level: the extraction workers import it by name
+    import time
+    from rag.ingestion import extract_text_from_pdf
+
+    if path.endswith("doc1.pdf"):
+        time.sleep(10)
+    return extract_text_from_pdf(path, start, stop)
+
+
+def test_parallel_extraction_skips_files_that_time_out(tmp_path):
+    import time
+    from rag import ingestion
+
+    write_corpus(tmp_path)
+    paths = [str(tmp_path / f"doc{n}.pdf") for n in range(3)]
+    start = time.perf_counter()
+    docs, failed = ingestion.process_pdf_files(paths, "https://drive.example", workers=2, timeout=0.5,
+                                               extract=slow_on_doc1)
+    assert time.perf_counter() - start < 5
+    assert failed == [paths[1]]
+    assert {doc["filename"] for doc in docs} == {"doc0.pdf", "doc2.pdf"}
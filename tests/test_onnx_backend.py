@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from benchmarks.stand_ins import make_wordpiece_tokenizer
+from rag.chunking import TokenChunker
+from rag.embeddings import DEFAULT_MODEL, EmbeddingService
+from rag.onnx_backend import PARITY_TEXTS, OnnxEncoder
+
+
+class TableSession:
+    """ONNX Runtime session stand-in: hidden state of a token = a fixed row per token id."""
+
+    def __init__(self, vocab_size, dim=8):
+        self.table = np.random.default_rng(0).normal(size=(vocab_size, dim)).astype(np.float32)
+        self.batches = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input_ids"), SimpleNamespace(name="attention_mask")]
+
+    def run(self, output_names, feeds):
+        self.batches.append(feeds["input_ids"].shape)
+        return [self.table[feeds["input_ids"]]]
+
+
+@pytest.fixture
+def encoder():
+    tokenizer = make_wordpiece_tokenizer()
+    return OnnxEncoder(TableSession(len(tokenizer)), tokenizer, dim=8, max_seq_length=64)
+
+
+def test_mean_pooling_ignores_padding(encoder):
+    texts = ["docker", "docker container image", "kubernetes"]
+    vectors = encoder.encode(texts, batch_size=3)
+    for text, vector in zip(texts, vectors):
+        ids = encoder.tokenizer(text, add_special_tokens=False)["input_ids"]
+        expected = encoder.session.table[ids].mean(axis=0)
+        np.testing.assert_allclose(vector, expected / np.linalg.norm(expected), rtol=1e-5)
+
+
+def test_batches_are_length_sorted_and_order_restored(encoder):
+    texts = ["a", "docker container image and the kubernetes image", "docker", "the image and"]
+    one_by_one = encoder.encode(texts, batch_size=1)
+    batched = encoder.encode(texts, batch_size=2)
+    np.testing.assert_allclose(batched, one_by_one, rtol=1e-5, atol=1e-6)
+    # Longest texts go first, so each batch pads to similar lengths
+    assert [shape[1] for shape in encoder.session.batches[-2:]] == [7, 1]
+    assert encoder.encode("docker").shape == (8,)
+    assert encoder.encode([]).shape == (0, 8)
+
+
+def test_truncates_to_max_seq_length(encoder):
+    encoder.encode(["docker " * 200])
+    assert encoder.session.batches[-1][1] == 64
+
+
+def test_drop_in_for_the_service_and_chunker(encoder):
+    service = EmbeddingService(model=encoder, backend="onnx", quantize=True)
+    assert service.cache_key == f"{DEFAULT_MODEL}@onnx-int8"
+    assert EmbeddingService(model=encoder).cache_key == DEFAULT_MODEL
+    assert service.encode_query("docker").shape == (8,)
+    assert TokenChunker.from_embedder(service).max_tokens == 64
+    with pytest.raises(ValueError):
+        EmbeddingService(backend="tensorrt")
+
+
+def test_parity_with_torch(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    from rag.onnx_backend import export_model, parity_check
+
+    try:
+        export_model(DEFAULT_MODEL, str(tmp_path / "fp32"))
+        export_model(DEFAULT_MODEL, str(tmp_path / "int8"), quantize=True)
+    except OSError:
+        pytest.skip("embedding model not available offline")
+    assert parity_check(DEFAULT_MODEL, OnnxEncoder.load(str(tmp_path / "fp32")), PARITY_TEXTS)["min_cosine"] > 0.9999
+    assert parity_check(DEFAULT_MODEL, OnnxEncoder.load(str(tmp_path / "int8")), PARITY_TEXTS)["min_cosine"] > 0.98
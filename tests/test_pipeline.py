@@ -0,0 +1,62 @@
+import time
+import pytest
+from rag.ingestion import process_pdfs
+from rag.pipeline import IngestionPipeline
+from benchmarks.stand_ins import HashingEncoder, write_pdf
+from tests.helpers import hashing_embedder, make_indexer
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    for n in range(6):
+        pages = [[f"file {n} page {p} line {i} about docker images and containers" for i in range(40)]
+                 for p in range(n % 3 + 1)]
+        write_pdf(str(tmp_path / f"doc{n}.pdf"), pages)
+    return tmp_path
+
+
+def test_pipeline_indexes_same_chunks_as_process_pdfs(es, corpus):
+    indexer = make_indexer(es.url, "test_docs")
+    paths = sorted(str(p) for p in corpus.iterdir())
+    report = IngestionPipeline(indexer, "https://drive.example", workers=2, batch_size=8).run(paths)
+
+    expected = process_pdfs(str(corpus), "https://drive.example", workers=1)
+    assert report["indexed"] == len(expected) and report["failed"] == 0
+    stored = es.indices["test_docs"].docs
+    for doc in expected:
+        assert {k: stored[doc["id"]][k] for k in doc} == doc
+
+    stages = report["stages"]
+    assert stages["extract"]["items_out"] == 6
+    assert stages["chunk"]["items_out"] == stages["embed"]["items_in"] == len(expected)
+    assert stages["index"]["items_in"] == stages["index"]["items_out"] == len(expected)
+
+
+def test_slow_stage_applies_backpressure(es, corpus):
+    class SlowEncoder(HashingEncoder):
+        def encode(self, sentences, **kwargs):
+            time.sleep(0.05)
+            return super().encode(sentences, **kwargs)
+
+    indexer = make_indexer(es.url, "test_docs", hashing_embedder(SlowEncoder()))
+    pipeline = IngestionPipeline(indexer, "https://drive.example", workers=1, batch_size=1, queue_size=1)
+    report = pipeline.run(sorted(str(p) for p in corpus.iterdir()))
+
+    stages = report["stages"]
+    # embed is the bottleneck: chunking waits on it, indexing waits for it
+    assert stages["chunk"]["wait_out_s"] > stages["chunk"]["busy_s"]
+    assert stages["index"]["wait_in_s"] > stages["index"]["busy_s"]
+    assert stages["embed"]["busy_s"] > stages["embed"]["wait_in_s"]
+
+
+def test_stage_failure_stops_the_pipeline(es, corpus):
+    class BrokenEncoder(HashingEncoder):
+        def encode(self, sentences, **kwargs):
+            raise RuntimeError("model crashed")
+
+    indexer = make_indexer(es.url, "test_docs", hashing_embedder(BrokenEncoder()))
+    with pytest.raises(RuntimeError, match="model crashed"):
+        IngestionPipeline(indexer, "https://drive.example", workers=1, queue_size=1).run(
+            sorted(str(p) for p in corpus.iterdir())
+        )
+    assert es.indices["test_docs"].docs == {}
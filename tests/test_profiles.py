@@ -0,0 +1,34 @@
+import pytest
+
+from rag.profiles import INDEX_PROFILES, MAX_NUM_CANDIDATES, get_profile, num_candidates
+from rag.retrieval import Retriever
+from tests.helpers import hashing_embedder, make_indexer
+
+
+def test_num_candidates_scale_with_top_k():
+    default = get_profile("default")
+    assert num_candidates(default, 5) == 50  # the old fixed value at the API's default top_k
+    assert num_candidates(default, 20) == 200
+    assert num_candidates(default, 5000) == MAX_NUM_CANDIDATES
+    assert num_candidates(get_profile("exact"), 7) == 7
+    for profile in INDEX_PROFILES.values():
+        assert all(num_candidates(profile, k) >= k for k in (1, 5, 50, 500))
+
+
+def test_unknown_profile(monkeypatch):
+    with pytest.raises(ValueError):
+        get_profile("fp64")
+    monkeypatch.setenv("RAG_INDEX_PROFILE", "int8")
+    assert get_profile() is INDEX_PROFILES["int8"]
+
+
+@pytest.mark.parametrize("name", ["default", "int8", "bbq"])
+def test_profile_in_mapping_and_query(es, name):
+    embedder = hashing_embedder()
+    indexer = make_indexer(es.url, embedder=embedder, index_profile=name)
+    mapping = indexer.es.indices.get(index="rag_docs")["rag_docs"]["mappings"]
+    dense = mapping["properties"]["dense_vector"]
+    assert dense.get("index_options") == INDEX_PROFILES[name]["index_options"]
+
+    knn = Retriever(es_url=es.url, embedder=embedder, index_profile=name)._dense_knn([0.0] * 384, 10)
+    assert knn["num_candidates"] == num_candidates(INDEX_PROFILES[name], 10)
@@ -0,0 +1,182 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+from rag.rerank import Reranker
+
+
+def hits(*texts):
+    return [({"id": f"doc-{i}", "text": text}, 1.0 / (i + 1)) for i, text in enumerate(texts)]
+
+
+class OverlapCrossEncoder:
+    """Cross-encoder stand-in: score = shared words between query and text."""
+
+    def __init__(self, delay=None):
+        self.batches = []
+        self.delay = delay
+
+    def predict(self, pairs, batch_size=32):
+        if self.delay is not None:
+            self.delay.wait()
+        self.batches.append(len(pairs))
+        return [len(set(q.lower().split()) & set(t.lower().split())) for q, t in pairs]
+
+
+CANDIDATES = hits("python wheels", "docker images and containers", "kubernetes pods", "docker compose")
+
+
+def test_reorders_in_one_batch_and_keeps_top_n():
+    model = OverlapCrossEncoder()
+    reranker = Reranker(model=model, budget_ms=5000)
+    result, outcome = reranker.rerank("docker containers", CANDIDATES, top_n=2)
+    assert outcome == "reranked"
+    assert [doc["id"] for doc, _ in result] == ["doc-1", "doc-3"]
+    assert [score for _, score in result] == [2.0, 1.0]
+    assert model.batches == [4]
+
+
+def test_scores_are_cached_per_query_and_chunk():
+    model = OverlapCrossEncoder()
+    reranker = Reranker(model=model, budget_ms=5000)
+    reranker.rerank("docker containers", CANDIDATES[:3])
+    assert reranker.rerank("docker containers", CANDIDATES)[1] == "reranked"
+    assert reranker.rerank("docker containers", CANDIDATES)[1] == "cached"
+    assert model.batches == [3, 1]  # only the new chunk is scored
+    # Same id, new text (re-ingested chunk): scored again
+    changed = [({"id": "doc-1", "text": "docker containers everywhere"}, 1.0)]
+    reranker.rerank("docker containers", changed)
+    assert model.batches == [3, 1, 1]
+
+
+def test_budget_falls_back_to_fused_order_and_fills_the_cache():
+    release = threading.Event()
+    model = OverlapCrossEncoder(delay=release)
+    reranker = Reranker(model=model, budget_ms=20)
+    assert reranker.rerank("docker containers", CANDIDATES, top_n=2) == (CANDIDATES[:2], "fallback")
+
+    release.set()
+    reranker._executor.submit(lambda: None).result()  # let the late scoring finish
+    result, outcome = reranker.rerank("docker containers", CANDIDATES, top_n=2)
+    assert outcome == "cached"
+    assert [doc["id"] for doc, _ in result] == ["doc-1", "doc-3"]
+    assert model.batches == [4]
+
+
+def test_timed_out_jobs_do_not_pile_up():
+    release = threading.Event()
+    model = OverlapCrossEncoder(delay=release)
+    reranker = Reranker(model=model, budget_ms=20)
+    assert reranker.rerank("docker containers", CANDIDATES, top_n=2) == (CANDIDATES[:2], "fallback")
+    # The first job is still scoring past their budget: later calls don't queue behind it
+    for _ in range(5):
+        assert reranker.rerank("kubernetes pods", CANDIDATES, top_n=2) == (CANDIDATES[:2], "busy")
+    assert asyncio.run(reranker.arerank("python wheels", CANDIDATES, top_n=2)) == (CANDIDATES[:2], "busy")
+    assert reranker._executor._work_queue.qsize() == 0
+
+    release.set()
+    reranker._executor.submit(lambda: None).result()
+    assert model.batches == [4]
+
+
+def test_concurrent_calls_wait_within_their_budget():
+    class SlowModel(OverlapCrossEncoder):
+        def predict(self, pairs, batch_size=32):
+            time.sleep(0.05)
+            return super().predict(pairs, batch_size)
+
+    model = SlowModel()
+    reranker = Reranker(model=model, budget_ms=1000)
+    queries = ["docker containers", "kubernetes pods", "python wheels", "docker compose"]
+
+    async def scenario():
+        return await asyncio.gather(*(reranker.arerank(q, CANDIDATES, top_n=2) for q in queries))
+
+    assert [outcome for _, outcome in asyncio.run(scenario())] == ["reranked"] * 4
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda q: reranker.rerank(q + " again", CANDIDATES, top_n=2), queries))
+    assert [outcome for _, outcome in results] == ["reranked"] * 4
+    assert model.batches == [4] * 8  # one job at a time, nothing skipped
+
+
+def test_timed_out_job_that_never_started_is_dropped():
+    model = OverlapCrossEncoder()
+    reranker = Reranker(model=model, budget_ms=20)
+    release = threading.Event()
+    reranker._executor.submit(release.wait)  # hold the scoring thread
+    assert asyncio.run(reranker.arerank("docker containers", CANDIDATES, top_n=2)) == (CANDIDATES[:2], "fallback")
+
+    release.set()
+    reranker._executor.submit(lambda: None).result()
+    assert model.batches == []
+
+
+def test_model_errors_fall_back():
+    class Broken:
+        def predict(self, pairs, batch_size=32):
+            raise RuntimeError("no model")
+
+    assert Reranker(model=Broken()).rerank("docker", CANDIDATES, top_n=3) == (CANDIDATES[:3], "error")
+
+
+def test_async_matches_sync():
+    reranker = Reranker(model=OverlapCrossEncoder(), budget_ms=5000)
+    expected = Reranker(model=OverlapCrossEncoder()).rerank("kubernetes pods", CANDIDATES, top_n=3)
+    assert asyncio.run(reranker.arerank("kubernetes pods", CANDIDATES, top_n=3)) == expected
+    assert asyncio.run(reranker.arerank("kubernetes pods", [], top_n=3)) == ([], "reranked")
+    assert reranker.candidates(5) == 20 and reranker.candidates(10) == 40
+
+
+def test_query_route_reranks_over_fetched_hits(monkeypatch):
+    from fastapi.testclient import TestClient
+    from benchmarks.stand_ins import HashingEncoder
+    from rag import api
+    from rag.cache import AnswerCache
+    from rag.embeddings import EmbeddingService
+
+    fetched, generated = [], []
+
+    class StubRetriever:
+        model = EmbeddingService(model=HashingEncoder())
+
+        async def asearch_hybrid(self, question, top_k=5, **kwargs):
+            fetched.append(top_k)
+            return [({**doc, "filename": "f.pdf", "drive_url": "u"}, s) for doc, s in CANDIDATES[:top_k]]
+
+    class StubGenerator:
+        citations = staticmethod(api.AnswerGenerator.citations)
+
+        def refusal(self, question):
+            return None
+
+        async def agenerate_answer(self, question, retrieved):
+            generated.append(question)
+            return " | ".join(doc["text"] for doc, _ in retrieved)
+
+    monkeypatch.setattr(api, "retriever", StubRetriever())
+    monkeypatch.setattr(api, "generator", StubGenerator())
+    monkeypatch.setattr(api, "reranker", Reranker(model=OverlapCrossEncoder(), budget_ms=5000))
+    monkeypatch.setattr(api, "answer_cache", AnswerCache())
+
+    client = TestClient(api.app)
+    plain = client.post("/query", json={"question": "docker containers", "top_k": 1}).json()
+    reranked = client.post("/query", json={"question": "docker containers", "top_k": 1, "rerank": True,
+                                           "rerank_candidates": 4}).json()
+    assert fetched == [1, 4]
+    assert plain["answer"] == "python wheels"
+    assert reranked["answer"] == "docker images and containers"
+
+    # A rerank that fell back is answered, but not cached under the rerank scope
+    class Broken:
+        def predict(self, pairs, batch_size=32):
+            raise RuntimeError("no model")
+
+    monkeypatch.setattr(api, "reranker", Reranker(model=Broken()))
+    body = {"question": "kubernetes pods", "top_k": 1, "rerank": True, "rerank_candidates": 4}
+    assert client.post("/query", json=body).json()["answer"] == "python wheels"
+    monkeypatch.setattr(api, "reranker", Reranker(model=OverlapCrossEncoder(), budget_ms=5000))
+    assert client.post("/query", json=body).json()["answer"] == "kubernetes pods"
+    assert client.post("/query", json=body).json()["answer"] == "kubernetes pods"
+    assert generated.count("kubernetes pods") == 2  # the last one came from the cache
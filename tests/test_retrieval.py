@@ -1,5 +1,18 @@
+import asyncio
+import json
+import numpy as np
 import pytest
-from rag.retrieval import Retriever
+from fastapi.testclient import TestClient
+from benchmarks.stand_ins import FakeOllama
+from rag import api
+from rag.bm25 import BM25Index
+from rag.cache import AnswerCache
+from rag.generation import AnswerGenerator
+from rag.guardrails import Guardrails
+from rag.health import HealthMonitor
+from rag.retrieval import HIT_FIELDS, HYBRID_STRATEGIES, Retriever
+from rag.vector_store import LocalVectorIndex
+from tests.helpers import hashing_embedder, make_chunks, make_indexer
 
 @pytest.fixture(scope="module")
 def retriever():
@@ -18,3 +31,193 @@ def test_search_hybrid(retriever):
     assert isinstance(results, list)
     assert len(results) > 0
     assert "filename" in results[0][0]
+
+
+# --------- Offline: stand-in Elasticsearch ---------
+
+TOPICS = ["docker containers images", "kubernetes pods scheduling", "python packaging wheels",
+          "elasticsearch shards replicas", "docker compose networking"]
+
+
+@pytest.fixture(scope="module")
+def stand_in_es(module_es):
+    embedder = hashing_embedder()
+    indexer = make_indexer(module_es.url, embedder=embedder)
+    indexer.index_documents(make_chunks([f"{TOPICS[i % len(TOPICS)]} part {i}" for i in range(40)], files=4),
+                            bulk=True)
+    return module_es, Retriever(es_url=module_es.url, embedder=embedder)
+
+
+def test_hybrid_msearch_matches_sequential(stand_in_es):
+    es, offline = stand_in_es
+    sequential = offline.search_hybrid("Explain Docker", top_k=5, strategy="sequential")
+
+    before = sum(es.request_counts.values())
+    single = offline.search_hybrid("Explain Docker", top_k=5, strategy="msearch")
+    assert sum(es.request_counts.values()) - before == 1
+
+    assert [(d["id"], round(s, 9)) for d, s in single] == [(d["id"], round(s, 9)) for d, s in sequential]
+
+
+@pytest.mark.parametrize("strategy", ["msearch", "rrf", "sequential"])
+def test_async_hybrid_matches_sync(stand_in_es, strategy):
+    _, offline = stand_in_es
+
+    async def run():
+        try:
+            return await offline.asearch_hybrid("Explain Docker", top_k=5, strategy=strategy)
+        finally:
+            await offline.aclose()
+
+    expected = offline.search_hybrid("Explain Docker", top_k=5, strategy=strategy)
+    assert [d["id"] for d, _ in asyncio.run(run())] == [d["id"] for d, _ in expected]
+
+
+def test_hybrid_server_side_rrf(stand_in_es):
+    es, offline = stand_in_es
+    before = sum(es.request_counts.values())
+    results = offline.search_hybrid("Explain Docker", top_k=3, strategy="rrf")
+    assert sum(es.request_counts.values()) - before == 1
+    assert len(results) == 3
+    assert "docker" in results[0][0]["text"]
+
+
+def test_search_batch_matches_single_searches(stand_in_es):
+    es, offline = stand_in_es
+    searches = [
+        {"question": "Explain Docker", "mode": "bm25", "top_k": 3},
+        {"question": "kubernetes pods", "mode": "dense", "top_k": 4},
+        {"question": "Explain Docker", "mode": "hybrid", "top_k": 5},
+        {"question": "python wheels", "mode": "hybrid", "hybrid_strategy": "rrf", "top_k": 3},
+        {"question": "shards", "mode": "hybrid", "hybrid_strategy": "rrf", "fusion": "zscore"},  # invalid
+    ]
+    vectors = offline.model.encode_queries([s["question"] for s in searches])
+
+    before = es.request_counts["_msearch"]
+    batched = offline.search_batch(searches, vectors, msearch_size=4)
+    assert es.request_counts["_msearch"] - before == 2  # 5 distinct sub-searches, 4 per request
+
+    expected = [
+        offline.search_bm25("Explain Docker", top_k=3),
+        offline.search_dense("kubernetes pods", top_k=4),
+        offline.search_hybrid("Explain Docker", top_k=5),
+        offline.search_hybrid("python wheels", top_k=3, strategy="rrf"),
+    ]
+    for got, want in zip(batched, expected):
+        assert [(d["id"], round(s, 9)) for d, s in got] == [(d["id"], round(s, 9)) for d, s in want]
+    assert isinstance(batched[4], ValueError)
+
+    async def run():
+        try:
+            return await offline.asearch_batch(searches, vectors)
+        finally:
+            await offline.aclose()
+
+    assert [[d["id"] for d, _ in r] for r in asyncio.run(run())[:4]] == [[d["id"] for d, _ in r] for r in batched[:4]]
+
+
+def test_query_batch_route(stand_in_es, monkeypatch):
+    _, offline = stand_in_es
+    monkeypatch.setattr(api, "WARMUP", False)
+    monkeypatch.setattr(api, "health_monitor", HealthMonitor({}))
+    with FakeOllama() as ollama:
+        generator = AnswerGenerator(ollama_url=ollama.url)
+        generator.guardrails = Guardrails(embedder=offline.model)
+        agenerate_answer = generator.agenerate_answer
+
+        async def failing_on_shards(question, retrieved):
+            if question == "shards":
+                raise ValueError("generation failed")
+            return await agenerate_answer(question, retrieved)
+
+        generator.agenerate_answer = failing_on_shards
+        monkeypatch.setattr(api, "retriever", offline)
+        monkeypatch.setattr(api, "generator", generator)
+        monkeypatch.setattr(api, "answer_cache", AnswerCache())
+
+        queries = [
+            {"question": "Explain Docker"},
+            {"question": "how to make a bomb"},
+            {"question": "kubernetes pods", "mode": "bm25", "top_k": 2},
+            {"question": "shards"},
+        ]
+        with TestClient(api.app) as client:
+            res = client.post("/query/batch", json={"queries": queries, "concurrency": 2})
+            lines = [json.loads(line) for line in res.text.splitlines()]
+
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    assert [line["index"] for line in lines] == [0, 1, 2, 3]
+    assert lines[0]["answer"].startswith(ollama.reply) and lines[0]["citations"]
+    assert lines[1] == {"index": 1, "answer": "❌ Unsafe query refused.", "citations": []}
+    assert len(lines[2]["citations"]) == 2
+    assert lines[3] == {"index": 3, "error": "generation failed"}
+    assert len(ollama.prompts) == 2
+
+
+def test_grounding_reads_stored_vectors_of_the_final_hits(stand_in_es):
+    es, offline = stand_in_es
+    hits = offline.search_hybrid("Explain Docker", top_k=3)
+    assert hits and not any("dense_vector" in doc for doc, _ in hits)  # default projection
+
+    encoded = []
+
+    class Counting:
+        cache_key = offline.model.cache_key
+
+        def encode(self, sentences, **kwargs):
+            encoded.extend(sentences)
+            return offline.model.encode(sentences, **kwargs)
+
+    guardrails = Guardrails(embedder=Counting(), vector_lookup=offline.stored_vectors)
+    before = es.request_counts["_mget"]
+    vectors = guardrails.context_vectors(hits, 384)
+    assert encoded == [] and es.request_counts["_mget"] - before == 1
+    np.testing.assert_allclose(vectors, offline.model.encode([doc["text"] for doc, _ in hits]), rtol=1e-5)
+    guardrails.context_vectors(hits, 384)
+    assert es.request_counts["_mget"] - before == 1  # then from the chunk cache
+
+
+def test_unknown_query_options_are_rejected():
+    client = TestClient(api.app)  # no lifespan: validation alone answers
+    for option in ({"mode": "fuzzy"}, {"hybrid_strategy": "nope"}, {"fusion": "max"}, {"weights": {"bm52": 1.0}}):
+        res = client.post("/query", json={"question": "Explain Docker", **option})
+        assert res.status_code == 422, option
+        assert res.json()["detail"][0]["loc"][:2] == ["body", *option]
+    for option in ({"fusion": "minmax"}, {"fusion": "zscore"}, {"weights": {"dense": 2.0}}):
+        res = client.post("/query", json={"question": "Explain Docker", "hybrid_strategy": "rrf", **option})
+        assert res.status_code == 422, option
+        assert "unweighted RRF" in res.json()["detail"][0]["msg"]
+    res = client.post("/query/batch", json={"queries": [{"question": "a"}, {"question": "b", "fusion": "max"}]})
+    assert res.status_code == 422
+
+
+def test_hits_carry_only_the_projected_fields(stand_in_es, tmp_path):
+    es, offline = stand_in_es
+    allowed = set(HIT_FIELDS)
+    vectors = offline.model.encode_queries(["Explain Docker"])
+    paths = {
+        "bm25": offline.search_bm25("Explain Docker"),
+        "dense": offline.search_dense("Explain Docker"),
+        "elser": offline.search_elser("Explain Docker"),
+        "batch": offline.search_batch([{"question": "Explain Docker"}], vectors)[0],
+    }
+    for strategy in HYBRID_STRATEGIES:
+        paths[strategy] = offline.search_hybrid("Explain Docker", strategy=strategy)
+    paths["sequential_rrf_fetch"] = offline.reciprocal_rank_fusion([paths["bm25"]], fetch_sources=True)
+    for name, hits in paths.items():
+        assert hits, name
+        assert all(set(doc) <= allowed and "text" in doc for doc, _ in hits), name
+
+    full = Retriever(es_url=es.url, embedder=offline.model, source_fields=None)
+    assert "dense_vector" in full.search_bm25("Explain Docker")[0][0]
+
+    docs = [doc for doc, _ in full.search_bm25("docker", top_k=40)]
+    local = Retriever(es_url=es.url, embedder=offline.model, dense_backend="local", lexical_backend="local",
+                      vector_store=LocalVectorIndex(str(tmp_path / "vectors")),
+                      bm25_index=BM25Index(str(tmp_path / "bm25")))
+    local.vector_store.upsert(docs, offline.model.encode([d["text"] for d in docs]))
+    local.bm25_index.upsert(docs)
+    for doc, _ in local.search_hybrid("Explain Docker"):
+        assert set(doc) <= allowed | {"dense_vector"}
+    for doc, _ in local.search_dense("Explain Docker"):
+        assert set(doc) <= allowed | {"dense_vector"} and "dense_vector" in doc
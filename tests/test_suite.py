@@ -0,0 +1,27 @@
+import argparse
+
+from benchmarks import suite
+
+
+def test_summary_percentiles():
+    stats = suite.summarize([float(i) for i in range(1, 101)], items=200)
+    assert (stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]) == (50.5, 95.05, 99.01)
+    assert stats["throughput_per_s"] == round(200 / 5.05, 1)
+
+
+def test_compare_flags_slower_stages():
+    baseline = {"retrieval_bm25": {"p95_ms": 2.0}, "fusion_rrf": {"p95_ms": 0.1}, "corpus": {"pdfs": 3}}
+    current = {"retrieval_bm25": {"p95_ms": 2.1}, "fusion_rrf": {"p95_ms": 0.2}, "corpus": {"pdfs": 3}}
+    assert [r["stage"] for r in suite.compare(current, baseline, tolerance=0.2)] == ["fusion_rrf"]
+
+
+def test_suite_runs_offline():
+    args = argparse.Namespace(
+        pdfs=3, pages=1, words_per_page=120, queries=5, generations=2, top_k=3, batch_size=16, bulk_size=50,
+        model="hashing", es_latency_ms=0.0, prefill_ms=0.0, token_ms=0.0, seed=0,
+    )
+    report = suite.run(args)
+    assert report["corpus"]["pdfs"] == 3 and report["corpus"]["chunks"] > 0
+    for stage in ("extraction", "chunking_tokens", "embedding_batch", "indexing", "retrieval_hybrid_msearch",
+                  "fusion_zscore", "guardrails_grounding", "generation"):
+        assert report[stage]["n"] > 0 and report[stage]["p99_ms"] >= report[stage]["p50_ms"]
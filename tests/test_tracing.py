@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from rag.embeddings import EmbeddingService
+from rag.tracing import Metrics, Tracer, server_timing, span, traced, tracer
+
+
+@pytest.fixture
+def fresh_tracer():
+    enabled = tracer.enabled
+    tracer.enabled = True
+    tracer.metrics.reset()
+    yield tracer
+    tracer.enabled = enabled
+    tracer.metrics.reset()
+
+
+def test_spans_feed_histograms_and_request_timings(fresh_tracer):
+    @traced("stage.sync")
+    def work():
+        with span("stage.inner"):
+            return 42
+
+    with fresh_tracer.request() as timings:
+        assert work() == 42
+        work()
+    work()  # outside the request: histogram only
+
+    assert fresh_tracer.metrics.histogram("rag_stage_duration_seconds", stage="stage.sync").count == 3
+    assert fresh_tracer.metrics.histogram("rag_stage_duration_seconds", stage="stage.inner").count == 3
+    assert set(timings) == {"stage.sync", "stage.inner"}
+    assert timings["stage.sync"] >= timings["stage.inner"] > 0
+
+
+def test_errors_are_counted_and_reraised(fresh_tracer):
+    @traced("stage.failing")
+    async def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(fail())
+    assert fresh_tracer.metrics.counter("rag_stage_errors_total", stage="stage.failing") == 1
+    assert fresh_tracer.metrics.histogram("rag_stage_duration_seconds", stage="stage.failing").count == 1
+
+
+def test_disabled_tracer_records_nothing(fresh_tracer):
+    fresh_tracer.enabled = False
+
+    @traced("stage.off")
+    def work():
+        return "done"
+
+    with fresh_tracer.request() as timings:
+        assert work() == "done"
+        with span("stage.off"):
+            pass
+    assert timings == {}
+    assert fresh_tracer.metrics.render() == "\n"
+
+
+def test_executor_work_lands_in_the_request(fresh_tracer):
+    class Model:
+        def encode(self, sentences, batch_size=32, **kwargs):
+            return [[1.0] for _ in sentences]
+
+    service = EmbeddingService(model=Model())
+
+    async def handler():
+        with fresh_tracer.request() as timings:
+            await service.run(service.encode, ["a", "b"])
+        return timings
+
+    assert "embedding.encode" in asyncio.run(handler())
+
+
+def test_prometheus_rendering():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    local = Tracer(enabled=True, metrics=metrics)
+    for seconds in (0.05, 0.5, 5.0):
+        local.record("retrieval.bm25", seconds)
+    metrics.inc("rag_http_requests_total", (("route", "/query"), ("status", "200")))
+
+    text = metrics.render()
+    assert "# TYPE rag_stage_duration_seconds histogram" in text
+    assert 'rag_stage_duration_seconds_bucket{stage="retrieval.bm25",le="0.1"} 1' in text
+    assert 'rag_stage_duration_seconds_bucket{stage="retrieval.bm25",le="1.0"} 2' in text
+    assert 'rag_stage_duration_seconds_bucket{stage="retrieval.bm25",le="+Inf"} 3' in text
+    assert 'rag_stage_duration_seconds_count{stage="retrieval.bm25"} 3' in text
+    assert '# TYPE rag_http_requests_total counter' in text
+    assert 'rag_http_requests_total{route="/query",status="200"} 1' in text
+
+
+def test_server_timing_header():
+    assert server_timing({"retrieval.bm25": 0.0021, "total": 0.25}) == "retrieval.bm25;dur=2.10, total;dur=250.00"
+
+
+def test_metrics_route_counts_requests_and_sends_server_timing(fresh_tracer):
+    from fastapi.testclient import TestClient
+    from rag import api
+
+    client = TestClient(api.app)
+    first = client.get("/metrics", headers={"X-Server-Timing": "1"})
+    assert first.headers["Server-Timing"].startswith("total;dur=")
+    assert "Server-Timing" not in client.get("/cache/stats").headers
+
+    text = client.get("/metrics").text
+    assert "# TYPE rag_http_requests_total counter" in text
+    assert 'rag_http_requests_total{route="/metrics",status="200"} 1' in text  # the first call
+    assert 'rag_http_request_duration_seconds_count{route="/metrics"} 1' in text
+    assert fresh_tracer.metrics.counter("rag_http_requests_total", route="/metrics", status="200") == 2
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from rag.retrieval import Retriever
+from rag.vector_store import LocalVectorIndex
+from tests.helpers import hashing_embedder, make_chunks, make_indexer
+
+
+def make_docs(n, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    return make_chunks([f"chunk {i}" for i in range(n)]), rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def brute_force(vectors, query, top_k):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return list(np.argsort(-(unit @ (query / np.linalg.norm(query))), kind="stable")[:top_k])
+
+
+def test_search_matches_brute_force(tmp_path):
+    docs, vectors = make_docs(500)
+    store = LocalVectorIndex(str(tmp_path / "idx"))
+    store.upsert(docs, vectors)
+    query = vectors[7] + 0.1
+
+    hits = store.search(query, top_k=10)
+    assert [doc["id"] for doc, _ in hits] == [f"doc-{i}" for i in brute_force(vectors, query, 10)]
+    assert hits[0][0]["text"] == "chunk 7"
+    assert 0.5 < hits[0][1] <= 1.0  # ES cosine score: (1 + cos) / 2
+    assert len(hits[0][0]["dense_vector"]) == 32
+
+
+def test_float16_store_keeps_ranking(tmp_path):
+    docs, vectors = make_docs(300)
+    exact = LocalVectorIndex(str(tmp_path / "f32"))
+    half = LocalVectorIndex(str(tmp_path / "f16"), dtype="float16")
+    exact.upsert(docs, vectors)
+    half.upsert(docs, vectors)
+    query = vectors[3]
+    assert [d["id"] for d, _ in half.search(query, 5)] == [d["id"] for d, _ in exact.search(query, 5)]
+
+
+def test_upsert_delete_and_reload(tmp_path):
+    path = str(tmp_path / "idx")
+    docs, vectors = make_docs(50)
+    store = LocalVectorIndex(path, block_rows=16)
+    store.upsert(docs, vectors)
+    store.delete(["doc-0", "doc-1", "missing"])
+    store.upsert([dict(docs[2], text="replaced")], vectors[2:3])
+    store.flush()
+    assert len(store) == 48
+
+    reloaded = LocalVectorIndex(path)
+    assert len(reloaded) == 48
+    ids = [d["id"] for d, _ in reloaded.search(vectors[0], top_k=50)]
+    assert "doc-0" not in ids and "doc-1" not in ids and len(ids) == 48
+    assert reloaded.search(vectors[2], top_k=1)[0][0]["text"] == "replaced"
+    stored = reloaded.vectors(["doc-0", "doc-2", "missing"])
+    assert list(stored) == ["doc-2"]
+    np.testing.assert_allclose(stored["doc-2"], vectors[2] / np.linalg.norm(vectors[2]), rtol=1e-6)
+
+    reloaded.compact()
+    assert len(LocalVectorIndex(path)) == 48
+
+
+def test_ivf_probing_all_lists_is_exact(tmp_path):
+    docs, vectors = make_docs(1000)
+    store = LocalVectorIndex(str(tmp_path / "idx"))
+    store.upsert(docs[:900], vectors[:900])
+    store.build_ivf(nlist=16)
+    store.upsert(docs[900:], vectors[900:])  # assigned to existing lists
+
+    query = vectors[950]
+    expected = [f"doc-{i}" for i in brute_force(vectors, query, 10)]
+    assert [d["id"] for d, _ in store.search(query, 10, nprobe=16)] == expected
+    assert store.search(query, 1, nprobe=2)[0][0]["id"] == "doc-950"
+
+    store.flush()
+    assert [d["id"] for d, _ in LocalVectorIndex(store.path).search(query, 10, nprobe=16)] == expected
+
+
+@pytest.fixture(scope="module")
+def synced(module_es, tmp_path_factory):
+    embedder = hashing_embedder()
+    store = LocalVectorIndex(str(tmp_path_factory.mktemp("vectors") / "idx"))
+    indexer = make_indexer(module_es.url, embedder=embedder, vector_store=store)
+    topics = ["docker containers images", "kubernetes pods scheduling", "python packaging wheels"]
+    indexer.index_documents(make_chunks([f"{topics[i % len(topics)]} part {i}" for i in range(30)], files=4),
+                            bulk=True)
+    return module_es, indexer, Retriever(es_url=module_es.url, embedder=embedder), \
+        Retriever(es_url=module_es.url, embedder=embedder, dense_backend="local", vector_store=store)
+
+
+def ranked(hits):
+    # Equal scores (chunks with the same words) come back in arbitrary order
+    return sorted((-round(score, 5), doc["id"]) for doc, score in hits)
+
+
+def test_local_backend_matches_es(synced):
+    es, _, remote, local = synced
+    before = sum(es.request_counts.values())
+    dense = local.search_dense("docker images", top_k=30)
+    assert sum(es.request_counts.values()) == before
+    assert ranked(dense) == ranked(remote.search_dense("docker images", top_k=30))
+
+    before = sum(es.request_counts.values())
+    hybrid = local.search_hybrid("docker images", top_k=30, fusion="minmax")
+    assert sum(es.request_counts.values()) - before == 1  # lexical msearch only
+    assert ranked(hybrid) == ranked(remote.search_hybrid("docker images", top_k=30, fusion="minmax"))
+
+    with pytest.raises(ValueError):
+        local.search_hybrid("docker images", strategy="rrf")
+
+
+def test_indexer_deletes_from_local_store(synced):
+    _, indexer, _, local = synced
+    indexer.delete_documents(["doc-0", "doc-3"])
+    assert len(indexer.vector_store) == 28
+    assert {"doc-0", "doc-3"}.isdisjoint(d["id"] for d, _ in local.search_dense("docker", top_k=30))